@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+class AnnScores:
+    """Query đã chuẩn hóa của một lần search trên HnswVectorIndex.
+    
+    Không tính score cho cả KB; scores[row] (vd. similarity cho hit BM25) là
+    cosine float32 chính xác của đúng row đó, cùng thang (1 + cos) / 2.
+    """
+    
+    def __init__(self, index: "HnswVectorIndex", query: np.ndarray):
+        self.index = index
+        self.query = query
+    
+    def __getitem__(self, row: int) -> float:
+        return float(self.exact(np.array([row]))[0])
+    
+    def exact(self, rows: np.ndarray) -> np.ndarray:
+        return (np.asarray(self.index.matrix[rows]) @ self.query + 1.0) * 0.5
+
+
+class HnswVectorIndex(VectorIndex):
+    """VectorIndex tìm kiếm xấp xỉ bằng đồ thị HNSW (hnswlib, inner product).
+    
+    Ràng buộc group được truyền vào hnswlib dưới dạng filter theo row, nên node
+    ngoài constrained IDs bị loại ngay trong lúc duyệt đồ thị thay vì lọc sau
+    top-k. Tập ràng buộc nhỏ (<= exact_below row) được chấm brute force trên
+    đúng các row đó: rẻ hơn và không bị hụt kết quả khi filter quá chặt.
+    Score trả về là inner product float32 của vector đã chuẩn hóa, cùng thang
+    với VectorIndex nên ngưỡng ranker/decision không đổi.
+    
+    Đồ thị được lưu ra `<path>.<token>` + header `<path>.json` (version, ids, tham số,
+    tên file đồ thị); worker khởi động cùng graph version chỉ cần load_index, không build lại.
+    """
+    
+    def __init__(
+        self,
+        ids: Sequence[str],
+        vectors: Any,
+        payloads: Optional[Sequence[Dict[str, Any]]] = None,
+        version: Optional[str] = None,
+        normalized: bool = False,
+        M: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        exact_below: int = 2000,
+        path: Optional[str] = None
+    ):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("VECTOR_INDEX_BACKEND=hnsw cần hnswlib: pip install hnswlib") from e
+        
+        super().__init__(ids, vectors, payloads, version, normalized)
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.exact_below = exact_below
+        self.graph = hnswlib.Index(space="ip", dim=self.dimension)
+        
+        loaded = path is not None and self._load(path)
+        if not loaded:
+            self._build()
+            if path is not None and version is not None:
+                self._save(path)
+        self.graph.set_ef(ef_search)
+    
+    def _params(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "dimension": self.dimension,
+            "count": self.size,
+            "M": self.M,
+            "ef_construction": self.ef_construction,
+            "ids": self.ids,
+        }
+    
+    @staticmethod
+    def _header_path(path: str) -> Path:
+        base = Path(path)
+        return base.with_name(base.name + ".json")
+    
+    def _load(self, path: str) -> bool:
+        """Load đồ thị đã lưu nếu cùng version/ids/tham số; False nếu phải build lại."""
+        header_path = self._header_path(path)
+        if self.version is None or not header_path.exists():
+            return False
+        try:
+            with open(header_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            # Header cũ không có "data" → đồ thị nằm ngay tại <path>
+            graph_path = header_path.with_name(header.pop("data", Path(path).name))
+            if header != self._params():
+                logger.info(f"HNSW index {path} lệch version/tham số, build lại")
+                return False
+            self.graph.load_index(str(graph_path), max_elements=self.size)
+        except Exception as e:
+            logger.warning(f"HNSW index load failed, rebuilding: {e}")
+            return False
+        logger.info(f"HNSW index loaded from {path}: {self.size} Problems (version={self.version})")
+        return True
+    
+    def _build(self) -> None:
+        self.graph.init_index(max_elements=max(self.size, 1), M=self.M, ef_construction=self.ef_construction)
+        if self.size:
+            # Label = số thứ tự row, khớp mask/row_of của VectorIndex
+            self.graph.add_items(np.asarray(self.matrix), np.arange(self.size))
+        logger.info(f"HNSW index built: {self.size} Problems (M={self.M}, ef_construction={self.ef_construction})")
+    
+    def _save(self, path: str) -> None:
+        """Ghi đồ thị ra file mới rồi os.replace header trỏ tới nó (giống EmbeddingStore.write).
+        
+        Chỉ header được thay nên worker không bao giờ load đồ thị mới với header cũ.
+        """
+        target = Path(path)
+        header_path = self._header_path(path)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            previous = self._graph_name(path)
+            graph_name = f"{target.name}.{uuid.uuid4().hex[:12]}"
+            tmp_header = header_path.with_name(f"{header_path.name}.{os.getpid()}.tmp")
+            self.graph.save_index(str(target.with_name(graph_name)))
+            with open(tmp_header, "w", encoding="utf-8") as f:
+                json.dump({**self._params(), "data": graph_name}, f)
+            os.replace(tmp_header, header_path)
+            self._remove_stale(path, keep={graph_name, previous})
+        except Exception as e:
+            logger.warning(f"HNSW index save failed: {e}")
+    
+    @classmethod
+    def _graph_name(cls, path: str) -> Optional[str]:
+        """Tên file đồ thị mà header hiện tại trỏ tới (None nếu chưa có)."""
+        try:
+            with open(cls._header_path(path), "r", encoding="utf-8") as f:
+                return json.load(f).get("data", Path(path).name)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _remove_stale(path: str, keep: set) -> None:
+        """Xóa các đồ thị cũ, giữ bản mới và bản ngay trước (worker có thể vừa đọc header cũ)."""
+        base = Path(path)
+        pattern = re.compile(re.escape(base.name) + r"(\.[0-9a-f]{12})?")
+        for graph_path in base.parent.iterdir():
+            if graph_path.name in keep or not pattern.fullmatch(graph_path.name):
+                continue
+            try:
+                graph_path.unlink()
+            except OSError:
+                pass
+    
+    def scores(self, query_embedding: Sequence[float]) -> Any:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if self.size == 0 or norm == 0:
+            return super().scores(query)
+        return AnnScores(self, query / norm)
+    
+    def _exact_top_k(self, scores: AnnScores, mask: Optional[np.ndarray], k: int) -> List[Tuple[str, float]]:
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(self.size)
+        exact = scores.exact(rows)
+        top = np.argsort(-exact, kind="stable")[:k]
+        return [(self.ids[rows[i]], float(exact[i])) for i in top]
+    
+    def top_k(self, scores: Any, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        if not isinstance(scores, AnnScores):
+            return super().top_k(scores, k, mask)
+        allowed = int(mask.sum()) if mask is not None else self.size
+        k = min(k, allowed)
+        if k <= 0:
+            return []
+        if allowed <= self.exact_below:
+            return self._exact_top_k(scores, mask, k)
+        
+        filter_fn = (lambda label: bool(mask[label])) if mask is not None else None
+        try:
+            # hnswlib dùng max(ef_search, k); num_threads=1 vì filter là callback Python
+            labels, distances = self.graph.knn_query(scores.query, k=k, num_threads=1, filter=filter_fn)
+        except RuntimeError as e:
+            # Filter quá chặt so với ef → không đủ k kết quả
+            logger.warning(f"HNSW search returned fewer than {k} results, using exact search: {e}")
+            return self._exact_top_k(scores, mask, k)
+        # space="ip": distance = 1 - dot
+        return [
+            (self.ids[int(label)], float((2.0 - distance) * 0.5))
+            for label, distance in zip(labels[0], distances[0])
+        ]
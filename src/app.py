@@ -139,7 +139,7 @@ async def on_message(message: cl.Message):
     async with cl.Step(name="Đang xử lý...") as step:
         try:
             bot = get_pipeline()
-            response = bot.process(user_message, session_id)
+            response = await bot.aprocess(user_message, session_id)
             response_text = response.message
             
             last_responses[session_id] = {
@@ -0,0 +1,109 @@
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Âm tiết đã bỏ dấu (giống KeywordMatcher.stopwords)
+STOPWORDS = frozenset({
+    "va", "hoac", "la", "cua", "cho", "voi", "trong", "tren", "duoi",
+    "nay", "do", "kia", "de", "vi", "nen", "nhung", "ma", "thi",
+    "co", "khong", "duoc", "bi", "da", "dang", "se", "roi",
+    "toi", "ban", "minh", "no", "ho", "chung", "ta", "cac"
+})
+
+_TOKEN = re.compile(r"\w+")
+
+
+def fold_accents(text: str) -> str:
+    """Lowercase + bỏ dấu tiếng Việt ("Chuyển tiền" → "chuyen tien")."""
+    text = unicodedata.normalize("NFC", text or "").lower().replace("đ", "d")
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+def vietnamese_tokens(text: str) -> List[str]:
+    """Term cho BM25: âm tiết + cặp âm tiết liền nhau, trên text đã bỏ dấu.
+    
+    Từ tiếng Việt thường gồm 2 âm tiết ("ngân hàng", "chuyển tiền") nên bigram
+    giữ được nghĩa của từ; bỏ dấu để tin nhắn gõ không dấu vẫn khớp.
+    Stopword bị bỏ khỏi unigram, bigram chứa stopword cũng bị bỏ.
+    """
+    syllables = _TOKEN.findall(fold_accents(text))
+    tokens = [s for s in syllables if s not in STOPWORDS]
+    tokens.extend(
+        f"{a}_{b}" for a, b in zip(syllables, syllables[1:])
+        if a not in STOPWORDS and b not in STOPWORDS
+    )
+    return tokens
+
+
+class BM25Index:
+    """Inverted index BM25 (Okapi) in-memory cho Problem.
+    
+    Trọng số của từng posting (idf x phần tf đã chuẩn hóa độ dài) được tính sẵn
+    lúc build, nên chấm điểm một query chỉ là cộng các mảng posting của những
+    term có trong query vào một mảng score NumPy.
+    """
+    
+    def __init__(self, documents: Iterable[Tuple[str, str]], k1: float = 1.2, b: float = 0.75):
+        self.ids: List[str] = []
+        term_freqs: List[Counter] = []
+        for problem_id, text in documents:
+            self.ids.append(problem_id)
+            term_freqs.append(Counter(vietnamese_tokens(text)))
+        self.row_of: Dict[str, int] = {problem_id: row for row, problem_id in enumerate(self.ids)}
+        self._mask_cache: Dict[Tuple[str, ...], np.ndarray] = {}
+        
+        lengths = np.array([sum(tf.values()) for tf in term_freqs], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for row, tf in enumerate(term_freqs):
+            for term, count in tf.items():
+                postings[term].append((row, count))
+        
+        n = len(self.ids)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, entries in postings.items():
+            rows = np.array([row for row, _ in entries], dtype=np.int32)
+            tf = np.array([count for _, count in entries], dtype=np.float32)
+            idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+            weights = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[rows] / avg_length))
+            self.postings[term] = (rows, weights.astype(np.float32))
+    
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+    
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term, count in Counter(vietnamese_tokens(query)).items():
+            posting = self.postings.get(term)
+            if posting is not None:
+                rows, weights = posting
+                scores[rows] += count * weights
+        return scores
+    
+    def mask_for_ids(self, problem_ids: Sequence[str]) -> np.ndarray:
+        """Boolean mask theo tập ID (cache như VectorIndex, constrained list lặp lại theo group)."""
+        key = tuple(problem_ids)
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            mask = np.zeros(len(self.ids), dtype=bool)
+            mask[[self.row_of[pid] for pid in key if pid in self.row_of]] = True
+            if len(self._mask_cache) >= 64:
+                self._mask_cache.clear()
+            self._mask_cache[key] = mask
+        return mask
+    
+    def search(self, query: str, k: int, problem_ids: Optional[Sequence[str]] = None) -> List[Tuple[str, float]]:
+        """Top-k (problem_id, bm25 score > 0), chỉ trong problem_ids nếu có."""
+        scores = self.scores(query)
+        if problem_ids is not None:
+            scores = np.where(self.mask_for_ids(problem_ids), scores, 0.0)
+        rows = np.flatnonzero(scores > 0)
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return [(self.ids[row], float(scores[row])) for row in rows]
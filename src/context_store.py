@@ -0,0 +1,44 @@
+import dataclasses
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from schema import RetrievedContext
+
+
+class ContextStore:
+    """Snapshot in-memory của mọi RetrievedContext (Problem + Answer + Topic + Group).
+    
+    Nạp một lần theo graph version, answer_steps đã tách sẵn, nên fetch_context
+    chỉ là k lần tra dict thay cho một round-trip Neo4j mỗi request.
+    Snapshot bất biến: khi graph version đổi, GraphTraversal dựng store mới rồi
+    thay cả object, request đang chạy vẫn đọc trọn vẹn store cũ.
+    """
+    
+    def __init__(self, contexts: Iterable[RetrievedContext], version: Optional[str] = None):
+        by_problem: Dict[str, List[RetrievedContext]] = {}
+        for context in contexts:
+            by_problem.setdefault(context.problem_id, []).append(context)
+        # Giữ nguyên số dòng/thứ tự như kết quả CONTEXT_CYPHER của từng Problem
+        self._by_problem: Dict[str, Tuple[RetrievedContext, ...]] = {
+            problem_id: tuple(items) for problem_id, items in by_problem.items()
+        }
+        self.version = version
+        self.size = sum(len(items) for items in self._by_problem.values())
+    
+    def __len__(self) -> int:
+        return len(self._by_problem)
+    
+    def __contains__(self, problem_id: str) -> bool:
+        return problem_id in self._by_problem
+    
+    @staticmethod
+    def _copy(context: RetrievedContext) -> RetrievedContext:
+        # Ranker ghi similarity_score lên context → mỗi request nhận bản sao riêng
+        steps = list(context.answer_steps) if context.answer_steps is not None else None
+        return dataclasses.replace(context, answer_steps=steps)
+    
+    def get(self, problem_ids: Sequence[str]) -> List[RetrievedContext]:
+        """Context của các problem_id (bỏ ID trùng/không tồn tại), theo thứ tự đầu vào."""
+        contexts = []
+        for problem_id in dict.fromkeys(problem_ids):
+            contexts.extend(self._copy(context) for context in self._by_problem.get(problem_id, ()))
+        return contexts
@@ -1,6 +1,8 @@
-﻿import logging
+﻿import asyncio
+import logging
 from typing import Optional
 
+from redis_manager import ReconnectBackoff
 from schema import (
     StructuredQueryObject,
     RankingOutput,
@@ -200,12 +202,17 @@ class DecisionEngine:
 class SessionManager:
     """Quản lý trạng thái phiên bao gồm đếm số lần hỏi lại"""
     
-    def __init__(self, redis_client=None):
+    def __init__(self, redis_client=None, async_redis_client=None):
         self.redis = redis_client
         self._redis_available = False
         self._local_store = {}
         self.ttl = Config.SESSION_TTL_SECONDS
         
+        # redis.asyncio client cho aprocess(); không ping được trong __init__
+        # nên coi là sẵn sàng, lỗi → fallback trong thời gian backoff rồi thử lại
+        self.async_redis = async_redis_client
+        self._async_backoff = ReconnectBackoff()
+        
         if self.redis:
             try:
                 self.redis.ping()
@@ -245,6 +252,53 @@ class SessionManager:
                 self._redis_available = False
         self._local_store.pop(key, None)
     
+    @property
+    def _async_redis_available(self) -> bool:
+        return self.async_redis is not None and self._async_backoff.ready
+    
+    def _async_redis_failed(self, error: Exception) -> None:
+        delay = self._async_backoff.failed()
+        logger.warning(f"Async Redis clarify count error: {error}. Retrying in {delay:.0f}s")
+    
+    async def aget_clarify_count(self, session_id: str) -> int:
+        if self._async_redis_available:
+            try:
+                count = await self.async_redis.get(f"clarify:{session_id}")
+                return int(count) if count else 0
+            except Exception as e:
+                self._async_redis_failed(e)
+        if self._redis_available:
+            return await asyncio.to_thread(self.get_clarify_count, session_id)
+        return self._local_store.get(f"clarify:{session_id}", 0)
+    
+    async def aincrement_clarify_count(self, session_id: str) -> int:
+        key = f"clarify:{session_id}"
+        if self._async_redis_available:
+            try:
+                count = await self.async_redis.incr(key)
+                await self.async_redis.expire(key, self.ttl)
+                return int(count)
+            except Exception as e:
+                self._async_redis_failed(e)
+        if self._redis_available:
+            return await asyncio.to_thread(self.increment_clarify_count, session_id)
+        current = self._local_store.get(key, 0)
+        self._local_store[key] = current + 1
+        return current + 1
+    
+    async def areset_clarify_count(self, session_id: str) -> None:
+        key = f"clarify:{session_id}"
+        if self._async_redis_available:
+            try:
+                await self.async_redis.delete(key)
+                return
+            except Exception as e:
+                self._async_redis_failed(e)
+        if self._redis_available:
+            await asyncio.to_thread(self.reset_clarify_count, session_id)
+            return
+        self._local_store.pop(key, None)
+    
     def should_increment_clarify(self, decision: Decision) -> bool:
         return decision.type == DecisionType.CLARIFY_REQUIRED
     
@@ -0,0 +1,213 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from schema import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _to_vector(embedding: Any) -> np.ndarray:
+    """Embedding từ OpenAI response → float32 contiguous, read-only.
+    
+    Request với encoding_format="base64" nên response là chuỗi base64 của các
+    float32 little-endian; giải mã thẳng thành buffer, không qua list[float]
+    (~50 KB object Python / 1536 chiều so với ~6 KB). List vẫn được chấp nhận.
+    """
+    if isinstance(embedding, str):
+        vector = np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+    else:
+        vector = np.array(embedding, dtype=np.float32)
+    # Dùng chung giữa cache và các request → không cho sửa tại chỗ
+    vector.flags.writeable = False
+    return vector
+
+
+def _read_only_rows(matrix: np.ndarray) -> List[np.ndarray]:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    matrix.flags.writeable = False
+    return list(matrix)
+
+
+class EmbeddingProvider:
+    """Nguồn embedding dùng chung cho retrieval, ingestion và RAGAS eval.
+    
+    model_id + dimension được ghi vào EmbeddingStore header, GraphMeta và key
+    của EmbeddingCache, nên vectors tạo bởi provider khác không bị dùng lẫn.
+    Lớp con chỉ cần cài embed_many(); bản async mặc định chạy trên thread pool.
+    """
+    
+    model_id: str
+    dimension: int
+    
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+    
+    def embed_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        raise NotImplementedError
+    
+    async def aembed_one(self, text: str) -> np.ndarray:
+        return (await self.aembed_many([text]))[0]
+    
+    async def aembed_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        return await asyncio.to_thread(self.embed_many, list(texts))
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(model_id={self.model_id!r}, dimension={self.dimension})"
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API (sync + AsyncOpenAI), response dạng base64 float32."""
+    
+    # Số chiều mặc định của các model OpenAI
+    MODEL_DIMENSIONS = {
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536,
+    }
+    MAX_BATCH = 2048  # giới hạn số input mỗi request của API
+    
+    def __init__(self, client, async_client=None, model: str = Config.EMBEDDING_MODEL, dimension: Optional[int] = None):
+        self.client = client
+        self.async_client = async_client
+        self.model_id = model
+        self.dimension = dimension or self.MODEL_DIMENSIONS.get(model, Config.EMBEDDING_DIMENSION)
+    
+    def _batches(self, texts: Sequence[str]) -> List[List[str]]:
+        texts = list(texts)
+        return [texts[i:i + self.MAX_BATCH] for i in range(0, len(texts), self.MAX_BATCH)]
+    
+    @staticmethod
+    def _vectors(response) -> List[np.ndarray]:
+        items = sorted(response.data, key=lambda item: getattr(item, "index", 0))
+        return [_to_vector(item.embedding) for item in items]
+    
+    def embed_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        vectors = []
+        for batch in self._batches(texts):
+            response = self.client.embeddings.create(model=self.model_id, input=batch, encoding_format="base64")
+            vectors.extend(self._vectors(response))
+        return vectors
+    
+    async def aembed_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        if self.async_client is None:
+            return await super().aembed_many(texts)
+        vectors = []
+        for batch in self._batches(texts):
+            response = await self.async_client.embeddings.create(model=self.model_id, input=batch, encoding_format="base64")
+            vectors.extend(self._vectors(response))
+        return vectors
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """Model sentence-transformers chạy trên CPU, nạp từ thư mục local.
+    
+    Không có network round-trip trên đường request. backend="onnx" dùng
+    ONNX Runtime (sentence-transformers >= 3.2) nếu thư mục model có bản ONNX.
+    """
+    
+    def __init__(self, model_path: str, backend: Optional[str] = None, batch_size: int = 32, device: str = "cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("LocalEmbeddingProvider cần sentence-transformers: pip install sentence-transformers") from e
+        
+        kwargs = {"device": device}
+        if backend:
+            kwargs["backend"] = backend
+        self.model = SentenceTransformer(model_path, **kwargs)
+        self.model_id = f"local:{Path(model_path).name}" + (f":{backend}" if backend else "")
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+        # Encode trên CPU đã dùng hết core → chạy tuần tự thay vì tranh nhau giữa các thread
+        self._lock = threading.Lock()
+        logger.info(f"Local embedding model loaded: {model_path} ({self.dimension} dims, backend={backend or 'torch'})")
+    
+    def embed_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        if not texts:
+            return []
+        with self._lock:
+            matrix = self.model.encode(
+                list(texts),
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        return _read_only_rows(matrix)
+
+
+class HashEmbeddingProvider(EmbeddingProvider):
+    """Embedding tất định không cần model/network, dùng để chạy offline và test.
+    
+    Feature hashing của từ + trigram ký tự trên text đã bỏ dấu (blake2b, không phụ
+    thuộc PYTHONHASHSEED), chuẩn hóa L2. Câu có nhiều từ chung cho cosine cao, đủ để chạy thử toàn pipeline.
+    """
+    
+    _TOKEN = re.compile(r"\w+")
+    
+    def __init__(self, dimension: int = Config.HASH_EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self.model_id = f"hash-v1:{dimension}"
+    
+    @staticmethod
+    def _fold(text: str) -> str:
+        text = (text or "").lower().replace("đ", "d")
+        return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+    
+    def _features(self, text: str) -> List[str]:
+        words = self._TOKEN.findall(self._fold(text))
+        features = [f"w:{word}" for word in words]
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+    
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimension] += 1.0 if (digest >> 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def embed_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        if not texts:
+            return []
+        return _read_only_rows(np.stack([self._embed(text) for text in texts]))
+
+
+def create_embedding_provider(
+    name: Optional[str] = None,
+    client=None,
+    async_client=None,
+    model_path: Optional[str] = None
+) -> EmbeddingProvider:
+    """Tạo provider theo tên (mặc định env EMBEDDING_PROVIDER, rồi Config.EMBEDDING_PROVIDER).
+    
+    - "openai": cần client (OpenAI), async_client tùy chọn
+    - "local": model_path hoặc env LOCAL_EMBEDDING_MODEL_PATH; env LOCAL_EMBEDDING_BACKEND=onnx
+    - "hash": HashEmbeddingProvider tất định, chạy offline
+    """
+    name = (name or os.getenv("EMBEDDING_PROVIDER") or Config.EMBEDDING_PROVIDER).lower()
+    if name == "openai":
+        if client is None:
+            raise ValueError("EMBEDDING_PROVIDER=openai cần OpenAI client (OPENAI_API_KEY)")
+        return OpenAIEmbeddingProvider(client, async_client)
+    if name == "local":
+        return LocalEmbeddingProvider(
+            model_path or os.getenv("LOCAL_EMBEDDING_MODEL_PATH", Config.LOCAL_EMBEDDING_MODEL_PATH),
+            backend=os.getenv("LOCAL_EMBEDDING_BACKEND") or None
+        )
+    if name == "hash":
+        return HashEmbeddingProvider()
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {name} (openai | local | hash)")
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """Embeddings lưu trên đĩa, mở bằng memory-map.
+    
+    Gồm hai file cạnh nhau:
+    - `<path>.<token>.npy`: ma trận float32 (count x dimension), các row đã chuẩn hóa L2
+    - `<path>.json`: header {model, dimension, count, version, ids, data}, `data` là
+      tên file ma trận; header được thay sau cùng nên luôn trỏ đúng ma trận của nó
+    
+    Mở bằng `np.load(mmap_mode="r")` nên nhiều worker process dùng chung một
+    bản trong page cache thay vì mỗi process kéo vectors từ Neo4j/OpenAI.
+    """
+    
+    def __init__(self, ids: Sequence[str], matrix: np.ndarray, model: str, dimension: int, version: Optional[str] = None):
+        self.ids = list(ids)
+        self.matrix = matrix
+        self.model = model
+        self.dimension = dimension
+        self.version = version
+        self.row_of: Dict[str, int] = {key: row for row, key in enumerate(self.ids)}
+    
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.row_of
+    
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.row_of.get(key)
+        return self.matrix[row] if row is not None else None
+    
+    @staticmethod
+    def _paths(path: str) -> tuple:
+        base = Path(path)
+        return base.with_name(base.name + ".npy"), base.with_name(base.name + ".json")
+    
+    @classmethod
+    def open(cls, path: str, model: Optional[str] = None, dimension: Optional[int] = None) -> "EmbeddingStore":
+        """Mở store (zero-copy). Raise FileNotFoundError nếu chưa có, ValueError nếu khác model/dimension."""
+        npy_path, header_path = cls._paths(path)
+        with open(header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("data"):
+            npy_path = header_path.with_name(header["data"])
+        if model is not None and header["model"] != model:
+            raise ValueError(f"Embedding store model {header['model']} != {model}")
+        if dimension is not None and header["dimension"] != dimension:
+            raise ValueError(f"Embedding store dimension {header['dimension']} != {dimension}")
+        
+        matrix = np.load(npy_path, mmap_mode="r")
+        if matrix.shape != (header["count"], header["dimension"]) or len(header["ids"]) != header["count"]:
+            raise ValueError(f"Embedding store {path} bị lệch giữa header và ma trận")
+        return cls(header["ids"], matrix, header["model"], header["dimension"], header.get("version"))
+    
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        ids: Sequence[str],
+        vectors: Any,
+        model: str,
+        dimension: int,
+        version: Optional[str] = None
+    ) -> "EmbeddingStore":
+        """Ghi store mới (chuẩn hóa L2): ma trận vào file mới, rồi os.replace header.
+        
+        Chỉ header được thay (atomic) nên reader không bao giờ thấy ma trận mới
+        đi với header cũ. Process đang mmap bản cũ vẫn đọc được bản đó cho tới khi mở lại.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), dimension)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = np.ascontiguousarray(matrix / norms, dtype=np.float32)
+        
+        _, header_path = cls._paths(path)
+        header_path.parent.mkdir(parents=True, exist_ok=True)
+        previous = cls._data_name(header_path)
+        data_name = f"{Path(path).name}.{uuid.uuid4().hex[:12]}.npy"
+        tmp_header = header_path.with_name(f"{header_path.name}.{os.getpid()}.tmp")
+        with open(header_path.with_name(data_name), "wb") as f:
+            np.save(f, matrix)
+        with open(tmp_header, "w", encoding="utf-8") as f:
+            json.dump({
+                "model": model,
+                "dimension": dimension,
+                "count": len(ids),
+                "version": version,
+                "ids": list(ids),
+                "data": data_name,
+            }, f)
+        os.replace(tmp_header, header_path)
+        cls._remove_stale(path, keep={data_name, previous})
+        logger.info(f"Embedding store written: {path} ({len(ids)} x {dimension}, model={model}, version={version})")
+        return cls.open(path)
+    
+    @staticmethod
+    def _data_name(header_path: Path) -> Optional[str]:
+        """Tên file ma trận mà header hiện tại trỏ tới (None nếu chưa có store)."""
+        try:
+            with open(header_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return header.get("data") or header_path.with_suffix(".npy").name
+    
+    @staticmethod
+    def _remove_stale(path: str, keep: set) -> None:
+        """Xóa các file ma trận cũ, giữ bản mới và bản ngay trước (reader có thể vừa đọc header cũ)."""
+        base = Path(path)
+        pattern = re.compile(re.escape(base.name) + r"(\.[0-9a-f]{12})?\.npy")
+        for data_path in base.parent.iterdir():
+            if data_path.name in keep or not pattern.fullmatch(data_path.name):
+                continue
+            try:
+                data_path.unlink()
+            except OSError:
+                pass
+    
+    @classmethod
+    def merged(cls, store: Optional["EmbeddingStore"], new_vectors: Dict[str, List[float]]) -> tuple:
+        """ids và vectors của store cũ cộng thêm new_vectors (ghi đè key trùng), để write lại."""
+        ids = [key for key in (store.ids if store is not None else []) if key not in new_vectors]
+        vectors = [store.get(key) for key in ids]
+        ids.extend(new_vectors.keys())
+        vectors.extend(new_vectors.values())
+        return ids, vectors
@@ -1,39 +1,151 @@
 import os
 import csv
+import json
+import time
+import random
+import hashlib
 import logging
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
 from pathlib import Path
 
 from neo4j import GraphDatabase
-from openai import OpenAI
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
 from dotenv import load_dotenv
 
+from schema import Config
+from embedding_store import EmbeddingStore
+from ann_index import HnswVectorIndex
+from embedding_provider import EmbeddingProvider, OpenAIEmbeddingProvider, create_embedding_provider
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _content_hash(row: Dict[str, Any], fields: List[str]) -> str:
+    """Hash ổn định của các field trong một dòng CSV, dùng để phát hiện thay đổi giữa các lần nạp."""
+    payload = "\x1f".join(str(row.get(field) or "") for field in fields)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TokenBucket:
+    """Token bucket thread-safe giới hạn số request embedding mỗi phút."""
+    
+    def __init__(self, requests_per_minute: float, capacity: Optional[float] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
 class DataIngestion:
     """Nạp dữ liệu CSV vào Neo4j."""
     
+    # Mỗi Cypher nhận một chunk rows qua UNWIND; MERGE giữ cho việc nạp lại là idempotent
+    GROUP_CYPHER = """
+    UNWIND $rows AS row
+    MERGE (g:Group {id: row.id})
+    SET g.name = row.name, g.description = row.description, g.order = toInteger(row.order),
+        g.content_hash = row.content_hash
+    """
+    
+    TOPIC_CYPHER = """
+    UNWIND $rows AS row
+    MERGE (t:Topic {id: row.id})
+    SET t.name = row.name, t.group_id = row.group_id, t.keywords = row.keywords, t.order = toInteger(row.order),
+        t.content_hash = row.content_hash
+    """
+    
+    # Embedding cũ bị xóa khi text đầu vào embedding (title + description) đổi,
+    # để generate_embeddings chỉ embed lại đúng những Problem đó
+    PROBLEM_CYPHER = """
+    UNWIND $rows AS row
+    MERGE (p:Problem {id: row.id})
+    FOREACH (_ IN CASE WHEN p.embedding_hash IS NULL OR p.embedding_hash <> row.embedding_hash THEN [1] ELSE [] END |
+        REMOVE p.embedding)
+    SET p.title = row.title, p.description = row.description, p.intent = row.intent,
+        p.keywords = row.keywords, p.sample_questions = row.sample_questions, p.status = row.status,
+        p.content_hash = row.content_hash, p.embedding_hash = row.embedding_hash
+    """
+    
+    ANSWER_CYPHER = """
+    UNWIND $rows AS row
+    MERGE (a:Answer {id: row.id})
+    SET a.summary = row.summary, a.content = row.content, a.steps = row.steps, a.notes = row.notes, a.status = row.status,
+        a.content_hash = row.content_hash
+    """
+    
+    HAS_TOPIC_CYPHER = """
+    UNWIND $rows AS row
+    MATCH (g:Group {id: row.start_id}) MATCH (t:Topic {id: row.end_id}) MERGE (g)-[:HAS_TOPIC]->(t)
+    """
+    
+    HAS_PROBLEM_CYPHER = """
+    UNWIND $rows AS row
+    MATCH (t:Topic {id: row.start_id}) MATCH (p:Problem {id: row.end_id}) MERGE (t)-[:HAS_PROBLEM]->(p)
+    """
+    
+    HAS_ANSWER_CYPHER = """
+    UNWIND $rows AS row
+    MATCH (p:Problem {id: row.start_id}) MATCH (a:Answer {id: row.end_id}) MERGE (p)-[:HAS_ANSWER]->(a)
+    """
+    
+    EMBEDDING_CYPHER = """
+    UNWIND $rows AS row
+    MATCH (p:Problem {id: row.id}) SET p.embedding = row.embedding
+    """
+    
+    # Lỗi tạm thời của OpenAI được retry với exponential backoff
+    RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+    
     def __init__(
         self,
         neo4j_uri: str,
         neo4j_user: str,
         neo4j_password: str,
         openai_api_key: str = None,
-        data_dir: str = "external_data_v3"
+        data_dir: str = "external_data_v3",
+        batch_size: int = 500,
+        embedding_workers: int = 4,
+        embedding_rpm: int = 500,
+        checkpoint_path: str = ".embedding_checkpoint.jsonl",
+        embedding_store_path: str = Config.PROBLEM_EMBEDDING_STORE,
+        embedding_provider: Optional[EmbeddingProvider] = None
     ):
         self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.batch_size = batch_size
+        self.embedding_workers = embedding_workers
+        self.embedding_rpm = embedding_rpm
+        self.checkpoint_path = Path(checkpoint_path)
+        self.embedding_store_path = embedding_store_path
         self.data_dir = Path(data_dir)
         self.supplement_dir = Path("db/import")  # Secondary directory for supplement files
         
-        if openai_api_key:
-            self.openai = OpenAI(api_key=openai_api_key)
+        if embedding_provider is not None:
+            self.embedding_provider = embedding_provider
+        elif openai_api_key:
+            self.embedding_provider = OpenAIEmbeddingProvider(OpenAI(api_key=openai_api_key))
         else:
-            self.openai = None
-            logger.warning("Không có OpenAI key - bỏ qua embeddings")
+            self.embedding_provider = None
+            logger.warning("Không có OpenAI key / embedding provider - bỏ qua embeddings")
+        self._embeddings_generated = False
     
     def close(self):
         self.driver.close()
@@ -83,30 +195,54 @@ class DataIngestion:
         with open(filepath, "r", encoding="utf-8-sig") as f:
             return list(csv.DictReader(f))
     
-    def ingest_groups(self):
-        logger.info("Nạp Groups...")
-        groups = self.read_csv("nodes_group.csv")
+    def _run_batched(self, cypher: str, rows: List[Dict[str, Any]], label: str) -> int:
+        """Ghi rows theo chunk batch_size, mỗi chunk một transaction UNWIND."""
+        if not rows:
+            return 0
+        start = time.perf_counter()
         with self.driver.session() as session:
-            for g in groups:
-                session.run("""
-                    MERGE (g:Group {id: $id})
-                    SET g.name = $name, g.description = $description, g.order = toInteger($order)
-                """, {"id": g["id"], "name": g["name"], "description": g.get("description", ""), "order": g.get("order", 0)})
-        logger.info(f"Đã nạp {len(groups)} Groups")
+            for i in range(0, len(rows), self.batch_size):
+                chunk = rows[i:i + self.batch_size]
+                session.execute_write(lambda tx, chunk=chunk: tx.run(cypher, {"rows": chunk}).consume())
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        logger.info(f"{label}: {len(rows)} rows trong {elapsed:.2f}s ({len(rows) / elapsed:.0f} rows/s, batch={self.batch_size})")
+        return len(rows)
     
-    def ingest_topics(self):
-        logger.info("Nạp Topics...")
-        topics = self.read_csv("nodes_topic.csv")
-        with self.driver.session() as session:
-            for t in topics:
-                session.run("""
-                    MERGE (t:Topic {id: $id})
-                    SET t.name = $name, t.group_id = $group_id, t.keywords = $keywords, t.order = toInteger($order)
-                """, {"id": t["id"], "name": t["name"], "group_id": t.get("group_id", ""), "keywords": t.get("keywords", ""), "order": t.get("order", 0)})
-        logger.info(f"Đã nạp {len(topics)} Topics")
+    @staticmethod
+    def _embedding_text(title: str, description: str) -> str:
+        return f"{title} {description or ''}".strip()
     
-    def ingest_problems(self):
-        logger.info("Nạp Problems...")
+    def _group_rows(self) -> List[Dict[str, Any]]:
+        rows = [{"id": g["id"], "name": g["name"], "description": g.get("description", ""), "order": g.get("order", 0)}
+                for g in self.read_csv("nodes_group.csv")]
+        for row in rows:
+            row["content_hash"] = _content_hash(row, ["name", "description", "order"])
+        return rows
+    
+    def _topic_rows(self) -> List[Dict[str, Any]]:
+        rows = [{"id": t["id"], "name": t["name"], "group_id": t.get("group_id", ""), "keywords": t.get("keywords", ""), "order": t.get("order", 0)}
+                for t in self.read_csv("nodes_topic.csv")]
+        for row in rows:
+            row["content_hash"] = _content_hash(row, ["name", "group_id", "keywords", "order"])
+        return rows
+    
+    @classmethod
+    def _problem_row(cls, p: Dict[str, Any]) -> Dict[str, Any]:
+        row = {"id": p["id"], "title": p["title"], "description": p.get("description", ""), 
+               "intent": p.get("intent", ""), "keywords": p.get("keywords", ""), 
+               "sample_questions": p.get("sample_questions", ""), "status": p.get("status", "active")}
+        row["content_hash"] = _content_hash(row, ["title", "description", "intent", "keywords", "sample_questions", "status"])
+        row["embedding_hash"] = hashlib.sha256(cls._embedding_text(row["title"], row["description"]).encode("utf-8")).hexdigest()
+        return row
+    
+    @staticmethod
+    def _answer_row(a: Dict[str, Any]) -> Dict[str, Any]:
+        row = {"id": a["id"], "summary": a.get("summary", a.get("title", "")), "content": a.get("content", ""), 
+               "steps": a.get("steps", ""), "notes": a.get("notes", ""), "status": a.get("status", "active")}
+        row["content_hash"] = _content_hash(row, ["summary", "content", "steps", "notes", "status"])
+        return row
+    
+    def _problem_rows(self) -> List[Dict[str, Any]]:
         problems = self.read_csv("nodes_problem.csv")
         
         # Also load supplement problems if exists
@@ -114,20 +250,9 @@ class DataIngestion:
         if supplement_problems:
             logger.info(f"Tìm thấy {len(supplement_problems)} supplement problems")
             problems.extend(supplement_problems)
-        
-        with self.driver.session() as session:
-            for p in problems:
-                session.run("""
-                    MERGE (p:Problem {id: $id})
-                    SET p.title = $title, p.description = $description, p.intent = $intent, 
-                        p.keywords = $keywords, p.sample_questions = $sample_questions, p.status = $status
-                """, {"id": p["id"], "title": p["title"], "description": p.get("description", ""), 
-                      "intent": p.get("intent", ""), "keywords": p.get("keywords", ""), 
-                      "sample_questions": p.get("sample_questions", ""), "status": p.get("status", "active")})
-        logger.info(f"Đã nạp {len(problems)} Problems")
+        return [self._problem_row(p) for p in problems]
     
-    def ingest_answers(self):
-        logger.info("Nạp Answers...")
+    def _answer_rows(self) -> List[Dict[str, Any]]:
         answers = self.read_csv("nodes_answer.csv")
         
         # Also load supplement answers if exists
@@ -135,15 +260,42 @@ class DataIngestion:
         if supplement_answers:
             logger.info(f"Tìm thấy {len(supplement_answers)} supplement answers")
             answers.extend(supplement_answers)
+        return [self._answer_row(a) for a in answers]
+    
+    def _rel_rows(self, filename: str, supplement_filename: str = None) -> List[Dict[str, Any]]:
+        rels = self.read_csv(filename)
         
-        with self.driver.session() as session:
-            for a in answers:
-                session.run("""
-                    MERGE (a:Answer {id: $id})
-                    SET a.summary = $summary, a.content = $content, a.steps = $steps, a.notes = $notes, a.status = $status
-                """, {"id": a["id"], "summary": a.get("summary", a.get("title", "")), "content": a.get("content", ""), 
-                      "steps": a.get("steps", ""), "notes": a.get("notes", ""), "status": a.get("status", "active")})
-        logger.info(f"Đã nạp {len(answers)} Answers")
+        # Also load supplement relationships
+        if supplement_filename:
+            supplement_rels = self.read_csv(supplement_filename)
+            if supplement_rels:
+                logger.info(f"Tìm thấy {len(supplement_rels)} supplement relationships ({supplement_filename})")
+                rels.extend(supplement_rels)
+        return [{"start_id": r["start_id"], "end_id": r["end_id"]} for r in rels]
+    
+    def ingest_groups(self):
+        logger.info("Nạp Groups...")
+        rows = self._group_rows()
+        self._run_batched(self.GROUP_CYPHER, rows, "Groups")
+        logger.info(f"Đã nạp {len(rows)} Groups")
+    
+    def ingest_topics(self):
+        logger.info("Nạp Topics...")
+        rows = self._topic_rows()
+        self._run_batched(self.TOPIC_CYPHER, rows, "Topics")
+        logger.info(f"Đã nạp {len(rows)} Topics")
+    
+    def ingest_problems(self):
+        logger.info("Nạp Problems...")
+        rows = self._problem_rows()
+        self._run_batched(self.PROBLEM_CYPHER, rows, "Problems")
+        logger.info(f"Đã nạp {len(rows)} Problems")
+    
+    def ingest_answers(self):
+        logger.info("Nạp Answers...")
+        rows = self._answer_rows()
+        self._run_batched(self.ANSWER_CYPHER, rows, "Answers")
+        logger.info(f"Đã nạp {len(rows)} Answers")
     
     def create_relationships(self):
         logger.info("Tạo relationships...")
@@ -153,81 +305,284 @@ class DataIngestion:
         logger.info("Đã tạo relationships")
     
     def _create_has_topic_rels(self):
-        rels = self.read_csv("rels_has_topic.csv")
-        with self.driver.session() as session:
-            for r in rels:
-                session.run("MATCH (g:Group {id: $start_id}) MATCH (t:Topic {id: $end_id}) MERGE (g)-[:HAS_TOPIC]->(t)", 
-                           {"start_id": r["start_id"], "end_id": r["end_id"]})
-        logger.info(f"Đã tạo {len(rels)} HAS_TOPIC")
+        rows = self._rel_rows("rels_has_topic.csv")
+        self._run_batched(self.HAS_TOPIC_CYPHER, rows, "HAS_TOPIC")
+        logger.info(f"Đã tạo {len(rows)} HAS_TOPIC")
     
     def _create_has_problem_rels(self):
-        rels = self.read_csv("rels_has_problem.csv")
-        
-        # Also load supplement relationships
-        supplement_rels = self.read_csv("rels_has_problem_supplement.csv")
-        if supplement_rels:
-            logger.info(f"Tìm thấy {len(supplement_rels)} supplement problem relationships")
-            rels.extend(supplement_rels)
+        rows = self._rel_rows("rels_has_problem.csv", "rels_has_problem_supplement.csv")
+        self._run_batched(self.HAS_PROBLEM_CYPHER, rows, "HAS_PROBLEM")
+        logger.info(f"Đã tạo {len(rows)} HAS_PROBLEM")
+    
+    def _create_has_answer_rels(self):
+        rows = self._rel_rows("rels_has_answer.csv", "rels_has_answer_supplement.csv")
+        self._run_batched(self.HAS_ANSWER_CYPHER, rows, "HAS_ANSWER")
+        logger.info(f"Đã tạo {len(rows)} HAS_ANSWER")
+    
+    def _sync_nodes(self, label: str, cypher: str, rows: List[Dict[str, Any]]) -> int:
+        """Upsert các dòng có content_hash khác trong graph, xóa node không còn trong CSV."""
+        with self.driver.session() as session:
+            existing = {
+                record["id"]: record["content_hash"]
+                for record in session.run(f"MATCH (n:{label}) RETURN n.id AS id, n.content_hash AS content_hash")
+            }
+        changed = [row for row in rows if existing.get(row["id"]) != row["content_hash"]]
+        current_ids = {row["id"] for row in rows}
+        gone = [{"id": node_id} for node_id in existing if node_id not in current_ids]
         
+        self._run_batched(cypher, changed, f"{label} upsert (delta)")
+        self._run_batched(f"UNWIND $rows AS row MATCH (n:{label} {{id: row.id}}) DETACH DELETE n", gone, f"{label} delete (delta)")
+        logger.info(f"{label}: {len(changed)} thay đổi, {len(gone)} bị xóa, {len(rows) - len(changed)} giữ nguyên")
+        return len(changed) + len(gone)
+    
+    def _sync_rels(self, start_label: str, rel_type: str, end_label: str, cypher: str, rows: List[Dict[str, Any]]) -> int:
         with self.driver.session() as session:
-            for r in rels:
-                session.run("MATCH (t:Topic {id: $start_id}) MATCH (p:Problem {id: $end_id}) MERGE (t)-[:HAS_PROBLEM]->(p)", 
-                           {"start_id": r["start_id"], "end_id": r["end_id"]})
-        logger.info(f"Đã tạo {len(rels)} HAS_PROBLEM")
+            existing = {
+                (record["start_id"], record["end_id"])
+                for record in session.run(
+                    f"MATCH (s:{start_label})-[:{rel_type}]->(e:{end_label}) RETURN s.id AS start_id, e.id AS end_id"
+                )
+            }
+        wanted = {(row["start_id"], row["end_id"]) for row in rows}
+        added = [{"start_id": s, "end_id": e} for s, e in wanted - existing]
+        gone = [{"start_id": s, "end_id": e} for s, e in existing - wanted]
+        
+        self._run_batched(cypher, added, f"{rel_type} add (delta)")
+        self._run_batched(
+            f"UNWIND $rows AS row MATCH (:{start_label} {{id: row.start_id}})-[r:{rel_type}]->(:{end_label} {{id: row.end_id}}) DELETE r",
+            gone, f"{rel_type} delete (delta)"
+        )
+        return len(added) + len(gone)
     
-    def _create_has_answer_rels(self):
-        rels = self.read_csv("rels_has_answer.csv")
+    def run_delta_ingestion(self, generate_embeddings: bool = True) -> int:
+        """Chỉ ghi phần thay đổi so với graph hiện tại, thay cho clear + nạp lại toàn bộ.
         
-        # Also load supplement relationships
-        supplement_rels = self.read_csv("rels_has_answer_supplement.csv")
-        if supplement_rels:
-            logger.info(f"Tìm thấy {len(supplement_rels)} supplement answer relationships")
-            rels.extend(supplement_rels)
+        So content_hash của từng dòng CSV với hash lưu trên node: dòng đổi được
+        upsert, node/relationship không còn trong CSV bị xóa. Problem chỉ bị
+        embed lại khi title/description đổi (embedding_hash). Graph nạp bằng
+        phiên bản cũ chưa có hash sẽ được ghi lại toàn bộ ở lần chạy đầu tiên.
+        """
+        logger.info("Bắt đầu nạp delta...")
+        self.create_constraints()
         
-        with self.driver.session() as session:
-            for r in rels:
-                session.run("MATCH (p:Problem {id: $start_id}) MATCH (a:Answer {id: $end_id}) MERGE (p)-[:HAS_ANSWER]->(a)", 
-                           {"start_id": r["start_id"], "end_id": r["end_id"]})
-        logger.info(f"Đã tạo {len(rels)} HAS_ANSWER")
-    
-    def generate_embeddings(self, batch_size: int = 50):
-        if not self.openai:
-            logger.warning("Bỏ qua embeddings - không có OpenAI client")
-            return
-        logger.info("Tạo embeddings cho Problems...")
+        changes = 0
+        changes += self._sync_nodes("Group", self.GROUP_CYPHER, self._group_rows())
+        changes += self._sync_nodes("Topic", self.TOPIC_CYPHER, self._topic_rows())
+        changes += self._sync_nodes("Problem", self.PROBLEM_CYPHER, self._problem_rows())
+        changes += self._sync_nodes("Answer", self.ANSWER_CYPHER, self._answer_rows())
+        changes += self._sync_rels("Group", "HAS_TOPIC", "Topic", self.HAS_TOPIC_CYPHER, self._rel_rows("rels_has_topic.csv"))
+        changes += self._sync_rels("Topic", "HAS_PROBLEM", "Problem", self.HAS_PROBLEM_CYPHER,
+                                   self._rel_rows("rels_has_problem.csv", "rels_has_problem_supplement.csv"))
+        changes += self._sync_rels("Problem", "HAS_ANSWER", "Answer", self.HAS_ANSWER_CYPHER,
+                                   self._rel_rows("rels_has_answer.csv", "rels_has_answer_supplement.csv"))
+        
+        if generate_embeddings:
+            # Đổi provider → embed lại toàn bộ, cũng cần version + embedding store mới
+            changes += self.generate_embeddings()
+            self.create_vector_index()
+        
+        if changes:
+            self.export_embedding_store(self.bump_graph_version())
+        else:
+            logger.info("Không có thay đổi, giữ nguyên graph version")
+        self._print_summary()
+        logger.info(f"Hoàn thành nạp delta: {changes} thay đổi")
+        return changes
+    
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def _load_checkpoint(self) -> Dict[str, Dict[str, Any]]:
+        """Embeddings đã lấy từ API ở lần chạy bị gián đoạn trước: id -> {text_hash, embedding}."""
+        if not self.checkpoint_path.exists():
+            return {}
+        checkpoint = {}
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # dòng cuối bị cắt khi process dừng giữa chừng
+                checkpoint[entry["id"]] = entry
+        return checkpoint
+    
+    def _embed_batch(self, texts: List[str], bucket: TokenBucket, max_retries: int) -> List[List[float]]:
+        for attempt in range(max_retries + 1):
+            bucket.acquire()
+            try:
+                # Neo4j driver và checkpoint JSON cần list[float]
+                return [vector.tolist() for vector in self.embedding_provider.embed_many(texts)]
+            except self.RETRYABLE_ERRORS as e:
+                if attempt == max_retries:
+                    raise
+                delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+                logger.warning(f"Embedding lỗi tạm thời, thử lại {attempt + 1}/{max_retries} sau {delay:.1f}s: {e}")
+                time.sleep(delay)
+    
+    def generate_embeddings(self, batch_size: int = 50, max_retries: int = 5) -> int:
+        """Embed các Problem chưa có embedding, trả về số Problem được ghi embedding."""
+        if not self.embedding_provider:
+            logger.warning("Bỏ qua embeddings - không có embedding provider")
+            return 0
+        logger.info(f"Tạo embeddings cho Problems ({self.embedding_provider.model_id})...")
+        self._reset_embeddings_if_provider_changed()
+        self._embeddings_generated = True
         with self.driver.session() as session:
             result = session.run("MATCH (p:Problem) WHERE p.embedding IS NULL RETURN p.id AS id, p.title AS title, p.description AS description")
             problems = list(result)
         logger.info(f"Tìm thấy {len(problems)} problems cần embed")
-        for i in range(0, len(problems), batch_size):
-            batch = problems[i:i + batch_size]
-            texts, ids = [], []
-            for p in batch:
-                texts.append(f"{p['title']} {p['description'] or ''}".strip())
-                ids.append(p["id"])
-            try:
-                response = self.openai.embeddings.create(model="text-embedding-3-small", input=texts)
-                with self.driver.session() as session:
-                    for j, emb in enumerate(response.data):
-                        session.run("MATCH (p:Problem {id: $id}) SET p.embedding = $embedding", {"id": ids[j], "embedding": emb.embedding})
-                logger.info(f"Đã embed batch {i//batch_size + 1}")
-            except Exception as e:
-                logger.error(f"Lỗi tạo embeddings: {e}")
+        texts = {p["id"]: self._embedding_text(p["title"], p["description"]) for p in problems}
+        
+        # Resume: vector đã có trong checkpoint (cùng text, cùng model) được ghi lại mà không gọi API
+        model_id = self.embedding_provider.model_id
+        checkpoint = self._load_checkpoint()
+        resumed = [
+            {"id": pid, "embedding": checkpoint[pid]["embedding"]}
+            for pid, text in texts.items()
+            if pid in checkpoint and checkpoint[pid]["text_hash"] == self._text_hash(text)
+            and checkpoint[pid].get("model", Config.EMBEDDING_MODEL) == model_id
+        ]
+        if resumed:
+            self._run_batched(self.EMBEDDING_CYPHER, resumed, "Embeddings (checkpoint)")
+        resumed_ids = {row["id"] for row in resumed}
+        pending = [pid for pid in texts if pid not in resumed_ids]
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        
+        bucket = TokenBucket(self.embedding_rpm)
+        embedded, failed = 0, 0
+        start = time.perf_counter()
+        with open(self.checkpoint_path, "a", encoding="utf-8") as ckpt, \
+                ThreadPoolExecutor(max_workers=self.embedding_workers) as pool:
+            futures = {
+                pool.submit(self._embed_batch, [texts[pid] for pid in batch], bucket, max_retries): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    vectors = future.result()
+                except Exception as e:
+                    logger.error(f"Lỗi tạo embeddings: {e}")
+                    failed += len(batch)
+                    continue
+                rows = [{"id": pid, "embedding": vector} for pid, vector in zip(batch, vectors)]
+                # Ghi checkpoint trước Neo4j để lỗi ghi cũng không phải gọi lại API
+                for row in rows:
+                    ckpt.write(json.dumps({
+                        "id": row["id"], "text_hash": self._text_hash(texts[row["id"]]),
+                        "model": model_id, "embedding": row["embedding"]
+                    }) + "\n")
+                ckpt.flush()
+                try:
+                    with self.driver.session() as session:
+                        session.execute_write(lambda tx, rows=rows: tx.run(self.EMBEDDING_CYPHER, {"rows": rows}).consume())
+                except Exception as e:
+                    logger.error(f"Lỗi ghi embeddings vào Neo4j: {e}")
+                    failed += len(rows)
+                    continue
+                embedded += len(rows)
+                logger.info(f"Đã embed {embedded}/{len(pending)} problems")
+        
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        logger.info(
+            f"Embeddings: {embedded} mới, {len(resumed)} từ checkpoint, {failed} lỗi "
+            f"trong {elapsed:.1f}s ({self.embedding_workers} workers, {self.embedding_rpm} RPM)"
+        )
+        if failed == 0:
+            self.checkpoint_path.unlink(missing_ok=True)
+        else:
+            logger.warning(f"Còn {failed} problems chưa có embedding, chạy lại để resume từ {self.checkpoint_path}")
         logger.info("Đã tạo embeddings")
+        return embedded + len(resumed)
+    
+    def _graph_embedding_meta(self) -> tuple:
+        """(model, dimension) của Problem.embedding hiện có; graph cũ chưa ghi meta được coi là model OpenAI mặc định."""
+        with self.driver.session() as session:
+            record = session.run("""
+                OPTIONAL MATCH (m:GraphMeta {id: 'graph'})
+                RETURN m.embedding_model AS model, m.embedding_dimension AS dimension
+            """).single()
+        return (record["model"] or Config.EMBEDDING_MODEL, record["dimension"] or Config.EMBEDDING_DIMENSION)
+    
+    def _reset_embeddings_if_provider_changed(self) -> None:
+        """Xóa toàn bộ Problem.embedding khi provider khác provider đã tạo chúng, để không trộn hai không gian vector."""
+        with self.driver.session() as session:
+            found = session.run("MATCH (p:Problem) WHERE p.embedding IS NOT NULL RETURN count(p) AS n").single()["n"]
+        if not found:
+            return
+        model, dimension = self._graph_embedding_meta()
+        provider = self.embedding_provider
+        if (model, dimension) == (provider.model_id, provider.dimension):
+            return
+        logger.warning(
+            f"{found} embeddings hiện có tạo bởi {model} ({dimension} chiều), provider là "
+            f"{provider.model_id} ({provider.dimension} chiều) - embed lại toàn bộ"
+        )
+        with self.driver.session() as session:
+            session.run("MATCH (p:Problem) WHERE p.embedding IS NOT NULL REMOVE p.embedding")
+            if dimension != provider.dimension:
+                session.run("DROP INDEX problem_embedding_index IF EXISTS")
     
     def create_vector_index(self):
         logger.info("Tạo vector index...")
+        dimension = self.embedding_provider.dimension if self.embedding_provider else Config.EMBEDDING_DIMENSION
         try:
             with self.driver.session() as session:
-                session.run("""
+                session.run(f"""
                     CREATE VECTOR INDEX problem_embedding_index IF NOT EXISTS
                     FOR (p:Problem) ON p.embedding
-                    OPTIONS {indexConfig: {`vector.dimensions`: 1536, `vector.similarity_function`: 'cosine'}}
+                    OPTIONS {{indexConfig: {{`vector.dimensions`: {int(dimension)}, `vector.similarity_function`: 'cosine'}}}}
                 """)
             logger.info("Đã tạo vector index")
         except Exception as e:
             logger.warning(f"Vector index có thể đã tồn tại: {e}")
     
+    def bump_graph_version(self) -> str:
+        """Ghi stamp version mới để retrieval refresh các cache in-memory (vector index, ...).
+        
+        Kèm model/dimension của embedding provider (nếu lần nạp này có tạo embeddings),
+        để retrieval từ chối query bằng provider khác.
+        """
+        version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        meta = {}
+        if self._embeddings_generated:
+            meta = {"embedding_model": self.embedding_provider.model_id, "embedding_dimension": self.embedding_provider.dimension}
+        with self.driver.session() as session:
+            session.run("""
+                MERGE (m:GraphMeta {id: 'graph'})
+                SET m.version = $version, m.updated_at = datetime(), m += $meta
+            """, {"version": version, "meta": meta})
+        logger.info(f"Graph version: {version}")
+        return version
+    
+    def export_embedding_store(self, version: str) -> None:
+        """Ghi Problem embeddings ra EmbeddingStore (mmap .npy) gắn với graph version.
+        
+        Retrieval mở store này zero-copy thay vì kéo ~600 vectors từ Neo4j ở mỗi process.
+        """
+        with self.driver.session() as session:
+            records = list(session.run("MATCH (p:Problem) WHERE p.embedding IS NOT NULL RETURN p.id AS id, p.embedding AS embedding"))
+        if not records:
+            logger.warning("Không có embeddings để ghi embedding store")
+            return
+        model, _ = self._graph_embedding_meta()
+        store = EmbeddingStore.write(
+            self.embedding_store_path,
+            [record["id"] for record in records],
+            [record["embedding"] for record in records],
+            model=model,
+            dimension=len(records[0]["embedding"]),
+            version=version
+        )
+        if Config.VECTOR_INDEX_BACKEND == "hnsw":
+            # Build sẵn đồ thị HNSW cùng version → worker chỉ cần load_index
+            HnswVectorIndex(
+                store.ids, store.matrix, version=version, normalized=True,
+                M=Config.HNSW_M, ef_construction=Config.HNSW_EF_CONSTRUCTION,
+                ef_search=Config.HNSW_EF_SEARCH, path=Config.HNSW_INDEX_PATH
+            )
+    
     def run_full_ingestion(self, clear: bool = True, generate_embeddings: bool = True):
         logger.info("Bắt đầu nạp dữ liệu...")
         if clear:
@@ -241,6 +596,7 @@ class DataIngestion:
         if generate_embeddings:
             self.generate_embeddings()
             self.create_vector_index()
+        self.export_embedding_store(self.bump_graph_version())
         self._print_summary()
         logger.info("Hoàn thành nạp dữ liệu!")
     
@@ -252,49 +608,30 @@ class DataIngestion:
         supplement_problems = self.read_csv("nodes_problem_supplement.csv")
         if supplement_problems:
             logger.info(f"Nạp {len(supplement_problems)} supplement problems...")
-            with self.driver.session() as session:
-                for p in supplement_problems:
-                    session.run("""
-                        MERGE (p:Problem {id: $id})
-                        SET p.title = $title, p.description = $description, p.intent = $intent, 
-                            p.keywords = $keywords, p.sample_questions = $sample_questions, p.status = $status
-                    """, {"id": p["id"], "title": p["title"], "description": p.get("description", ""), 
-                          "intent": p.get("intent", ""), "keywords": p.get("keywords", ""), 
-                          "sample_questions": p.get("sample_questions", ""), "status": p.get("status", "active")})
+            self._run_batched(self.PROBLEM_CYPHER, [self._problem_row(p) for p in supplement_problems], "Supplement Problems")
         
         # Ingest supplement answers
         supplement_answers = self.read_csv("nodes_answer_supplement.csv")
         if supplement_answers:
             logger.info(f"Nạp {len(supplement_answers)} supplement answers...")
-            with self.driver.session() as session:
-                for a in supplement_answers:
-                    session.run("""
-                        MERGE (a:Answer {id: $id})
-                        SET a.summary = $summary, a.content = $content, a.steps = $steps, a.notes = $notes, a.status = $status
-                    """, {"id": a["id"], "summary": a.get("summary", a.get("title", "")), "content": a.get("content", ""), 
-                          "steps": a.get("steps", ""), "notes": a.get("notes", ""), "status": a.get("status", "active")})
+            self._run_batched(self.ANSWER_CYPHER, [self._answer_row(a) for a in supplement_answers], "Supplement Answers")
         
         # Create supplement relationships
         supplement_problem_rels = self.read_csv("rels_has_problem_supplement.csv")
         if supplement_problem_rels:
             logger.info(f"Tạo {len(supplement_problem_rels)} supplement problem relationships...")
-            with self.driver.session() as session:
-                for r in supplement_problem_rels:
-                    session.run("MATCH (t:Topic {id: $start_id}) MATCH (p:Problem {id: $end_id}) MERGE (t)-[:HAS_PROBLEM]->(p)", 
-                               {"start_id": r["start_id"], "end_id": r["end_id"]})
+            self._run_batched(self.HAS_PROBLEM_CYPHER, [{"start_id": r["start_id"], "end_id": r["end_id"]} for r in supplement_problem_rels], "Supplement HAS_PROBLEM")
         
         supplement_answer_rels = self.read_csv("rels_has_answer_supplement.csv")
         if supplement_answer_rels:
             logger.info(f"Tạo {len(supplement_answer_rels)} supplement answer relationships...")
-            with self.driver.session() as session:
-                for r in supplement_answer_rels:
-                    session.run("MATCH (p:Problem {id: $start_id}) MATCH (a:Answer {id: $end_id}) MERGE (p)-[:HAS_ANSWER]->(a)", 
-                               {"start_id": r["start_id"], "end_id": r["end_id"]})
+            self._run_batched(self.HAS_ANSWER_CYPHER, [{"start_id": r["start_id"], "end_id": r["end_id"]} for r in supplement_answer_rels], "Supplement HAS_ANSWER")
         
         # Generate embeddings for new problems
         if generate_embeddings:
             self.generate_embeddings()
         
+        self.export_embedding_store(self.bump_graph_version())
         self._print_summary()
         logger.info("Hoàn thành nạp supplement data!")
     
@@ -317,9 +654,20 @@ def main():
     neo4j_password = os.getenv("NEO4J_PASSWORD")
     openai_api_key = os.getenv("OPENAI_API_KEY")
     data_dir = os.getenv("DATA_DIR", "external_data_v3")
-    ingestion = DataIngestion(neo4j_uri=neo4j_uri, neo4j_user=neo4j_user, neo4j_password=neo4j_password, openai_api_key=openai_api_key, data_dir=data_dir)
+    batch_size = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+    embedding_workers = int(os.getenv("EMBEDDING_WORKERS", "4"))
+    embedding_rpm = int(os.getenv("EMBEDDING_RPM", "500"))
+    # EMBEDDING_PROVIDER=local|hash embed không cần OpenAI key; openai thiếu key thì bỏ qua embeddings
+    embedding_provider = None
+    if os.getenv("EMBEDDING_PROVIDER", Config.EMBEDDING_PROVIDER) != "openai" or openai_api_key:
+        embedding_provider = create_embedding_provider(client=OpenAI(api_key=openai_api_key) if openai_api_key else None)
+    ingestion = DataIngestion(neo4j_uri=neo4j_uri, neo4j_user=neo4j_user, neo4j_password=neo4j_password, openai_api_key=openai_api_key, data_dir=data_dir, batch_size=batch_size, embedding_workers=embedding_workers, embedding_rpm=embedding_rpm, embedding_provider=embedding_provider)
     try:
-        ingestion.run_full_ingestion(clear=True, generate_embeddings=bool(openai_api_key))
+        # INGEST_MODE=delta: chỉ ghi phần CSV thay đổi, không xóa database
+        if os.getenv("INGEST_MODE", "full") == "delta":
+            ingestion.run_delta_ingestion(generate_embeddings=embedding_provider is not None)
+        else:
+            ingestion.run_full_ingestion(clear=True, generate_embeddings=embedding_provider is not None)
     finally:
         ingestion.close()
 
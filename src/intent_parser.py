@@ -1,6 +1,9 @@
+import asyncio
 import json
 import logging
-from typing import List, Optional
+import re
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from schema import (
     StructuredQueryObject,
@@ -14,10 +17,10 @@ logger = logging.getLogger(__name__)
 
 
 class IntentParserHybrid:
-    def __init__(self, llm_client):
+    def __init__(self, llm_client, async_llm_client=None):
         self.llm_client = llm_client
         self.rule_parser = IntentParserLocal()
-        self.llm_parser = IntentParserLLM(llm_client)
+        self.llm_parser = IntentParserLLM(llm_client, async_llm_client)
         self.llm_threshold = 0.6 
     
     def parse(
@@ -36,6 +39,28 @@ class IntentParserHybrid:
         # Otherwise use LLM
         logger.info(f"Rule-based low confidence ({rule_result.confidence_intent:.2f}), using LLM")
         return self.llm_parser.parse(user_message, chat_history)
+    
+    async def aparse(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Message]] = None,
+        on_llm_fallback: Optional[Callable[[StructuredQueryObject], None]] = None
+    ) -> StructuredQueryObject:
+        """Bản async của parse(): rule-based chạy ngay, LLM fallback dùng AsyncOpenAI.
+        
+        on_llm_fallback(rule_result) được gọi ngay trước khi chờ LLM, để caller
+        khởi chạy việc suy đoán (vd. embedding) song song với LLM call.
+        """
+        rule_result = self.rule_parser.parse(user_message, chat_history)
+        
+        if rule_result.confidence_intent >= self.llm_threshold:
+            logger.info(f"Using rule-based result (conf={rule_result.confidence_intent:.2f})")
+            return rule_result
+        
+        logger.info(f"Rule-based low confidence ({rule_result.confidence_intent:.2f}), using LLM")
+        if on_llm_fallback is not None:
+            on_llm_fallback(rule_result)
+        return await self.llm_parser.aparse(user_message, chat_history)
 
 
 class IntentParser(IntentParserHybrid):
@@ -444,8 +469,9 @@ Output:
     "condensed_query": "Hướng dẫn liên kết ngân hàng MB với VNPT Money"
 }"""
 
-    def __init__(self, llm_client):
+    def __init__(self, llm_client, async_llm_client=None):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
         self.model = Config.INTENT_PARSER_MODEL
         self.temperature = Config.INTENT_PARSER_TEMPERATURE
         self.max_tokens = Config.INTENT_PARSER_MAX_TOKENS
@@ -465,23 +491,10 @@ Output:
         Returns:
             StructuredQueryObject with extracted slots
         """
-        # Build context from history
-        history_context = self._build_history_context(chat_history or [])
-        
-        # Build user prompt
-        user_prompt = self._build_user_prompt(user_message, history_context)
-        
         try:
             # Call LLM
             response = self.llm_client.chat.completions.create(
-                model=self.model,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                messages=[
-                    {"role": "system", "content": self.SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"}
+                **self._build_request(user_message, chat_history)
             )
             
             # Parse response
@@ -498,6 +511,49 @@ Output:
             logger.error(f"Intent parsing failed: {e}")
             return self._create_fallback_query(user_message)
     
+    async def aparse(
+        self, 
+        user_message: str, 
+        chat_history: Optional[List[Message]] = None
+    ) -> StructuredQueryObject:
+        """Bản async của parse() dùng AsyncOpenAI client."""
+        if self.async_llm_client is None:
+            return await asyncio.to_thread(self.parse, user_message, chat_history)
+        
+        try:
+            response = await self.async_llm_client.chat.completions.create(
+                **self._build_request(user_message, chat_history)
+            )
+            result_json = json.loads(response.choices[0].message.content)
+            return self._convert_to_structured_query(result_json, user_message)
+            
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse LLM response as JSON: {e}")
+            return self._create_fallback_query(user_message)
+            
+        except Exception as e:
+            logger.error(f"Intent parsing failed: {e}")
+            return self._create_fallback_query(user_message)
+    
+    def _build_request(self, user_message: str, chat_history: Optional[List[Message]]) -> dict:
+        """Build tham số chat.completions dùng chung cho parse() và aparse()."""
+        # Build context from history
+        history_context = self._build_history_context(chat_history or [])
+        
+        # Build user prompt
+        user_prompt = self._build_user_prompt(user_message, history_context)
+        
+        return dict(
+            model=self.model,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            messages=[
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+    
     def _build_history_context(self, chat_history: List[Message]) -> str:
         """Build context string from chat history."""
         if not chat_history:
@@ -886,6 +942,75 @@ class TextNormalizer:
         "danh sach": "danh sách",
     }
     
+    # Dựng một lần từ NO_ACCENT_MAP (xem _compile_no_accent)
+    _no_accent_order: List[str] = []
+    _no_accent_rank: Dict[str, int] = {}
+    _no_accent_reach: Dict[str, frozenset] = {}
+    _no_accent_always: frozenset = frozenset()
+    _no_accent_scanner: Optional["re.Pattern"] = None
+    
+    @staticmethod
+    def _trie_regex(keys) -> str:
+        """Regex dạng trie (gom prefix chung) khớp được mọi key."""
+        trie: Dict[str, dict] = {}
+        for key in keys:
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        
+        def build(node: Dict[str, dict]) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            return f"(?:{body})?" if "" in node else body
+        
+        return build(trie)
+    
+    @classmethod
+    def _compile_no_accent(cls) -> None:
+        """
+        Chuẩn bị NO_ACCENT_MAP cho normalize(): sort một lần + scanner dạng trie.
+        
+        Output phải giữ nguyên như vòng `str.replace` tuần tự cũ (key dài trước,
+        key sau có thể sửa cả phần vừa thay), nên normalize() chỉ quét text một lượt
+        để biết key nào có mặt, rồi replace đúng các key đó theo thứ tự cũ.
+        - scanner: lookahead `(?=(trie))` → key dài nhất bắt đầu tại mỗi vị trí
+        - reach[key]: các key nằm trong key đó hoặc trong output của nó (bắc cầu),
+          tức các key có thể xuất hiện/được tạo ra khi key đó có mặt
+        - always: key có output làm đổi ký tự ở mép (có thể tạo match mới qua ranh giới)
+        """
+        ordered = sorted(cls.NO_ACCENT_MAP, key=lambda k: -len(k))
+        key_chars = set("".join(ordered))
+        
+        reach = {
+            key: {other for other in ordered if other in key or other in cls.NO_ACCENT_MAP[key]}
+            for key in ordered
+        }
+        changed = True
+        while changed:
+            changed = False
+            for key, keys in reach.items():
+                expanded = keys.union(*(reach[other] for other in keys))
+                if len(expanded) != len(keys):
+                    reach[key] = expanded
+                    changed = True
+        
+        always = set()
+        for key in ordered:
+            output = cls.NO_ACCENT_MAP[key]
+            head = len(output) - len(output.lstrip("".join(key_chars)))
+            tail = len(output) - len(output.rstrip("".join(key_chars)))
+            if not key.startswith(output[:head]) or not key.endswith(output[len(output) - tail:]):
+                always.add(key)
+        
+        cls._no_accent_order = ordered
+        cls._no_accent_rank = {key: rank for rank, key in enumerate(ordered)}
+        cls._no_accent_reach = {key: frozenset(keys) for key, keys in reach.items()}
+        cls._no_accent_always = frozenset(always.union(*(reach[key] for key in always)))
+        cls._no_accent_scanner = re.compile(f"(?=({cls._trie_regex(ordered)}))")
+    
     @classmethod
     def normalize(cls, text: str) -> str:
         """
@@ -904,8 +1029,12 @@ class TextNormalizer:
         text_lower = text.lower().strip()
         
         # Step 1: Replace multi-word phrases first (longer matches first)
-        for no_accent, with_accent in sorted(cls.NO_ACCENT_MAP.items(), key=lambda x: -len(x[0])):
-            text_lower = text_lower.replace(no_accent, with_accent)
+        # Quét một lượt tìm key có mặt, chỉ replace các key đó theo thứ tự dài trước
+        present = set(cls._no_accent_always)
+        for key in cls._no_accent_scanner.findall(text_lower):
+            present |= cls._no_accent_reach[key]
+        for no_accent in sorted(present, key=cls._no_accent_rank.__getitem__):
+            text_lower = text_lower.replace(no_accent, cls.NO_ACCENT_MAP[no_accent])
         
         # Step 2: Replace single-word abbreviations
         words = text_lower.split()
@@ -920,6 +1049,64 @@ class TextNormalizer:
         return " ".join(normalized_words)
 
 
+TextNormalizer._compile_no_accent()
+
+
+class KeywordAutomaton:
+    """Aho–Corasick automaton cho tập keyword cố định.
+    
+    Quét message một lần (O(len(text) + số match)) thay vì chạy `kw in text`
+    cho từng keyword trong các bảng của IntentParserLocal.
+    """
+    
+    def __init__(self, keywords):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[str, ...]] = [()]
+        
+        for keyword in keywords:
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            if keyword not in self._out[state]:
+                self._out[state] = self._out[state] + (keyword,)
+        
+        # BFS dựng fail link, gộp output của fail state vào state hiện tại
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+    
+    def find_all(self, text: str) -> Set[str]:
+        """Tập keyword xuất hiện (dạng substring) trong text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[str] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
 class IntentParserLocal:
     """
     Rule-based intent parser for testing without LLM.
@@ -1404,7 +1591,41 @@ class IntentParserLocal:
         "thanh toán qua vnpt", "thanh toán bằng vnpt",
     ]
     
-    def _is_out_of_domain(self, message_lower: str) -> bool:
+    # Aho–Corasick dựng một lần cho mọi bảng keyword ở trên (xem _compile_keyword_tables)
+    _keyword_ranks: Dict[str, List[Tuple[str, int]]] = {}
+    _keyword_automaton: Optional[KeywordAutomaton] = None
+    
+    @classmethod
+    def _compile_keyword_tables(cls) -> None:
+        """Gom mọi bảng keyword vào một automaton, mỗi keyword nhớ (bảng, thứ tự ưu tiên)."""
+        tables = {
+            "action": [keywords for _, keywords in cls.ACTION_SERVICE_OVERRIDES],
+            "service": [keywords for _, keywords in cls.SERVICE_KEYWORDS_PRIORITY],
+            "problem": list(cls.PROBLEM_KEYWORDS.values()),
+            "account": [[kw] for kw in cls.ACCOUNT_LOOKUP_KEYWORDS],
+            "terms": [[kw] for kw in cls.TERMS_CONTEXT_GUARD],
+            "vnpt": [[kw] for kw in cls.VNPT_RELATED_PATTERNS],
+            "external_service": [[kw] for kw in cls.EXTERNAL_SERVICE_PATTERNS],
+            "external_bank": [[f"của {bank}", f"bên {bank}"] for bank in cls.EXTERNAL_BANKS],
+        }
+        ranks: Dict[str, List[Tuple[str, int]]] = {}
+        for table, groups in tables.items():
+            for rank, keywords in enumerate(groups):
+                for kw in keywords:
+                    ranks.setdefault(kw, []).append((table, rank))
+        cls._keyword_ranks = ranks
+        cls._keyword_automaton = KeywordAutomaton(ranks)
+    
+    def _match_tables(self, message_lower: str) -> Dict[str, int]:
+        """Thứ tự ưu tiên nhỏ nhất khớp được trong từng bảng (bảng không khớp thì không có key)."""
+        hits: Dict[str, int] = {}
+        for kw in self._keyword_automaton.find_all(message_lower):
+            for table, rank in self._keyword_ranks[kw]:
+                if rank < hits.get(table, rank + 1):
+                    hits[table] = rank
+        return hits
+    
+    def _is_out_of_domain(self, message_lower: str, hits: Optional[Dict[str, int]] = None) -> bool:
         """
         Phát hiện câu hỏi ngoài phạm vi VNPT Money.
         
@@ -1416,25 +1637,26 @@ class IntentParserLocal:
         - Hỏi về liên kết ngân hàng với VNPT Money
         - Hỏi về chuyển/nạp/rút tiền qua VNPT Money (dù có nhắc đến ngân hàng khác)
         """
+        if hits is None:
+            hits = self._match_tables(message_lower)
+        
         # Nếu có pattern liên quan VNPT Money -> KHÔNG out of domain
-        if any(pattern in message_lower for pattern in self.VNPT_RELATED_PATTERNS):
+        if "vnpt" in hits:
             return False
         
         # Kiểm tra các pattern hỏi về dịch vụ của ngân hàng/ví khác
-        for pattern in self.EXTERNAL_SERVICE_PATTERNS:
-            if pattern in message_lower:
-                logger.info(f"Out of domain detected: asking about external service '{pattern}'")
-                return True
+        if "external_service" in hits:
+            pattern = self.EXTERNAL_SERVICE_PATTERNS[hits["external_service"]]
+            logger.info(f"Out of domain detected: asking about external service '{pattern}'")
+            return True
         
         # Kiểm tra nếu chỉ hỏi về ngân hàng mà không có context VNPT Money
         # Ví dụ: "hình thức thanh toán của mb" -> hỏi về MB Bank, không phải VNPT
-        for bank in self.EXTERNAL_BANKS:
-            # Pattern: "của <bank>" hoặc "bên <bank>" hoặc "trên <bank>" 
-            # mà không có "liên kết", "vnpt", "mobile money"
-            if f"của {bank}" in message_lower or f"bên {bank}" in message_lower:
-                # Đã check VNPT_RELATED_PATTERNS ở trên, nếu đến đây nghĩa là không liên quan VNPT
-                logger.info(f"Out of domain detected: asking about '{bank}' without VNPT context")
-                return True
+        # Pattern: "của <bank>" hoặc "bên <bank>" (đã loại trường hợp có context VNPT ở trên)
+        if "external_bank" in hits:
+            bank = self.EXTERNAL_BANKS[hits["external_bank"]]
+            logger.info(f"Out of domain detected: asking about '{bank}' without VNPT context")
+            return True
         
         return False
     
@@ -1459,8 +1681,11 @@ class IntentParserLocal:
         logger.debug(f"Original: {user_message}")
         logger.debug(f"Normalized: {normalized_message}")
         
+        # Quét mọi bảng keyword một lần
+        hits = self._match_tables(message_lower)
+        
         # CHECK OUT OF DOMAIN FIRST
-        is_out_of_domain = self._is_out_of_domain(message_lower)
+        is_out_of_domain = self._is_out_of_domain(message_lower, hits)
         
         # Nếu out of domain, trả về ngay với confidence cao
         if is_out_of_domain:
@@ -1480,33 +1705,23 @@ class IntentParserLocal:
         # routed to DIEU_KHOAN due to "mobile money" keyword in Group 1.
         # Action verbs take priority UNLESS message is about terms/conditions.
         service = ServiceEnum.KHAC
-        has_terms_context = any(kw in message_lower for kw in self.TERMS_CONTEXT_GUARD)
+        has_terms_context = "terms" in hits
         
-        if not has_terms_context:
-            for svc, keywords in self.ACTION_SERVICE_OVERRIDES:
-                if any(kw in message_lower for kw in keywords):
-                    service = svc
-                    logger.info(f"Action verb override: {service.value} (skipped DIEU_KHOAN)")
-                    break
+        if not has_terms_context and "action" in hits:
+            service = self.ACTION_SERVICE_OVERRIDES[hits["action"]][0]
+            logger.info(f"Action verb override: {service.value} (skipped DIEU_KHOAN)")
         
         # Fallback to PRIORITY keyword matching if no action override matched
-        if service == ServiceEnum.KHAC:
-            for svc, keywords in self.SERVICE_KEYWORDS_PRIORITY:
-                if any(kw in message_lower for kw in keywords):
-                    service = svc
-                    break
+        if service == ServiceEnum.KHAC and "service" in hits:
+            service = self.SERVICE_KEYWORDS_PRIORITY[hits["service"]][0]
         
-        # Detect problem type
+        # Detect problem type (nhóm khớp đầu tiên theo thứ tự PROBLEM_KEYWORDS)
         problem_type = ProblemTypeEnum.KHAC
-        for prob, keywords in self.PROBLEM_KEYWORDS.items():
-            if any(kw in message_lower for kw in keywords):
-                problem_type = prob
-                break
+        if "problem" in hits:
+            problem_type = list(self.PROBLEM_KEYWORDS)[hits["problem"]]
         
         # Detect account lookup need
-        need_account_lookup = any(
-            kw in message_lower for kw in self.ACCOUNT_LOOKUP_KEYWORDS
-        )
+        need_account_lookup = "account" in hits
         
         # Calculate confidence
         confidence = 0.5
@@ -1532,3 +1747,15 @@ class IntentParserLocal:
             missing_slots=missing_slots,
             original_message=user_message  # Keep original for logging
         )
+    
+    async def aparse(
+        self, 
+        user_message: str, 
+        chat_history: Optional[List[Message]] = None,
+        on_llm_fallback: Optional[Callable[[StructuredQueryObject], None]] = None
+    ) -> StructuredQueryObject:
+        """Rule-based không có I/O nên chạy trực tiếp trên event loop (không có LLM fallback)."""
+        return self.parse(user_message, chat_history)
+
+
+IntentParserLocal._compile_keyword_tables()
@@ -99,7 +99,7 @@ def check_service_health(service: str) -> bool:
     
     if service == "neo4j":
         try:
-            from neo4j import GraphDatabase
+            from neo4j_config import get_neo4j_connection
             uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
             user = os.getenv("NEO4J_USER", "neo4j")
             password = os.getenv("NEO4J_PASSWORD", "")
@@ -107,11 +107,9 @@ def check_service_health(service: str) -> bool:
             if not password:
                 logger.warning("NEO4J_PASSWORD not set")
                 return False
-                
-            driver = GraphDatabase.driver(uri, auth=(user, password))
-            driver.verify_connectivity()
-            driver.close()
-            return True
+            
+            # Dùng lại connection (pool) của process thay vì tạo driver mới mỗi lần scrape
+            return get_neo4j_connection(uri, user, password).verify_connectivity()
         except Exception as e:
             logger.warning(f"Neo4j health check failed: {e}")
             return False
@@ -280,6 +278,111 @@ async def prometheus_metrics():
     lines.append("# TYPE vnpt_escalation_rate gauge")
     lines.append(f"vnpt_escalation_rate {escalation_rate:.4f}")
     
+    # ==================== Retrieval Source Metrics ====================
+    lines.append("# HELP vnpt_retrieval_total Requests by retrieval path (sample_* skip embedding + vector search)")
+    lines.append("# TYPE vnpt_retrieval_total counter")
+    for source in ["vector", "bm25", "fulltext", "sample_exact", "sample_fuzzy"]:
+        count = int(get_redis_value(f"metrics:counter:retrieval_{source}", 0))
+        lines.append(f'vnpt_retrieval_total{{source="{source}"}} {count}')
+    
+    # ==================== Neo4j Metrics ====================
+    neo4j_values = []
+    for v in get_redis_list("metrics:histogram:neo4j_latency_ms"):
+        try:
+            neo4j_values.append(float(v))
+        except:
+            pass
+    round_trip_values = []
+    for v in get_redis_list("metrics:histogram:neo4j_round_trips"):
+        try:
+            round_trip_values.append(float(v))
+        except:
+            pass
+    
+    if neo4j_values:
+        sorted_neo4j = sorted(neo4j_values)
+        n = len(sorted_neo4j)
+        neo4j_p50 = sorted_neo4j[int(n * 0.5)]
+        neo4j_p95 = sorted_neo4j[min(int(n * 0.95), n-1)]
+    else:
+        neo4j_p50 = neo4j_p95 = 0
+    avg_round_trips = statistics.mean(round_trip_values) if round_trip_values else 0
+    
+    lines.append("# HELP vnpt_neo4j_latency_ms Neo4j time spent in retrieval per request")
+    lines.append("# TYPE vnpt_neo4j_latency_ms summary")
+    lines.append(f'vnpt_neo4j_latency_ms{{quantile="0.5"}} {neo4j_p50:.2f}')
+    lines.append(f'vnpt_neo4j_latency_ms{{quantile="0.95"}} {neo4j_p95:.2f}')
+    lines.append("# HELP vnpt_neo4j_round_trips_avg Average Neo4j round-trips in retrieval per request")
+    lines.append("# TYPE vnpt_neo4j_round_trips_avg gauge")
+    lines.append(f"vnpt_neo4j_round_trips_avg {avg_round_trips:.2f}")
+    
+    lines.append("# HELP vnpt_retrieval_channel_hits_total Hits returned per retrieval channel")
+    lines.append("# TYPE vnpt_retrieval_channel_hits_total counter")
+    for channel in ["vector", "bm25", "fulltext"]:
+        count = int(get_redis_value(f"metrics:counter:retrieval_channel_{channel}_hits", 0))
+        lines.append(f'vnpt_retrieval_channel_hits_total{{channel="{channel}"}} {count}')
+    
+    lines.append("# HELP vnpt_retrieval_channel_latency_ms Latency per retrieval channel")
+    lines.append("# TYPE vnpt_retrieval_channel_latency_ms summary")
+    for channel in ["vector", "bm25", "fulltext"]:
+        channel_values = []
+        for v in get_redis_list(f"metrics:histogram:retrieval_channel_{channel}_latency_ms"):
+            try:
+                channel_values.append(float(v))
+            except:
+                pass
+        if channel_values:
+            sorted_channel = sorted(channel_values)
+            n = len(sorted_channel)
+            channel_p50 = sorted_channel[int(n * 0.5)]
+            channel_p95 = sorted_channel[min(int(n * 0.95), n-1)]
+        else:
+            channel_p50 = channel_p95 = 0
+        lines.append(f'vnpt_retrieval_channel_latency_ms{{channel="{channel}",quantile="0.5"}} {channel_p50:.2f}')
+        lines.append(f'vnpt_retrieval_channel_latency_ms{{channel="{channel}",quantile="0.95"}} {channel_p95:.2f}')
+    
+    # Trạng thái pool của Neo4jConnection trong chatbot worker (ghi sau mỗi request)
+    lines.append("# HELP vnpt_neo4j_pool_connections Neo4j pool connections by state")
+    lines.append("# TYPE vnpt_neo4j_pool_connections gauge")
+    for state in ["in_use", "idle"]:
+        count = int(float(get_redis_value(f"metrics:gauge:neo4j_pool_{state}", 0)))
+        lines.append(f'vnpt_neo4j_pool_connections{{state="{state}"}} {count}')
+    lines.append("# HELP vnpt_neo4j_pool_acquisition_wait_ms Wait to acquire a pooled connection and begin a read transaction")
+    lines.append("# TYPE vnpt_neo4j_pool_acquisition_wait_ms gauge")
+    for quantile, suffix in [("0.5", "p50"), ("0.95", "p95"), ("max", "max")]:
+        wait_ms = float(get_redis_value(f"metrics:gauge:neo4j_pool_acquisition_wait_ms_{suffix}", 0))
+        lines.append(f'vnpt_neo4j_pool_acquisition_wait_ms{{quantile="{quantile}"}} {wait_ms:.2f}')
+    
+    # ==================== Response Cache Metrics ====================
+    lines.append("# HELP vnpt_response_cache_total Response cache lookups on history-free turns")
+    lines.append("# TYPE vnpt_response_cache_total counter")
+    for result in ["hits", "misses"]:
+        count = int(get_redis_value(f"metrics:counter:response_cache_{result}", 0))
+        lines.append(f'vnpt_response_cache_total{{result="{result}"}} {count}')
+    
+    saved_values = []
+    for v in get_redis_list("metrics:histogram:response_cache_saved_ms"):
+        try:
+            saved_values.append(float(v))
+        except:
+            pass
+    lines.append("# HELP vnpt_response_cache_saved_ms_total Latency saved by response cache hits (retrieval + ranking + generation)")
+    lines.append("# TYPE vnpt_response_cache_saved_ms_total counter")
+    lines.append(f"vnpt_response_cache_saved_ms_total {sum(saved_values):.0f}")
+    
+    # ==================== Speculative Embedding / Retrieval Metrics ====================
+    lines.append("# HELP vnpt_speculative_embedding_total Speculative embeddings started during LLM intent parsing")
+    lines.append("# TYPE vnpt_speculative_embedding_total counter")
+    for result in ["hits", "discards"]:
+        count = int(get_redis_value(f"metrics:counter:speculative_embedding_{result}", 0))
+        lines.append(f'vnpt_speculative_embedding_total{{result="{result}"}} {count}')
+    
+    lines.append("# HELP vnpt_speculative_retrieval_total Speculative retrievals on the rule-based parse during LLM intent parsing")
+    lines.append("# TYPE vnpt_speculative_retrieval_total counter")
+    for result in ["hits", "discards"]:
+        count = int(get_redis_value(f"metrics:counter:speculative_retrieval_{result}", 0))
+        lines.append(f'vnpt_speculative_retrieval_total{{result="{result}"}} {count}')
+    
     # ==================== Confidence Metrics ====================
     confidence_values = []
     raw_conf = get_redis_list("metrics:histogram:confidence_score")
@@ -421,8 +421,8 @@ class MonitoringDashboard:
         if neo4j_driver:
             def check_neo4j():
                 try:
-                    neo4j_driver.verify_connectivity()
-                    return True
+                    # Driver raise khi lỗi; Neo4jConnection trả về False
+                    return neo4j_driver.verify_connectivity() is not False
                 except:
                     return False
             self.health.register_check("neo4j", check_neo4j)
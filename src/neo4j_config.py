@@ -1,9 +1,20 @@
 ﻿import os
-from neo4j import GraphDatabase
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Dict, List, Tuple
+from neo4j import GraphDatabase, AsyncGraphDatabase, READ_ACCESS
 from dotenv import load_dotenv
 
+from schema import Config
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
@@ -11,35 +22,112 @@ NEO4J_DATABASE = os.getenv("NEO4J_DATABASE")
 
 
 class Neo4jConnection:
-    """Singleton quản lý kết nối Neo4j."""
+    """Singleton quản lý kết nối Neo4j, dùng chung cho mọi consumer (pipeline, metrics server, script).
+    
+    - Pool theo Config.NEO4J_* cho driver sync và AsyncDriver; mỗi event loop một
+      AsyncDriver vì connection async gắn với loop mở nó (pipeline loop)
+    - execute_read / aexecute_read: managed read transaction, driver tự retry lỗi
+      transient (mất connection, leader đổi) trong NEO4J_MAX_TRANSACTION_RETRY_TIME
+      và route tới read replica / follower khi URI là neo4j:// (cluster)
+    - database cố định (NEO4J_DATABASE) nên không tốn round-trip resolve home database
+    - pool_metrics(): connection in-use/idle + thời gian chờ lấy connection
+    
+    AsyncDriver được đóng trên chính loop của nó khi loop shutdown (asyncio.run,
+    loop.shutdown_asyncgens()) hoặc khi gọi aclose().
+    """
     
     _instance = None
     _driver = None
     
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
     
-    def __init__(self):
+    def __init__(self, uri: str = None, user: str = None, password: str = None, database: str = None):
         if self._driver is None:
-            self._driver = GraphDatabase.driver(
-                NEO4J_URI,
-                auth=(NEO4J_USER, NEO4J_PASSWORD),
-                max_connection_lifetime=3600,
-                max_connection_pool_size=50,
-                connection_acquisition_timeout=60
-            )
+            self.uri = uri or NEO4J_URI
+            self.auth = (user or NEO4J_USER, password or NEO4J_PASSWORD)
+            self.database = database or NEO4J_DATABASE
+            self._driver = GraphDatabase.driver(self.uri, auth=self.auth, **self._pool_config())
+            # Key yếu theo loop: loop bị thu hồi (vd. asyncio.run ngắn hạn) thì driver cũng bị bỏ
+            self._async_drivers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+            self._shutdown_guards: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+            self._lock = threading.Lock()
+            self._acquisition_waits = deque(maxlen=Config.NEO4J_ACQUISITION_WAIT_WINDOW)
+            self.acquisitions = 0
+            self._in_flight = 0
+            self._pool_introspection = self._has_pool_introspection(self._driver)
+    
+    @staticmethod
+    def _pool_config() -> Dict[str, Any]:
+        return {
+            "max_connection_lifetime": Config.NEO4J_MAX_CONNECTION_LIFETIME,
+            "max_connection_pool_size": Config.NEO4J_MAX_CONNECTION_POOL_SIZE,
+            "connection_acquisition_timeout": Config.NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+            "max_transaction_retry_time": Config.NEO4J_MAX_TRANSACTION_RETRY_TIME,
+        }
     
     @property
     def driver(self):
         return self._driver
     
+    async def aget_async_driver(self):
+        """AsyncDriver của event loop đang chạy (tạo lười, connection mở trên chính loop đó)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            driver = self._async_drivers.get(loop)
+            if driver is not None:
+                return driver
+            self._evict_closed_loops()
+            driver = AsyncGraphDatabase.driver(self.uri, auth=self.auth, **self._pool_config())
+            self._async_drivers[loop] = driver
+            guard = self._shutdown_guards[loop] = self._close_on_shutdown(loop, driver)
+        # Chạy tới yield để loop theo dõi generator này
+        await guard.__anext__()
+        return driver
+    
+    async def _close_on_shutdown(self, loop, driver):
+        """Async generator treo tới khi loop shutdown.
+        
+        shutdown_asyncgens() gọi aclose() lúc loop còn chạy, nên driver được đóng trên đúng loop của nó.
+        """
+        try:
+            yield
+        finally:
+            with self._lock:
+                if self._async_drivers.get(loop) is driver:
+                    del self._async_drivers[loop]
+                    self._shutdown_guards.pop(loop, None)
+            await driver.close()
+    
+    def _evict_closed_loops(self) -> None:
+        """Bỏ AsyncDriver của loop đã đóng mà không qua shutdown_asyncgens()/aclose() (gọi khi giữ self._lock).
+        
+        Transport của loop đã đóng không close() được nữa; socket chỉ được đóng khi
+        driver bị thu hồi, nên cảnh báo để chỗ quản lý loop gọi aclose().
+        """
+        for loop in [loop for loop in list(self._async_drivers.keys()) if loop.is_closed()]:
+            self._async_drivers.pop(loop, None)
+            self._shutdown_guards.pop(loop, None)
+            logger.warning("AsyncDriver của event loop đã đóng chưa được aclose(), bỏ driver (socket đóng khi GC)")
+    
     def close(self):
         if self._driver:
             self._driver.close()
             self._driver = None
     
+    async def aclose(self):
+        """Đóng AsyncDriver của event loop đang chạy."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            guard = self._shutdown_guards.pop(loop, None)
+            driver = self._async_drivers.pop(loop, None)
+        if guard is not None:
+            await guard.aclose()
+        elif driver is not None:
+            await driver.close()
+    
     def verify_connectivity(self) -> bool:
         try:
             self._driver.verify_connectivity()
@@ -49,7 +137,66 @@ class Neo4jConnection:
             return False
     
     def get_session(self, database: str = None):
-        return self._driver.session(database=database or NEO4J_DATABASE)
+        return self._driver.session(database=database or self.database)
+    
+    def _read_session(self, driver, database: str = None):
+        return driver.session(
+            database=database or self.database,
+            default_access_mode=READ_ACCESS,
+            fetch_size=Config.NEO4J_FETCH_SIZE
+        )
+    
+    def _record_acquisition(self, requested: float) -> None:
+        wait_ms = (time.perf_counter() - requested) * 1000
+        with self._lock:
+            self.acquisitions += 1
+            self._in_flight += 1
+            self._acquisition_waits.append(wait_ms)
+    
+    def _record_release(self, attempts: List[int]) -> None:
+        if attempts:
+            with self._lock:
+                self._in_flight -= 1
+    
+    def execute_read(self, query: str, parameters: dict = None, database: str = None) -> List[Any]:
+        """Chạy Cypher đọc trong managed transaction (retry + read routing), trả về toàn bộ records.
+        
+        Records được đọc hết bên trong transaction function để lần retry chạy lại trọn vẹn.
+        """
+        requested = time.perf_counter()
+        attempts = []
+        
+        def work(tx):
+            # Lần chạy đầu: đã lấy được connection từ pool và mở transaction
+            if not attempts:
+                self._record_acquisition(requested)
+            attempts.append(1)
+            return list(tx.run(query, parameters or {}))
+        
+        try:
+            with self._read_session(self._driver, database) as session:
+                return session.execute_read(work)
+        finally:
+            self._record_release(attempts)
+    
+    async def aexecute_read(self, query: str, parameters: dict = None, database: str = None) -> List[Any]:
+        """Bản async của execute_read, trên AsyncDriver của event loop đang chạy."""
+        requested = time.perf_counter()
+        attempts = []
+        
+        async def work(tx):
+            if not attempts:
+                self._record_acquisition(requested)
+            attempts.append(1)
+            result = await tx.run(query, parameters or {})
+            return [record async for record in result]
+        
+        driver = await self.aget_async_driver()
+        try:
+            async with self._read_session(driver, database) as session:
+                return await session.execute_read(work)
+        finally:
+            self._record_release(attempts)
     
     def execute_query(self, query: str, parameters: dict = None, database: str = None):
         with self.get_session(database) as session:
@@ -62,15 +209,75 @@ class Neo4jConnection:
                 lambda tx: tx.run(query, parameters or {}).consume()
             )
             return result
+    
+    @staticmethod
+    def _has_pool_introspection(driver) -> bool:
+        """Pool nội bộ (`_pool.connections`) còn đọc được ở phiên bản driver này không.
+        
+        Driver Python không có API public cho trạng thái pool → chỉ kiểm tra một lần lúc khởi tạo.
+        """
+        pooled = getattr(getattr(driver, "_pool", None), "connections", None)
+        if isinstance(pooled, dict):
+            return True
+        logger.warning(
+            "Neo4j driver không có _pool.connections: pool_metrics() báo in_use theo số read đang chạy, idle = 0"
+        )
+        return False
+    
+    @staticmethod
+    def _pool_counts(driver) -> Tuple[int, int]:
+        try:
+            connections = [c for queue in list(driver._pool.connections.values()) for c in list(queue)]
+        except Exception:
+            return 0, 0
+        in_use = sum(1 for c in connections if getattr(c, "in_use", False))
+        return in_use, len(connections) - in_use
+    
+    def pool_metrics(self) -> Dict[str, float]:
+        """Connection in-use/idle (driver sync + mọi AsyncDriver) và acquisition wait.
+        
+        in_use/idle đọc từ pool nội bộ của driver nếu phiên bản driver còn hỗ trợ
+        (kiểm tra một lần lúc khởi tạo), không thì in_use = số read đang chạy, idle = 0.
+        
+        Acquisition wait: từ lúc gọi execute_read tới khi transaction function chạy
+        lần đầu (chờ connection từ pool + BEGIN), p50/p95/max trên
+        NEO4J_ACQUISITION_WAIT_WINDOW lần đọc gần nhất.
+        """
+        with self._lock:
+            self._evict_closed_loops()
+            drivers = [self._driver, *self._async_drivers.values()]
+            waits = sorted(self._acquisition_waits)
+            acquisitions = self.acquisitions
+            in_flight = self._in_flight
+        in_use = idle = 0
+        if self._pool_introspection:
+            for driver in drivers:
+                used, free = self._pool_counts(driver)
+                in_use += used
+                idle += free
+        else:
+            # Không đọc được pool → connection đang dùng ≈ managed read đang chạy
+            in_use = in_flight
+        n = len(waits)
+        return {
+            "in_use": in_use,
+            "idle": idle,
+            "max_size": Config.NEO4J_MAX_CONNECTION_POOL_SIZE,
+            "acquisitions": acquisitions,
+            "acquisition_wait_ms_p50": waits[int(n * 0.5)] if waits else 0.0,
+            "acquisition_wait_ms_p95": waits[min(int(n * 0.95), n - 1)] if waits else 0.0,
+            "acquisition_wait_ms_max": waits[-1] if waits else 0.0,
+        }
 
 
 _connection = None
 
 
-def get_neo4j_connection() -> Neo4jConnection:
+def get_neo4j_connection(uri: str = None, user: str = None, password: str = None, database: str = None) -> Neo4jConnection:
+    """Neo4jConnection của process; tham số chỉ dùng ở lần tạo đầu tiên (mặc định lấy từ env)."""
     global _connection
     if _connection is None:
-        _connection = Neo4jConnection()
+        _connection = Neo4jConnection(uri, user, password, database)
     return _connection
 
 
@@ -1,10 +1,13 @@
 from schema import Decision
+import asyncio
 import logging
+import threading
 import time
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 import json
-from redis_manager import get_redis_manager, init_redis
+from redis_manager import get_redis_manager, init_redis, get_async_redis_manager, init_async_redis
 from monitoring import init_monitoring
 from schema import (
     Message,
@@ -15,7 +18,10 @@ from schema import (
     Config,
 )
 from intent_parser import IntentParser, IntentParserLocal
-from retrieval import RetrievalPipeline
+from retrieval import RetrievalPipeline, get_embedding_cache, track_neo4j_usage
+from response_cache import ResponseCache
+from neo4j_config import Neo4jConnection, get_neo4j_connection
+from embedding_provider import create_embedding_provider
 from ranking import MultiSignalRanker
 from decision_engine import DecisionEngine, SessionManager
 from response_generator import ResponseGenerator, ResponseGeneratorSimple
@@ -59,6 +65,39 @@ except ImportError as e:
 logger = logging.getLogger(__name__)
 
 
+class _PipelineLoop:
+    """Event loop chạy trên một daemon thread riêng của pipeline.
+    
+    Async driver/client (AsyncGraphDatabase, AsyncOpenAI, redis.asyncio) bị gắn
+    vào event loop mở connection đầu tiên, nên mọi lời gọi aprocess()/process()
+    đều được đưa về chạy trên cùng loop này. Loop của Chainlit chỉ await kết quả.
+    """
+    
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever,
+            name="chatbot-pipeline-loop",
+            daemon=True
+        )
+        self._thread.start()
+    
+    def submit(self, coro) -> Future:
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("process() không được gọi từ bên trong pipeline loop, dùng aprocess()")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def close(self) -> None:
+        # Đóng các client gắn với loop (vd. AsyncDriver của Neo4jConnection) khi loop còn chạy
+        try:
+            asyncio.run_coroutine_threadsafe(self.loop.shutdown_asyncgens(), self.loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"Pipeline loop shutdown_asyncgens failed: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
 class ChatbotPipeline:
     # Class-level reference to module-level helper
     _is_multi_part_question = staticmethod(_is_multi_part_question)
@@ -71,29 +110,53 @@ class ChatbotPipeline:
         redis_client=None,
         use_llm_parser: bool = True,
         use_llm_generator: bool = True,
-        enable_monitoring: bool = True
+        enable_monitoring: bool = True,
+        async_neo4j_driver=None,
+        async_llm_client=None,
+        async_embedding_client=None,
+        async_redis_client=None,
+        embedding_provider=None
     ):
         """
         Initialize all pipeline components.
         
         Args:
-            neo4j_driver: Neo4j driver
+            neo4j_driver: Neo4jConnection (managed read, pool metrics) hoặc Neo4j driver
             llm_client: OpenAI or compatible LLM client
             embedding_client: Embedding client
             redis_client: Optional Redis for session management
             use_llm_parser: Use LLM for intent parsing (vs rule-based)
             use_llm_generator: Use LLM for response generation (vs templates)
             enable_monitoring: Enable monitoring dashboard
+            async_neo4j_driver: Optional AsyncGraphDatabase driver cho aprocess()
+                (không cần với Neo4jConnection)
+            async_llm_client: Optional AsyncOpenAI client cho aprocess()
+            async_embedding_client: Optional async embedding client cho aprocess()
+            async_redis_client: Optional redis.asyncio client cho session state
+            embedding_provider: Optional EmbeddingProvider (mặc định OpenAI qua embedding_client)
+        
+        Thiếu async client nào thì bước tương ứng được đẩy sang thread pool,
+        nên aprocess() vẫn không chặn event loop.
         """
         # Store references
         self.neo4j_driver = neo4j_driver
         self.llm_client = llm_client
         
         # Core components
-        self.retrieval = RetrievalPipeline(neo4j_driver, embedding_client)
+        self.retrieval = RetrievalPipeline(
+            neo4j_driver, embedding_client,
+            async_driver=async_neo4j_driver,
+            async_embedding_client=async_embedding_client,
+            embedding_provider=embedding_provider
+        )
         self.ranker = MultiSignalRanker()
         self.decision_engine = DecisionEngine()
-        self.session_manager = SessionManager(redis_client)
+        self.session_manager = SessionManager(redis_client, async_redis_client)
+        self.response_cache = ResponseCache(
+            neo4j_driver, async_neo4j_driver,
+            graph_version=self.retrieval.graph_version
+        )
+        self.response_cache.attach_redis(get_async_redis_manager())
         
         # Advanced features
         self.monitoring = None
@@ -106,36 +169,64 @@ class ChatbotPipeline:
         
         # LLM-dependent components
         if use_llm_parser:
-            self.intent_parser = IntentParser(llm_client)
+            self.intent_parser = IntentParser(llm_client, async_llm_client)
         else:
             self.intent_parser = IntentParserLocal()
         
         if use_llm_generator:
-            self.response_generator = ResponseGenerator(llm_client)
+            self.response_generator = ResponseGenerator(llm_client, async_llm_client)
         else:
             self.response_generator = ResponseGeneratorSimple()
         
         # Chat history storage
         self._chat_histories = {}  # session_id -> List[Message]
+        
+        self._loop = _PipelineLoop()
     
     def process(
         self,
         user_message: str,
         session_id: str
     ) -> FormattedResponse:
+        """Bản sync của aprocess(), dùng cho script đánh giá và code không có event loop."""
+        return self._loop.submit(self._aprocess(user_message, session_id)).result()
+    
+    async def aprocess(
+        self,
+        user_message: str,
+        session_id: str
+    ) -> FormattedResponse:
+        """Xử lý một tin nhắn mà không chặn event loop của caller (Chainlit)."""
+        if asyncio.get_running_loop() is self._loop.loop:
+            return await self._aprocess(user_message, session_id)
+        return await asyncio.wrap_future(self._loop.submit(self._aprocess(user_message, session_id)))
+    
+    async def _aprocess(
+        self,
+        user_message: str,
+        session_id: str
+    ) -> FormattedResponse:
        
         start_time = time.time() #grafana bắt đầu tính giờ của phiên
         
         log_entry = self._init_log_entry(session_id, user_message)
+        speculative = None
+        speculative_retrieval = None
+        
+        def speculate(rule_result: StructuredQueryObject) -> None:
+            # Embed tin nhắn đã chuẩn hóa + retrieval theo kết quả rule-based trong lúc chờ LLM parse
+            nonlocal speculative, speculative_retrieval
+            speculative = self.retrieval.speculate_embedding(user_message)
+            speculative_retrieval = self.retrieval.speculate_retrieval(rule_result, speculative)
         
         try:
             # Step 1: Get chat history
-            chat_history = self._get_chat_history(session_id)
+            chat_history = await self._get_chat_history(session_id)
             log_entry.chat_history_length = len(chat_history)
             
             # Step 2: Intent Parsing
             parse_start = time.time()
-            query = self.intent_parser.parse(user_message, chat_history)
+            query = await self.intent_parser.aparse(user_message, chat_history, on_llm_fallback=speculate)
             log_entry.intent_parse_latency_ms = int((time.time() - parse_start) * 1000)
             log_entry.structured_query = query
             
@@ -145,18 +236,32 @@ class ChatbotPipeline:
             
             # Check for out of domain - early exit only for truly unrelated questions
             if query.is_out_of_domain:
-                return self._handle_early_exit(query, log_entry, start_time, session_id, user_message)
+                return await self._handle_early_exit(query, log_entry, start_time, session_id, user_message)
+            
+            # Response cache: chỉ lượt không có lịch sử chat (câu trả lời không phụ thuộc ngữ cảnh trước)
+            is_multi_part = self._is_multi_part_question(user_message)
+            cacheable_turn = self.response_cache.enabled and not chat_history
+            if cacheable_turn:
+                cached = await self.response_cache.aget(query, is_multi_part)
+                if cached is not None:
+                    return await self._handle_cache_hit(cached, log_entry, start_time, session_id, user_message)
             
             # For need_account_lookup: still do retrieval to provide helpful guidance
             # The response will include both guidance AND escalation info
             
             # Step 3: Retrieval (use fallback for better coverage)
             retrieval_start = time.time()
-            candidates, contexts = self.retrieval.retrieve_with_fallback(query)
+            with track_neo4j_usage() as neo4j_usage:
+                candidates, contexts = await self.retrieval.aretrieve_with_fallback(
+                    query, speculative=speculative, speculative_retrieval=speculative_retrieval
+                )
             log_entry.retrieval_latency_ms = int((time.time() - retrieval_start) * 1000)
+            log_entry.neo4j_round_trips = neo4j_usage["round_trips"]
+            log_entry.neo4j_latency_ms = int(neo4j_usage["latency_ms"])
+            log_entry.retrieval_channels = neo4j_usage["channels"]
             log_entry.constrained_problem_count = len(candidates)
             log_entry.retrieval_candidates = [
-                {"problem_id": c.problem_id, "similarity": c.similarity_score}
+                {"problem_id": c.problem_id, "similarity": c.similarity_score, "source": c.retrieval_source}
                 for c in candidates
             ]
             
@@ -178,7 +283,7 @@ class ChatbotPipeline:
                        f"gap={ranking_output.score_gap:.2f}")
             
             # Step 5: Decision
-            clarify_count = self.session_manager.get_clarify_count(session_id)
+            clarify_count = await self.session_manager.aget_clarify_count(session_id)
             decision = self.decision_engine.decide(query, ranking_output, clarify_count)
             
             log_entry.decision_type = decision.type
@@ -193,7 +298,7 @@ class ChatbotPipeline:
             logger.info(f"Decision: {decision.type.value}")
             
             # Update session state
-            self._update_session_state(session_id, decision)
+            await self._update_session_state(session_id, decision)
             
             # Step 6: Response Generation
             response_start = time.time()
@@ -207,9 +312,6 @@ class ChatbotPipeline:
             if ranking_output.results:
                 top_sim = ranking_output.results[0].similarity_score if ranking_output.results else 0
                 
-                # Detect multi-part question to adjust filtering
-                is_multi_part = self._is_multi_part_question(user_message)
-                
                 # Adaptive threshold: tighter when top result is very confident
                 # - Top sim >= 0.90: threshold = 0.82 (very selective)
                 # - Top sim >= 0.80: threshold = 0.78  
@@ -255,7 +357,7 @@ class ChatbotPipeline:
                 
                 logger.info(f"Filtered contexts: {len(all_contexts)} (threshold={sim_threshold:.3f}, multi_part={is_multi_part})")
             
-            response = self.response_generator.generate(
+            response = await self.response_generator.agenerate(
                 decision, context, user_message, 
                 all_contexts=all_contexts,
                 need_account_lookup=query.need_account_lookup
@@ -268,17 +370,28 @@ class ChatbotPipeline:
             log_entry.total_latency_ms = int((time.time() - start_time) * 1000)
             self._save_log(log_entry)
             
+            if cacheable_turn and decision.type in ResponseCache.CACHEABLE_DECISIONS:
+                # Gắn tag theo các Answer đã đưa vào câu trả lời để nạp lại KB chỉ bỏ đúng entry liên quan
+                answer_ids = ([context.answer_id] if context else []) + [ctx.answer_id for ctx in all_contexts]
+                await self.response_cache.aset(
+                    query, response, answer_ids,
+                    built_latency_ms=log_entry.total_latency_ms - log_entry.intent_parse_latency_ms,
+                    multi_part=is_multi_part
+                )
+            
             # Update chat history
-            self._update_chat_history(session_id, user_message, response.message)
+            await self._update_chat_history(session_id, user_message, response.message)
             
             # Record metrics to monitoring dashboard
             if self.monitoring:
-                total_latency = log_entry.total_latency_ms
-                # Increment total counter (for dashboard)
-                self.monitoring.metrics.increment("requests_total")
-                self.monitoring.metrics.increment(f"decision_{decision.type.value}")
-                self.monitoring.metrics.observe("request_latency_ms", total_latency)
-                self.monitoring.metrics.observe("confidence_score", ranking_output.confidence_score)
+                # MetricsCollector ghi Redis bằng client sync → chạy trên thread pool
+                await asyncio.to_thread(
+                    self._record_request_metrics,
+                    decision, log_entry.total_latency_ms, ranking_output.confidence_score,
+                    candidates[0].retrieval_source if candidates else None,
+                    cacheable_turn,
+                    neo4j_usage
+                )
             
             return response
             
@@ -289,7 +402,7 @@ class ChatbotPipeline:
             
             # Record error in monitoring
             if self.monitoring:
-                self.monitoring.metrics.increment("errors_total")
+                await asyncio.to_thread(self.monitoring.metrics.increment, "errors_total")
             
             # Return fallback response
             return FormattedResponse(
@@ -297,8 +410,66 @@ class ChatbotPipeline:
                 source_citation="",
                 decision_type=DecisionType.ESCALATE_LOW_CONFIDENCE
             )
+        
+        finally:
+            # Không tới retrieval (cache hit, out-of-domain, lỗi) cũng tính là bị hủy
+            outcomes = {}
+            for kind, speculation in (("retrieval", speculative_retrieval), ("embedding", speculative)):
+                if speculation is not None:
+                    speculation.discard()
+                    outcomes[kind] = speculation.outcome
+            if outcomes and self.monitoring:
+                await asyncio.to_thread(self._record_speculation_metrics, outcomes)
     
-    def _handle_early_exit(  #dẹp luôn câu hỏi ngoài phạm vi
+    def _record_request_metrics(
+        self,
+        decision: Decision,
+        total_latency: int,
+        confidence: float,
+        retrieval_source: Optional[str] = None,
+        response_cache_miss: bool = False,
+        neo4j_usage: Optional[Dict[str, float]] = None
+    ) -> None:
+        # Increment total counter (for dashboard)
+        self.monitoring.metrics.increment("requests_total")
+        self.monitoring.metrics.increment(f"decision_{decision.type.value}")
+        if retrieval_source:
+            # vector | bm25 | sample_exact | sample_fuzzy (sample = bỏ qua embedding + vector search)
+            self.monitoring.metrics.increment(f"retrieval_{retrieval_source}")
+        if response_cache_miss:
+            self.monitoring.metrics.increment("response_cache_misses")
+        self.monitoring.metrics.observe("request_latency_ms", total_latency)
+        self.monitoring.metrics.observe("confidence_score", confidence)
+        if neo4j_usage is not None:
+            # Neo4j trong bước retrieval; 0 round-trip khi mọi thứ phục vụ từ cache in-memory
+            self.monitoring.metrics.observe("neo4j_round_trips", neo4j_usage["round_trips"])
+            self.monitoring.metrics.observe("neo4j_latency_ms", neo4j_usage["latency_ms"])
+            for channel, stats in neo4j_usage["channels"].items():
+                self.monitoring.metrics.increment(f"retrieval_channel_{channel}_hits", stats["hits"])
+                self.monitoring.metrics.observe(f"retrieval_channel_{channel}_latency_ms", stats["latency_ms"])
+        if isinstance(self.neo4j_driver, Neo4jConnection):
+            pool = self.neo4j_driver.pool_metrics()
+            self.monitoring.metrics.set_gauge("neo4j_pool_in_use", pool["in_use"])
+            self.monitoring.metrics.set_gauge("neo4j_pool_idle", pool["idle"])
+            self.monitoring.metrics.set_gauge("neo4j_pool_acquisition_wait_ms_p50", pool["acquisition_wait_ms_p50"])
+            self.monitoring.metrics.set_gauge("neo4j_pool_acquisition_wait_ms_p95", pool["acquisition_wait_ms_p95"])
+            self.monitoring.metrics.set_gauge("neo4j_pool_acquisition_wait_ms_max", pool["acquisition_wait_ms_max"])
+    
+    def _record_speculation_metrics(self, outcomes: Dict[str, str]) -> None:
+        # {embedding | retrieval: hit | discarded}; hit rate = hits / (hits + discards)
+        for kind, outcome in outcomes.items():
+            result = "hits" if outcome == "hit" else "discards"
+            self.monitoring.metrics.increment(f"speculative_{kind}_{result}")
+    
+    def _record_cache_hit_metrics(self, decision_type: DecisionType, total_latency: int, saved_latency: int) -> None:
+        self.monitoring.metrics.increment("requests_total")
+        self.monitoring.metrics.increment(f"decision_{decision_type.value}")
+        self.monitoring.metrics.increment("response_cache_hits")
+        self.monitoring.metrics.observe("request_latency_ms", total_latency)
+        # Thời gian retrieval + ranking + generation mà lượt gốc đã tốn, trừ thời gian tra cache
+        self.monitoring.metrics.observe("response_cache_saved_ms", saved_latency)
+    
+    async def _handle_early_exit(  #dẹp luôn câu hỏi ngoài phạm vi
         self,
         query: StructuredQueryObject,
         log_entry: InteractionLog,
@@ -306,7 +477,7 @@ class ChatbotPipeline:
         session_id: str,
         user_message: str
     ) -> FormattedResponse:
-
+    
         
         # Create minimal decision
         
@@ -329,18 +500,50 @@ class ChatbotPipeline:
         log_entry.is_ambiguous = False
         
         response_start = time.time()
-        response = self.response_generator.generate(decision, None, user_message)
+        response = await self.response_generator.agenerate(decision, None, user_message)
         log_entry.response_latency_ms = int((time.time() - response_start) * 1000)
         log_entry.final_response = response.message
         log_entry.source_citation = response.source_citation
         log_entry.total_latency_ms = int((time.time() - start_time) * 1000)
         
         self._save_log(log_entry)
-        self._update_chat_history(session_id, user_message, response.message)
+        await self._update_chat_history(session_id, user_message, response.message)
+        
+        return response
+    
+    async def _handle_cache_hit(
+        self,
+        cached: dict,
+        log_entry: InteractionLog,
+        start_time: float,
+        session_id: str,
+        user_message: str
+    ) -> FormattedResponse:
+        """Trả câu trả lời từ ResponseCache: bỏ qua retrieval, ranking và generation."""
+        lookup_latency = int((time.time() - start_time) * 1000) - log_entry.intent_parse_latency_ms
+        response = ResponseCache.to_response(cached)
+        decision = Decision(type=response.decision_type)
+        
+        log_entry.decision_type = decision.type
+        log_entry.selected_answer_id = next(iter(cached["tags"]), None)
+        log_entry.final_response = response.message
+        log_entry.source_citation = response.source_citation
+        log_entry.total_latency_ms = int((time.time() - start_time) * 1000)
+        logger.info(f"Response cache hit (answers={list(cached['tags'])})")
+        
+        await self._update_session_state(session_id, decision)
+        self._save_log(log_entry)
+        await self._update_chat_history(session_id, user_message, response.message)
         
+        if self.monitoring:
+            await asyncio.to_thread(
+                self._record_cache_hit_metrics,
+                decision.type, log_entry.total_latency_ms,
+                max(0, cached["built_latency_ms"] - lookup_latency)
+            )
         return response
     
-    def _get_chat_history(self, session_id: str) -> List[Message]:
+    async def _get_chat_history(self, session_id: str) -> List[Message]:
         """
         Get chat history for session.
         
@@ -349,9 +552,9 @@ class ChatbotPipeline:
         # Try Redis first
         if ADVANCED_FEATURES_AVAILABLE:
             try:
-                redis_mgr = get_redis_manager()
+                redis_mgr = get_async_redis_manager()
                 if redis_mgr and redis_mgr.is_connected:
-                    history_data = redis_mgr.get_chat_history(
+                    history_data = await redis_mgr.get_chat_history(
                         session_id, 
                         max_messages=Config.CHAT_HISTORY_MAX_MESSAGES
                     )
@@ -364,7 +567,7 @@ class ChatbotPipeline:
         history = self._chat_histories.get(session_id, [])
         return history[-Config.CHAT_HISTORY_MAX_MESSAGES:]
     
-    def _update_chat_history(
+    async def _update_chat_history(
         self, 
         session_id: str, 
         user_message: str, 
@@ -378,9 +581,9 @@ class ChatbotPipeline:
         # Try Redis first
         if ADVANCED_FEATURES_AVAILABLE:
             try:
-                redis_mgr = get_redis_manager()
+                redis_mgr = get_async_redis_manager()
                 if redis_mgr and redis_mgr.is_connected:
-                    redis_mgr.update_chat_history(session_id, user_message, assistant_message)
+                    await redis_mgr.update_chat_history(session_id, user_message, assistant_message)
                     logger.debug(f"Chat history saved to Redis for session {session_id}")
             except Exception as e:
                 logger.warning(f"Redis chat history update failed: {e}")
@@ -401,12 +604,12 @@ class ChatbotPipeline:
         if len(self._chat_histories[session_id]) > max_messages:
             self._chat_histories[session_id] = self._chat_histories[session_id][-max_messages:]
     
-    def _update_session_state(self, session_id: str, decision) -> None:
+    async def _update_session_state(self, session_id: str, decision) -> None:
         """Update session state based on decision."""
         if self.session_manager.should_increment_clarify(decision):
-            self.session_manager.increment_clarify_count(session_id)
+            await self.session_manager.aincrement_clarify_count(session_id)
         elif self.session_manager.should_reset_clarify(decision):
-            self.session_manager.reset_clarify_count(session_id)
+            await self.session_manager.areset_clarify_count(session_id)
     
     def _init_log_entry(self, session_id: str, user_message: str) -> InteractionLog:
         """Initialize a log entry."""
@@ -452,6 +655,12 @@ class ChatbotPipeline:
             "confidence_score": log_entry.confidence_score,
             "total_latency_ms": log_entry.total_latency_ms,
             "selected_problem_id": log_entry.selected_problem_id,
+            "neo4j_round_trips": log_entry.neo4j_round_trips,
+            "neo4j_latency_ms": log_entry.neo4j_latency_ms,
+            "retrieval_channels": {
+                channel: {"hits": stats["hits"], "latency_ms": round(stats["latency_ms"], 1)}
+                for channel, stats in log_entry.retrieval_channels.items()
+            },
         }
         
         logger.info(f"Interaction log: {json.dumps(log_dict, ensure_ascii=False)}")
@@ -474,21 +683,22 @@ def create_pipeline(
     enable_monitoring: bool = True
 ) -> ChatbotPipeline:
    
-    from neo4j import GraphDatabase
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
     
-    # Create Neo4j driver
-    neo4j_driver = GraphDatabase.driver(
-        neo4j_uri,
-        auth=(neo4j_user, neo4j_password)
-    )
+    # Một connection manager cho cả process: pool cấu hình sẵn, managed read
+    # transaction; AsyncDriver được mở lười trên pipeline loop
+    neo4j_connection = get_neo4j_connection(neo4j_uri, neo4j_user, neo4j_password)
     
     # Create OpenAI client
     llm_client = OpenAI(api_key=openai_api_key)
     embedding_client = llm_client  # Same client for embeddings
+    async_llm_client = AsyncOpenAI(api_key=openai_api_key)
+    # EMBEDDING_PROVIDER=openai | local | hash (local/hash không gọi network trên đường request)
+    embedding_provider = create_embedding_provider(client=embedding_client, async_client=async_llm_client)
     
     # Create Redis client if URL provided
     redis_client = None
+    async_redis_client = None
     if redis_url:
         try:
             import redis
@@ -498,15 +708,26 @@ def create_pipeline(
             if ADVANCED_FEATURES_AVAILABLE:
                 init_redis(redis_url)
                 logger.info("Redis manager initialized for advanced features")
+            
+            async_redis_client = init_async_redis(redis_url).client
+            
+            # L2 của EmbeddingCache: embedding dùng chung giữa các worker và qua restart
+            get_embedding_cache(embedding_provider.model_id, embedding_provider.dimension).attach_redis(
+                init_redis(redis_url), get_async_redis_manager()
+            )
         except Exception as e:
             logger.warning(f"Failed to connect to Redis: {e}")
     
     return ChatbotPipeline(
-        neo4j_driver=neo4j_driver,
+        neo4j_driver=neo4j_connection,
         llm_client=llm_client,
         embedding_client=embedding_client,
         redis_client=redis_client,
         use_llm_parser=use_llm,
         use_llm_generator=use_llm,
-        enable_monitoring=enable_monitoring
+        enable_monitoring=enable_monitoring,
+        async_llm_client=async_llm_client,
+        async_embedding_client=async_llm_client,
+        async_redis_client=async_redis_client,
+        embedding_provider=embedding_provider
     )
@@ -12,12 +12,19 @@ RAGAS sử dụng LLM-as-Judge (GPT) để đánh giá tự động.
 
 import os
 import json
+import hashlib
 import logging
 import time
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field, asdict
 
+import numpy as np
+
+from schema import Config
+from embedding_store import EmbeddingStore
+from embedding_provider import EmbeddingProvider, OpenAIEmbeddingProvider
+
 logger = logging.getLogger(__name__)
 
 
@@ -88,11 +95,34 @@ class RAGASEvaluator:
         embedding_client=None,
         llm_model: str = "gpt-4o-mini",
         embedding_model: str = "text-embedding-3-small",
+        embedding_store_path: Optional[str] = Config.EVAL_EMBEDDING_STORE,
+        embedding_provider: Optional[EmbeddingProvider] = None,
     ):
         self.llm_client = llm_client
         self.embedding_client = embedding_client or llm_client
         self.llm_model = llm_model
-        self.embedding_model = embedding_model
+        # Không truyền provider → OpenAI embedding_model qua embedding_client (tạo lười sau _init_clients)
+        self.embedding_provider = embedding_provider
+        self.embedding_model = embedding_provider.model_id if embedding_provider else embedding_model
+        self.embedding_dimension = (
+            embedding_provider.dimension if embedding_provider
+            else OpenAIEmbeddingProvider.MODEL_DIMENSIONS.get(embedding_model, Config.EMBEDDING_DIMENSION)
+        )
+        
+        # Embedding của answer/ground_truth được lưu theo hash text trong
+        # EmbeddingStore, nên lần eval sau không phải embed lại text cũ
+        self.embedding_store_path = embedding_store_path
+        self._embedding_store: Optional[EmbeddingStore] = None
+        self._new_embeddings: Dict[str, np.ndarray] = {}
+        if embedding_store_path:
+            try:
+                self._embedding_store = EmbeddingStore.open(
+                    embedding_store_path, model=self.embedding_model, dimension=self.embedding_dimension
+                )
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Eval embedding store unusable, re-embedding: {e}")
         
     def _init_clients(self):
         if self.llm_client is None:
@@ -279,6 +309,8 @@ class RAGASEvaluator:
                 errors.append(f"Sample {i+1}: {str(e)}")
                 results.append(EvalResult(question=sample.question))
         
+        self.save_embedding_store()
+        
         # Aggregate
         report = self._build_report(results, start_time, errors)
         return report
@@ -528,29 +560,63 @@ Trả lời theo format JSON (chỉ JSON):
 
         return self._call_llm_judge(prompt, "context_recall")
     
+    def _text_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.embedding_model}\x1f{text}".encode("utf-8")).hexdigest()
+    
+    def _embed_texts(self, texts: List[str]) -> List[np.ndarray]:
+        """Embedding cho texts, ưu tiên EmbeddingStore/cache trong phiên, chỉ gọi API cho text mới."""
+        keys = [self._text_key(text) for text in texts]
+        missing = [
+            (key, text) for key, text in dict(zip(keys, texts)).items()
+            if key not in self._new_embeddings
+            and (self._embedding_store is None or key not in self._embedding_store)
+        ]
+        if missing:
+            if self.embedding_provider is None:
+                self.embedding_provider = OpenAIEmbeddingProvider(self.embedding_client, model=self.embedding_model)
+            vectors = self.embedding_provider.embed_many([text for _, text in missing])
+            for (key, _), vector in zip(missing, vectors):
+                self._new_embeddings[key] = vector
+        
+        vectors = []
+        for key in keys:
+            if key in self._new_embeddings:
+                vectors.append(np.asarray(self._new_embeddings[key], dtype=np.float32))
+            else:
+                vectors.append(self._embedding_store.get(key))
+        return vectors
+    
+    def save_embedding_store(self) -> None:
+        """Ghi các embedding mới của phiên eval vào EmbeddingStore trên đĩa."""
+        if not self.embedding_store_path or not self._new_embeddings:
+            return
+        try:
+            ids, vectors = EmbeddingStore.merged(self._embedding_store, self._new_embeddings)
+            self._embedding_store = EmbeddingStore.write(
+                self.embedding_store_path, ids, vectors,
+                model=self.embedding_model,
+                dimension=len(next(iter(self._new_embeddings.values())))
+            )
+            self._new_embeddings = {}
+        except Exception as e:
+            logger.warning(f"Could not save eval embedding store: {e}")
+    
     def _score_answer_similarity(self, answer: str, ground_truth: str) -> float:
         """
         Answer Similarity: So sánh ngữ nghĩa giữa answer và ground_truth 
         bằng cosine similarity của embeddings.
         """
         try:
-            response = self.embedding_client.embeddings.create(
-                model=self.embedding_model,
-                input=[answer, ground_truth]
-            )
-            
-            emb_answer = response.data[0].embedding
-            emb_truth = response.data[1].embedding
+            emb_answer, emb_truth = self._embed_texts([answer, ground_truth])
             
             # Cosine similarity
-            dot_product = sum(a * b for a, b in zip(emb_answer, emb_truth))
-            norm_a = sum(a ** 2 for a in emb_answer) ** 0.5
-            norm_b = sum(b ** 2 for b in emb_truth) ** 0.5
+            norm_a = float(np.linalg.norm(emb_answer))
+            norm_b = float(np.linalg.norm(emb_truth))
             
             if norm_a == 0 or norm_b == 0:
                 return 0.0
                 
-            similarity = dot_product / (norm_a * norm_b)
+            similarity = float(np.dot(emb_answer, emb_truth)) / (norm_a * norm_b)
             return max(0.0, min(1.0, similarity))
             
         except Exception as e:
@@ -715,10 +781,10 @@ class PipelineEvaluator:
         # Hook into pipeline to capture contexts
         captured_contexts = []
         
-        # Save original method
-        original_generate = self.pipeline.response_generator.generate
+        # Save original method (pipeline gọi agenerate trên đường aprocess)
+        original_generate = self.pipeline.response_generator.agenerate
         
-        def patched_generate(decision, context, user_question, 
+        async def patched_generate(decision, context, user_question, 
                             all_contexts=None, need_account_lookup=False):
             # Capture contexts - only relevant ones (already filtered by pipeline)
             def _ctx_to_text(ctx):
@@ -739,19 +805,19 @@ class PipelineEvaluator:
                 if text and len(text) > 10:
                     captured_contexts.append(text)
             
-            return original_generate(
+            return await original_generate(
                 decision, context, user_question,
                 all_contexts=all_contexts,
                 need_account_lookup=need_account_lookup
             )
         
         # Patch and run
-        self.pipeline.response_generator.generate = patched_generate
+        self.pipeline.response_generator.agenerate = patched_generate
         try:
             response = self.pipeline.process(question, session_id)
             answer = response.message
         finally:
-            self.pipeline.response_generator.generate = original_generate
+            self.pipeline.response_generator.agenerate = original_generate
         
         return answer, captured_contexts
 
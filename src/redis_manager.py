@@ -19,6 +19,8 @@ class RedisConfig:
     socket_connect_timeout: float = 5.0
     retry_on_timeout: bool = True
     health_check_interval: int = 30
+    reconnect_backoff: float = 1.0       # AsyncRedisManager: chờ sau lỗi đầu, nhân đôi mỗi lỗi liên tiếp
+    reconnect_backoff_max: float = 30.0
     
     # Key prefixes
     prefix_session: str = "session:"
@@ -210,6 +212,33 @@ class RedisManager:
             logger.error(f"Redis cache_set error: {e}")
             return False
     
+    def cache_get_bytes(self, cache_key: str) -> Optional[bytes]:
+        """Lấy payload nhị phân (không qua JSON) từ cache."""
+        if not self.is_connected:
+            return None
+        
+        try:
+            key = f"{self._config.prefix_cache}{cache_key}"
+            # Pool tạo không kèm decode_responses nên GET trả về bytes nguyên bản
+            return self._redis.get(key)
+        except Exception as e:
+            logger.error(f"Redis cache_get_bytes error: {e}")
+            return None
+    
+    def cache_set_bytes(self, cache_key: str, value: bytes, ttl: int = None) -> bool:
+        """Lưu payload nhị phân vào cache."""
+        if not self.is_connected:
+            return False
+        
+        try:
+            key = f"{self._config.prefix_cache}{cache_key}"
+            ttl = ttl or self._config.ttl_cache
+            self._redis.setex(key, ttl, value)
+            return True
+        except Exception as e:
+            logger.error(f"Redis cache_set_bytes error: {e}")
+            return False
+    
     def cache_delete(self, cache_key: str) -> bool:
         """Xóa cache entry."""
         if not self.is_connected:
@@ -549,9 +578,200 @@ class RedisManager:
             logger.info("Redis connection closed")
 
 
+class ReconnectBackoff:
+    """Backoff mũ sau lỗi Redis: tạm dùng fallback rồi thử lại, thay vì tắt Redis cho tới hết process."""
+    
+    def __init__(self, base: float = 1.0, maximum: float = 30.0):
+        self.base = base
+        self.maximum = maximum
+        self.failures = 0
+        self.retry_at = 0.0
+    
+    @property
+    def ready(self) -> bool:
+        return time.monotonic() >= self.retry_at
+    
+    def failed(self) -> float:
+        """Ghi nhận một lỗi, trả về số giây tạm ngưng dùng Redis."""
+        now = time.monotonic()
+        # Lỗi cách lần thử lại trước lâu → sự cố mới, bắt đầu lại từ base
+        if now - self.retry_at > self.maximum:
+            self.failures = 0
+        delay = min(self.base * 2 ** self.failures, self.maximum)
+        self.failures += 1
+        self.retry_at = now + delay
+        return delay
+
+
+class AsyncRedisManager:
+    """
+    Bản redis.asyncio của các thao tác RedisManager dùng trên đường xử lý
+    request (ChatbotPipeline.aprocess).
+    
+    Client được tạo lazy ở lần gọi đầu tiên để gắn với event loop đang chạy.
+    Key format giống hệt RedisManager nên hai bản đọc/ghi chung dữ liệu.
+    """
+    
+    def __init__(self, config: RedisConfig = None):
+        self._config = config or RedisConfig()
+        self._redis = None
+        self._connected = True
+        self._backoff = ReconnectBackoff(self._config.reconnect_backoff, self._config.reconnect_backoff_max)
+    
+    def _ensure_client(self):
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError:
+                logger.warning("Redis package not installed. Running without Redis.")
+                self._connected = False
+                return None
+            self._redis = aioredis.from_url(
+                self._config.url,
+                max_connections=self._config.max_connections,
+                socket_timeout=self._config.socket_timeout,
+                socket_connect_timeout=self._config.socket_connect_timeout,
+                retry_on_timeout=self._config.retry_on_timeout,
+                health_check_interval=self._config.health_check_interval
+            )
+        return self._redis
+    
+    @property
+    def is_connected(self) -> bool:
+        """False trong thời gian backoff sau lỗi (caller chuyển sang fallback), sau đó thử lại."""
+        return self._connected and self._backoff.ready
+    
+    @property
+    def client(self):
+        """Lấy redis.asyncio client (pool của redis-py tự mở lại connection khi thử lại)."""
+        return self._ensure_client() if self.is_connected else None
+    
+    def _mark_failed(self, operation: str, error: Exception) -> None:
+        delay = self._backoff.failed()
+        logger.error(f"Async Redis {operation} error: {error}. Retrying in {delay:.0f}s")
+    
+    async def get_chat_history(self, session_id: str, max_messages: int = 10) -> List[Dict[str, str]]:
+        """Bản async của RedisManager.get_chat_history."""
+        client = self.client
+        if client is None:
+            return []
+        
+        try:
+            key = f"{self._config.prefix_chat_history}{session_id}"
+            data = await client.lrange(key, 0, max_messages * 2 - 1)
+            messages = []
+            for item in reversed(data):
+                try:
+                    messages.append(json.loads(item))
+                except json.JSONDecodeError:
+                    continue
+            return messages[-max_messages * 2:]
+        except Exception as e:
+            self._mark_failed("get_chat_history", e)
+            return []
+    
+    async def update_chat_history(
+        self, 
+        session_id: str, 
+        user_message: str, 
+        assistant_message: str
+    ) -> bool:
+        """Bản async của RedisManager.update_chat_history."""
+        client = self.client
+        if client is None:
+            return False
+        
+        try:
+            key = f"{self._config.prefix_chat_history}{session_id}"
+            pipe = client.pipeline()
+            pipe.lpush(key, json.dumps({"role": "assistant", "content": assistant_message}))
+            pipe.lpush(key, json.dumps({"role": "user", "content": user_message}))
+            pipe.expire(key, self._config.ttl_chat_history)
+            pipe.ltrim(key, 0, 19)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            self._mark_failed("update_chat_history", e)
+            return False
+    
+    async def cache_get_bytes(self, cache_key: str) -> Optional[bytes]:
+        """Bản async của RedisManager.cache_get_bytes."""
+        client = self.client
+        if client is None:
+            return None
+        
+        try:
+            return await client.get(f"{self._config.prefix_cache}{cache_key}")
+        except Exception as e:
+            self._mark_failed("cache_get_bytes", e)
+            return None
+    
+    async def cache_set_bytes(self, cache_key: str, value: bytes, ttl: int = None) -> bool:
+        """Bản async của RedisManager.cache_set_bytes."""
+        client = self.client
+        if client is None:
+            return False
+        
+        try:
+            await client.setex(f"{self._config.prefix_cache}{cache_key}", ttl or self._config.ttl_cache, value)
+            return True
+        except Exception as e:
+            self._mark_failed("cache_set_bytes", e)
+            return False
+    
+    async def cache_get(self, cache_key: str) -> Optional[Any]:
+        """Bản async của RedisManager.cache_get."""
+        client = self.client
+        if client is None:
+            return None
+        
+        try:
+            data = await client.get(f"{self._config.prefix_cache}{cache_key}")
+            return json.loads(data) if data else None
+        except Exception as e:
+            self._mark_failed("cache_get", e)
+            return None
+    
+    async def cache_set(self, cache_key: str, value: Any, ttl: int = None) -> bool:
+        """Bản async của RedisManager.cache_set."""
+        client = self.client
+        if client is None:
+            return False
+        
+        try:
+            await client.setex(f"{self._config.prefix_cache}{cache_key}", ttl or self._config.ttl_cache, json.dumps(value))
+            return True
+        except Exception as e:
+            self._mark_failed("cache_set", e)
+            return False
+    
+    async def cache_delete(self, cache_key: str) -> bool:
+        """Bản async của RedisManager.cache_delete."""
+        client = self.client
+        if client is None:
+            return False
+        
+        try:
+            await client.delete(f"{self._config.prefix_cache}{cache_key}")
+            return True
+        except Exception as e:
+            self._mark_failed("cache_delete", e)
+            return False
+    
+    async def close(self):
+        """Đóng kết nối redis.asyncio."""
+        if self._redis is not None:
+            try:
+                await self._redis.aclose()
+            except Exception:
+                pass
+            self._redis = None
+
+
 # ==================== Global Instance ====================
 
 _redis_manager: Optional[RedisManager] = None
+_async_redis_manager: Optional[AsyncRedisManager] = None
 
 
 def get_redis_manager(config: RedisConfig = None) -> RedisManager:
@@ -566,3 +786,17 @@ def init_redis(url: str = None, **kwargs) -> RedisManager:
     """Initialize Redis with URL."""
     config = RedisConfig(url=url, **kwargs) if url else RedisConfig(**kwargs)
     return get_redis_manager(config)
+
+
+def get_async_redis_manager(config: RedisConfig = None) -> Optional[AsyncRedisManager]:
+    """Get global async Redis manager (None nếu chưa init_async_redis)."""
+    global _async_redis_manager
+    if _async_redis_manager is None and config is not None:
+        _async_redis_manager = AsyncRedisManager(config)
+    return _async_redis_manager
+
+
+def init_async_redis(url: str = None, **kwargs) -> AsyncRedisManager:
+    """Initialize async Redis with URL."""
+    config = RedisConfig(url=url, **kwargs) if url else RedisConfig(**kwargs)
+    return get_async_redis_manager(config)
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from schema import Config, DecisionType, FormattedResponse, StructuredQueryObject
+from retrieval import GraphVersion, SampleQuestionLookup, _aread
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Cache câu trả lời cuối cùng cho các câu hỏi lặp lại.
+    
+    Key = condensed_query đã chuẩn hóa + service + problem_type, cộng cờ
+    need_account_lookup và multi-part (hai cờ này đổi nội dung câu trả lời).
+    Mỗi entry ghi lại content_hash của các Answer đã dùng để sinh câu trả lời.
+    Map answer_id -> content_hash được nạp lại theo graph version, nên sau khi
+    nạp lại KB chỉ entry có Answer bị sửa/xóa bị bỏ (lúc đọc), entry khác giữ nguyên.
+    
+    Hai tầng giống EmbeddingCache: L1 LRU in-process, L2 Redis (JSON, TTL).
+    Pipeline chỉ dùng cho lượt không có lịch sử chat và quyết định
+    DIRECT_ANSWER / ANSWER_WITH_CLARIFY.
+    """
+    
+    ANSWER_HASHES_CYPHER = "MATCH (a:Answer) RETURN a.id AS answer_id, a.content_hash AS content_hash"
+    CACHEABLE_DECISIONS = (DecisionType.DIRECT_ANSWER, DecisionType.ANSWER_WITH_CLARIFY)
+    
+    _NOT_LOADED = object()
+    
+    def __init__(
+        self,
+        neo4j_driver,
+        async_driver=None,
+        graph_version: Optional[GraphVersion] = None,
+        max_size: int = Config.RESPONSE_CACHE_SIZE,
+        ttl: int = Config.RESPONSE_CACHE_TTL_SECONDS
+    ):
+        self.driver = neo4j_driver
+        self.async_driver = async_driver
+        self.graph_version = graph_version or GraphVersion(neo4j_driver, async_driver)
+        self.enabled = Config.RESPONSE_CACHE_ENABLED
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.async_redis = None
+        self._answer_hashes: Optional[Dict[str, Optional[str]]] = None
+        self._version: Any = self._NOT_LOADED
+        self.hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.invalidated = 0
+    
+    def attach_redis(self, async_redis_manager=None) -> None:
+        """Bật L2 (AsyncRedisManager), dùng chung giữa các worker."""
+        self.async_redis = async_redis_manager
+    
+    @staticmethod
+    def key(query: StructuredQueryObject, multi_part: bool = False) -> str:
+        parts = [
+            SampleQuestionLookup.normalize(query.condensed_query),
+            query.service.value,
+            query.problem_type.value,
+            "account" if query.need_account_lookup else "",
+            "multi" if multi_part else "",
+        ]
+        return hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()
+    
+    async def _atags(self) -> Optional[Dict[str, Optional[str]]]:
+        """Map answer_id -> content_hash của graph version hiện tại (None nếu không nạp được)."""
+        version = await self.graph_version.acurrent()
+        if self._version != version:
+            try:
+                records = await _aread(self.driver, self.async_driver, self.ANSWER_HASHES_CYPHER)
+                self._answer_hashes = {record["answer_id"]: record["content_hash"] for record in records}
+                logger.info(f"Response cache tags loaded: {len(self._answer_hashes)} answers (graph version={version})")
+            except Exception as e:
+                logger.warning(f"Response cache tags load failed: {e}")
+                self._answer_hashes = None
+            # Lỗi cũng được ghi nhận theo version để không thử nạp lại ở mỗi request
+            self._version = version
+        return self._answer_hashes
+    
+    def _tag(self, answer_id: str, answer_hashes: Dict[str, Optional[str]]) -> Optional[str]:
+        if answer_id not in answer_hashes:
+            return None
+        # Graph nạp bằng bản cũ chưa có content_hash → gắn theo graph version
+        return answer_hashes[answer_id] or f"version:{self._version}"
+    
+    def _is_fresh(self, entry: Dict[str, Any], answer_hashes: Dict[str, Optional[str]]) -> bool:
+        return all(
+            tag is not None and self._tag(answer_id, answer_hashes) == tag
+            for answer_id, tag in entry["tags"].items()
+        )
+    
+    def _remember(self, cache_key: str, entry: Dict[str, Any]) -> None:
+        self.cache[cache_key] = entry
+        self.cache.move_to_end(cache_key)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+    
+    async def aget(self, query: StructuredQueryObject, multi_part: bool = False) -> Optional[Dict[str, Any]]:
+        """Entry {message, source_citation, decision_type, tags, built_latency_ms} hoặc None."""
+        if not self.enabled:
+            return None
+        answer_hashes = await self._atags()
+        if answer_hashes is None:
+            return None
+        
+        cache_key = self.key(query, multi_part)
+        entry = self.cache.get(cache_key)
+        if entry is not None and time.time() - entry["created_at"] > self.ttl:
+            del self.cache[cache_key]
+            entry = None
+        from_l2 = False
+        if entry is None and self.async_redis is not None and self.async_redis.is_connected:
+            entry = await self.async_redis.cache_get(f"response:{cache_key}")
+            from_l2 = entry is not None
+        
+        if entry is None:
+            self.misses += 1
+            return None
+        if not self._is_fresh(entry, answer_hashes):
+            self.invalidated += 1
+            self.misses += 1
+            self.cache.pop(cache_key, None)
+            if self.async_redis is not None and self.async_redis.is_connected:
+                await self.async_redis.cache_delete(f"response:{cache_key}")
+            logger.info(f"Response cache entry invalidated (answers changed: {list(entry['tags'])})")
+            return None
+        
+        self.hits += 1
+        if from_l2:
+            self.l2_hits += 1
+        self._remember(cache_key, entry)
+        return entry
+    
+    async def aset(
+        self,
+        query: StructuredQueryObject,
+        response: FormattedResponse,
+        answer_ids: Iterable[str],
+        built_latency_ms: int,
+        multi_part: bool = False
+    ) -> bool:
+        """Lưu câu trả lời, gắn tag theo các Answer đã dùng. Bỏ qua nếu không xác định được tag."""
+        if not self.enabled or response.decision_type not in self.CACHEABLE_DECISIONS:
+            return False
+        answer_hashes = await self._atags()
+        answer_ids = [answer_id for answer_id in dict.fromkeys(answer_ids) if answer_id]
+        if answer_hashes is None or not answer_ids:
+            return False
+        tags = {answer_id: self._tag(answer_id, answer_hashes) for answer_id in answer_ids}
+        if any(tag is None for tag in tags.values()):
+            return False
+        
+        cache_key = self.key(query, multi_part)
+        entry = {
+            "message": response.message,
+            "source_citation": response.source_citation,
+            "decision_type": response.decision_type.value,
+            "tags": tags,
+            "built_latency_ms": built_latency_ms,
+            "created_at": time.time(),
+        }
+        self._remember(cache_key, entry)
+        if self.async_redis is not None and self.async_redis.is_connected:
+            await self.async_redis.cache_set(f"response:{cache_key}", entry, ttl=self.ttl)
+        return True
+    
+    @staticmethod
+    def to_response(entry: Dict[str, Any]) -> FormattedResponse:
+        return FormattedResponse(
+            message=entry["message"],
+            source_citation=entry["source_citation"],
+            decision_type=DecisionType(entry["decision_type"])
+        )
+    
+    def clear(self) -> None:
+        self.cache.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.cache),
+            "hits": self.hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+        }
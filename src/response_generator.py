@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Optional, List
 
@@ -52,8 +53,9 @@ QUY TẮC BẮT BUỘC:
 
 Trả lời:"""
 
-    def __init__(self, llm_client):
+    def __init__(self, llm_client, async_llm_client=None):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
         self.model = Config.RESPONSE_GENERATOR_MODEL
         self.temperature = Config.RESPONSE_GENERATOR_TEMPERATURE
         self.max_tokens = Config.RESPONSE_GENERATOR_MAX_TOKENS
@@ -109,22 +111,7 @@ Trả lời:"""
     ) -> FormattedResponse:
         # OPTIMIZATION: Skip LLM synthesis khi có context tốt để giảm latency
         if decision.type in [DecisionType.DIRECT_ANSWER, DecisionType.ANSWER_WITH_CLARIFY]:
-            # Kiểm tra nếu top result có similarity cao (>= 0.85) → dùng direct answer (nhanh)
-            use_direct = False
-            similarity = 0.0
-            
-            if decision.top_result:
-                similarity = decision.top_result.similarity_score
-                if similarity >= 0.90:
-                    use_direct = True
-            
-            # CRITICAL FIX: Câu hỏi nhiều ý (multi-part) cần LLM synthesis
-            # để trả lời TẤT CẢ các ý, không chỉ ý đầu tiên
-            is_multi_part = self._is_multi_part_question(user_question)
-            if is_multi_part:
-                logger.info(f"Multi-part question detected, forcing LLM synthesis "
-                           f"(contexts={len(all_contexts) if all_contexts else 0}, similarity={similarity:.2f})")
-                use_direct = False  # Override fast path - always use synthesis for multi-part
+            use_direct, similarity = self._use_fast_path(decision, user_question, all_contexts)
             
             if use_direct and context:
                 # Fast path: Direct answer without LLM synthesis (~0.5s thay vì 10-15s)
@@ -164,6 +151,94 @@ Trả lời:"""
             logger.error(f"Unknown decision type: {decision.type}")
             return self._generate_escalation_low_confidence()
     
+    async def agenerate(
+        self, 
+        decision: Decision, 
+        context: Optional[RetrievedContext], 
+        user_question: str,
+        all_contexts: Optional[List[RetrievedContext]] = None,
+        need_account_lookup: bool = False
+    ) -> FormattedResponse:
+        """Bản async của generate().
+        
+        Chỉ nhánh LLM synthesis có I/O nên chỉ nhánh đó await AsyncOpenAI;
+        các nhánh còn lại (fast path, template) dùng lại generate().
+        """
+        if not self._needs_synthesis(decision, context, user_question, all_contexts):
+            return self.generate(
+                decision, context, user_question,
+                all_contexts=all_contexts,
+                need_account_lookup=need_account_lookup
+            )
+        
+        response = await self._agenerate_synthesized_answer(decision, all_contexts, user_question)
+        if need_account_lookup and decision.type in [DecisionType.DIRECT_ANSWER, DecisionType.ANSWER_WITH_CLARIFY]:
+            response = self._append_personal_escalation(response)
+        return response
+    
+    def _use_fast_path(
+        self,
+        decision: Decision,
+        user_question: str,
+        all_contexts: Optional[List[RetrievedContext]] = None
+    ) -> tuple[bool, float]:
+        # Kiểm tra nếu top result có similarity cao (>= 0.85) → dùng direct answer (nhanh)
+        use_direct = False
+        similarity = 0.0
+        
+        if decision.top_result:
+            similarity = decision.top_result.similarity_score
+            if similarity >= 0.90:
+                use_direct = True
+        
+        # CRITICAL FIX: Câu hỏi nhiều ý (multi-part) cần LLM synthesis
+        # để trả lời TẤT CẢ các ý, không chỉ ý đầu tiên
+        is_multi_part = self._is_multi_part_question(user_question)
+        if is_multi_part:
+            logger.info(f"Multi-part question detected, forcing LLM synthesis "
+                       f"(contexts={len(all_contexts) if all_contexts else 0}, similarity={similarity:.2f})")
+            use_direct = False  # Override fast path - always use synthesis for multi-part
+        
+        return use_direct, similarity
+    
+    def _needs_synthesis(
+        self,
+        decision: Decision,
+        context: Optional[RetrievedContext],
+        user_question: str,
+        all_contexts: Optional[List[RetrievedContext]] = None
+    ) -> bool:
+        """True nếu generate() sẽ đi vào nhánh LLM synthesis (cùng điều kiện rẽ nhánh)."""
+        if decision.type in [DecisionType.DIRECT_ANSWER, DecisionType.ANSWER_WITH_CLARIFY]:
+            use_direct, _ = self._use_fast_path(decision, user_question, all_contexts)
+            return not (use_direct and context) and bool(all_contexts)
+        if decision.type == DecisionType.CLARIFY_REQUIRED:
+            return bool(all_contexts) and len(all_contexts) >= 2
+        return False
+    
+    def _build_synthesis_prompt(self, contexts: List[RetrievedContext], user_question: str) -> str:
+        # Build context string - use more contexts for multi-part questions
+        is_multi_part = self._is_multi_part_question(user_question)
+        ctx_limit = 5 if is_multi_part else 3
+        context_parts = []
+        for i, ctx in enumerate(contexts[:ctx_limit]):
+            part = f"--- Nguồn {i+1}: {ctx.problem_title or 'N/A'} ---\n"
+            if ctx.answer_content:
+                part += ctx.answer_content
+            if ctx.answer_steps:
+                steps = "\n".join(f"  {j+1}. {s}" for j, s in enumerate(ctx.answer_steps))
+                part += f"\nCác bước:\n{steps}"
+            if ctx.answer_notes:
+                part += f"\nLưu ý: {ctx.answer_notes}"
+            context_parts.append(part)
+        
+        contexts_text = "\n\n".join(context_parts)
+        
+        return self.SYNTHESIS_PROMPT.format(
+            user_question=user_question,
+            contexts=contexts_text
+        )
+    
     def _generate_synthesized_answer(
         self, 
         decision: Decision, 
@@ -172,64 +247,9 @@ Trả lời:"""
     ) -> FormattedResponse:
         """Dùng LLM tổng hợp câu trả lời từ nhiều contexts."""
         try:
-            # Build context string - use more contexts for multi-part questions
-            is_multi_part = self._is_multi_part_question(user_question)
-            ctx_limit = 5 if is_multi_part else 3
-            context_parts = []
-            for i, ctx in enumerate(contexts[:ctx_limit]):
-                part = f"--- Nguồn {i+1}: {ctx.problem_title or 'N/A'} ---\n"
-                if ctx.answer_content:
-                    part += ctx.answer_content
-                if ctx.answer_steps:
-                    steps = "\n".join(f"  {j+1}. {s}" for j, s in enumerate(ctx.answer_steps))
-                    part += f"\nCác bước:\n{steps}"
-                if ctx.answer_notes:
-                    part += f"\nLưu ý: {ctx.answer_notes}"
-                context_parts.append(part)
-            
-            contexts_text = "\n\n".join(context_parts)
-            
-            prompt = self.SYNTHESIS_PROMPT.format(
-                user_question=user_question,
-                contexts=contexts_text
-            )
-            
+            prompt = self._build_synthesis_prompt(contexts, user_question)
             response_text = self._call_llm_synthesis(prompt)
-            
-            # Validate response
-            if not response_text or len(response_text) < 20:
-                logger.warning("LLM synthesis response too short, falling back")
-                if contexts[0]:
-                    return self._generate_direct_answer(decision, contexts[0], user_question)
-                return self._generate_escalation_low_confidence()
-            
-            # Detect "no info" responses from LLM synthesis
-            # When contexts are irrelevant, the LLM correctly says it has no info.
-            # But if the Decision Engine already determined DIRECT_ANSWER with good confidence,
-            # it means the contexts DO have relevant info — fall back to direct answer
-            # instead of escalating (the LLM may reject due to category mismatch).
-            NO_INFO_MARKERS = [
-                "chưa có thông tin",
-                "không có thông tin phù hợp",
-                "không tìm thấy thông tin",
-                "nằm ngoài phạm vi",
-            ]
-            response_lower = response_text.lower()
-            if any(marker in response_lower for marker in NO_INFO_MARKERS):
-                # If decision was DIRECT_ANSWER/ANSWER_WITH_CLARIFY, trust the decision engine
-                # and fall back to the top context's direct answer
-                if decision.type in [DecisionType.DIRECT_ANSWER, DecisionType.ANSWER_WITH_CLARIFY] and contexts:
-                    logger.info("LLM synthesis returned 'no info' but decision engine says DIRECT_ANSWER — falling back to top context")
-                    return self._generate_direct_answer(decision, contexts[0], user_question)
-                logger.info("LLM synthesis returned 'no info' — switching to LOW_CONFIDENCE template")
-                return self._generate_escalation_low_confidence()
-            
-            return FormattedResponse(
-                message=response_text,
-                source_citation="",
-                decision_type=DecisionType.DIRECT_ANSWER
-            )
-            
+            return self._finish_synthesis(decision, contexts, user_question, response_text)
         except Exception as e:
             logger.error(f"Synthesis failed: {e}")
             # Fallback to first context
@@ -237,6 +257,65 @@ Trả lời:"""
                 return self._generate_direct_answer(decision, contexts[0], user_question)
             return self._generate_escalation_low_confidence()
     
+    async def _agenerate_synthesized_answer(
+        self, 
+        decision: Decision, 
+        contexts: List[RetrievedContext], 
+        user_question: str
+    ) -> FormattedResponse:
+        """Bản async của _generate_synthesized_answer()."""
+        try:
+            prompt = self._build_synthesis_prompt(contexts, user_question)
+            response_text = await self._acall_llm_synthesis(prompt)
+            return self._finish_synthesis(decision, contexts, user_question, response_text)
+        except Exception as e:
+            logger.error(f"Synthesis failed: {e}")
+            if contexts and contexts[0]:
+                return self._generate_direct_answer(decision, contexts[0], user_question)
+            return self._generate_escalation_low_confidence()
+    
+    def _finish_synthesis(
+        self, 
+        decision: Decision, 
+        contexts: List[RetrievedContext], 
+        user_question: str,
+        response_text: str
+    ) -> FormattedResponse:
+        """Kiểm tra output của LLM synthesis và fallback khi cần."""
+        # Validate response
+        if not response_text or len(response_text) < 20:
+            logger.warning("LLM synthesis response too short, falling back")
+            if contexts[0]:
+                return self._generate_direct_answer(decision, contexts[0], user_question)
+            return self._generate_escalation_low_confidence()
+        
+        # Detect "no info" responses from LLM synthesis
+        # When contexts are irrelevant, the LLM correctly says it has no info.
+        # But if the Decision Engine already determined DIRECT_ANSWER with good confidence,
+        # it means the contexts DO have relevant info — fall back to direct answer
+        # instead of escalating (the LLM may reject due to category mismatch).
+        NO_INFO_MARKERS = [
+            "chưa có thông tin",
+            "không có thông tin phù hợp",
+            "không tìm thấy thông tin",
+            "nằm ngoài phạm vi",
+        ]
+        response_lower = response_text.lower()
+        if any(marker in response_lower for marker in NO_INFO_MARKERS):
+            # If decision was DIRECT_ANSWER/ANSWER_WITH_CLARIFY, trust the decision engine
+            # and fall back to the top context's direct answer
+            if decision.type in [DecisionType.DIRECT_ANSWER, DecisionType.ANSWER_WITH_CLARIFY] and contexts:
+                logger.info("LLM synthesis returned 'no info' but decision engine says DIRECT_ANSWER — falling back to top context")
+                return self._generate_direct_answer(decision, contexts[0], user_question)
+            logger.info("LLM synthesis returned 'no info' — switching to LOW_CONFIDENCE template")
+            return self._generate_escalation_low_confidence()
+        
+        return FormattedResponse(
+            message=response_text,
+            source_citation="",
+            decision_type=DecisionType.DIRECT_ANSWER
+        )
+    
     def _call_llm_synthesis(self, prompt: str) -> str:
         """Call LLM for synthesis with specific settings."""
         try:
@@ -253,6 +332,24 @@ Trả lời:"""
             logger.error(f"LLM synthesis call failed: {e}")
             raise
     
+    async def _acall_llm_synthesis(self, prompt: str) -> str:
+        """Bản async của _call_llm_synthesis() dùng AsyncOpenAI client."""
+        if self.async_llm_client is None:
+            return await asyncio.to_thread(self._call_llm_synthesis, prompt)
+        try:
+            response = await self.async_llm_client.chat.completions.create(
+                model=self.model,
+                temperature=0.3,
+                max_tokens=self.max_tokens,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.error(f"LLM synthesis call failed: {e}")
+            raise
+    
     def _generate_direct_answer(self, decision: Decision, context: Optional[RetrievedContext], user_question: str) -> FormattedResponse:
         if not context:
             logger.warning("DIRECT_ANSWER không có context, fallback")
@@ -402,6 +499,17 @@ class ResponseGeneratorSimple:
             citation = ""
         return FormattedResponse(message=message, source_citation=citation, decision_type=decision.type)
     
+    async def agenerate(
+        self, 
+        decision: Decision, 
+        context: Optional[RetrievedContext], 
+        user_question: str,
+        all_contexts: Optional[List[RetrievedContext]] = None,
+        need_account_lookup: bool = False
+    ) -> FormattedResponse:
+        """Không gọi LLM nên chạy trực tiếp trên event loop."""
+        return self.generate(decision, context, user_question, all_contexts)
+    
     def _build_clarification(self, slots: List[str]) -> str:
         if not slots:
             return "- Bạn đang thực hiện giao dịch gì?\n- Bạn gặp vấn đề cụ thể gì?"
@@ -1,6 +1,18 @@
+import asyncio
 import logging
 import hashlib
-from typing import List, Optional, Dict
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, List, Optional, Dict, Tuple
+
+import numpy as np
 
 from schema import (
     StructuredQueryObject,
@@ -9,19 +21,54 @@ from schema import (
     SERVICE_GROUP_MAP,
     Config,
 )
+from vector_index import QuantizedVectorIndex, VectorIndex, is_memory_mapped
+from ann_index import HnswVectorIndex
+from embedding_store import EmbeddingStore
+from embedding_provider import EmbeddingProvider, OpenAIEmbeddingProvider
+from sample_question_index import SampleQuestionIndex, bounded_edit_distance
+from context_store import ContextStore
+from neo4j_config import Neo4jConnection
+from bm25_index import BM25Index, STOPWORDS, fold_accents
+from intent_parser import TextNormalizer
 
 logger = logging.getLogger(__name__)
 
 
 class EmbeddingCache:
-    """Cache embedding để giảm API calls."""
+    """Cache embedding để giảm API calls.
+    
+    Hai tầng:
+    - L1: LRU in-process (OrderedDict), giới hạn max_size query
+    - L2: Redis qua RedisManager (tùy chọn, gắn bằng attach_redis), lưu vector
+      dạng float32 little-endian đóng gói (~6 KB / 1536 chiều thay vì ~30 KB JSON)
+      với TTL, nên mọi worker và mọi lần restart dùng lại embedding đã trả tiền.
+    Key L2 gồm model + dimension để đổi model không đọc nhầm vector cũ.
+    """
     
-    def __init__(self, max_size: int = 500):
-        self.cache: Dict[str, List[float]] = {}
+    def __init__(
+        self,
+        max_size: int = Config.EMBEDDING_CACHE_SIZE,
+        ttl: int = Config.EMBEDDING_CACHE_TTL_SECONDS,
+        model: str = Config.EMBEDDING_MODEL,
+        dimension: int = Config.EMBEDDING_DIMENSION
+    ):
+        self.cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
         self.max_size = max_size
+        self.ttl = ttl
+        self.model = model
+        self.dimension = dimension
+        self.redis = None
+        self.async_redis = None
+        self._lock = threading.Lock()
         self.hits = 0
+        self.l2_hits = 0
         self.misses = 0
     
+    def attach_redis(self, redis_manager=None, async_redis_manager=None) -> None:
+        """Bật L2: RedisManager cho đường sync, AsyncRedisManager cho aembed()."""
+        self.redis = redis_manager
+        self.async_redis = async_redis_manager
+    
     def _normalize_query(self, text: str) -> str:
         normalized = text.lower().strip()
         normalized = " ".join(normalized.split())
@@ -31,215 +78,1111 @@ class EmbeddingCache:
         normalized = self._normalize_query(text)
         return hashlib.md5(normalized.encode()).hexdigest()
     
-    def get(self, text: str) -> Optional[List[float]]:
-        key = self._hash_query(text)
-        if key in self.cache:
+    def _redis_key(self, key: str) -> str:
+        return f"embedding:{self.model}:{self.dimension}:{key}"
+    
+    @staticmethod
+    def _pack(embedding: np.ndarray) -> bytes:
+        return np.asarray(embedding, dtype="<f4").tobytes()
+    
+    def _unpack(self, payload: Optional[bytes]) -> Optional[np.ndarray]:
+        if not payload or len(payload) != self.dimension * 4:
+            return None
+        return np.frombuffer(payload, dtype="<f4")
+    
+    def _l1_get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            embedding = self.cache.get(key)
+            if embedding is not None:
+                self.cache.move_to_end(key)
+            return embedding
+    
+    def _l1_set(self, key: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            self.cache[key] = embedding
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+    
+    def _record(self, embedding: Optional[np.ndarray], l2: bool = False) -> Optional[np.ndarray]:
+        if embedding is None:
+            self.misses += 1
+        else:
             self.hits += 1
-            logger.debug(f"Embedding cache HIT (hits={self.hits}, misses={self.misses})")
-            return self.cache[key]
-        self.misses += 1
-        return None
+            if l2:
+                self.l2_hits += 1
+            logger.debug(f"Embedding cache HIT{' (L2)' if l2 else ''} (hits={self.hits}, misses={self.misses})")
+        return embedding
+    
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self._hash_query(text)
+        embedding = self._l1_get(key)
+        if embedding is not None or self.redis is None:
+            return self._record(embedding)
+        
+        embedding = self._unpack(self.redis.cache_get_bytes(self._redis_key(key)))
+        if embedding is not None:
+            self._l1_set(key, embedding)
+        return self._record(embedding, l2=True)
     
-    def set(self, text: str, embedding: List[float]) -> None:
-        if len(self.cache) >= self.max_size:
-            keys_to_remove = list(self.cache.keys())[:self.max_size // 10]
-            for k in keys_to_remove:
-                del self.cache[k]
+    def set(self, text: str, embedding: np.ndarray) -> None:
         key = self._hash_query(text)
-        self.cache[key] = embedding
+        self._l1_set(key, embedding)
+        if self.redis is not None:
+            self.redis.cache_set_bytes(self._redis_key(key), self._pack(embedding), self.ttl)
+    
+    async def aget(self, text: str) -> Optional[np.ndarray]:
+        """Bản async của get(): L1 trực tiếp, L2 qua redis.asyncio (hoặc thread pool)."""
+        key = self._hash_query(text)
+        embedding = self._l1_get(key)
+        if embedding is not None:
+            return self._record(embedding)
+        
+        if self.async_redis is not None and self.async_redis.is_connected:
+            payload = await self.async_redis.cache_get_bytes(self._redis_key(key))
+        elif self.redis is not None:
+            payload = await asyncio.to_thread(self.redis.cache_get_bytes, self._redis_key(key))
+        else:
+            return self._record(None)
+        
+        embedding = self._unpack(payload)
+        if embedding is not None:
+            self._l1_set(key, embedding)
+        return self._record(embedding, l2=True)
+    
+    async def aset(self, text: str, embedding: np.ndarray) -> None:
+        key = self._hash_query(text)
+        self._l1_set(key, embedding)
+        if self.async_redis is not None and self.async_redis.is_connected:
+            await self.async_redis.cache_set_bytes(self._redis_key(key), self._pack(embedding), self.ttl)
+        elif self.redis is not None:
+            await asyncio.to_thread(self.redis.cache_set_bytes, self._redis_key(key), self._pack(embedding), self.ttl)
     
     def stats(self) -> Dict[str, int]:
         return {
             "size": len(self.cache),
             "hits": self.hits,
+            "l2_hits": self.l2_hits,
             "misses": self.misses,
             "hit_rate": self.hits / (self.hits + self.misses) if (self.hits + self.misses) > 0 else 0
         }
 
 
-_embedding_cache = EmbeddingCache(max_size=500)
+_embedding_caches: Dict[Tuple[str, int], EmbeddingCache] = {}
+_embedding_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model: str = Config.EMBEDDING_MODEL, dimension: int = Config.EMBEDDING_DIMENSION) -> EmbeddingCache:
+    """EmbeddingCache dùng chung trong process, một cache cho mỗi (model, dimension) của provider."""
+    with _embedding_caches_lock:
+        cache = _embedding_caches.get((model, dimension))
+        if cache is None:
+            cache = _embedding_caches[(model, dimension)] = EmbeddingCache(model=model, dimension=dimension)
+        return cache
+
+
+# Số round-trip + thời gian Neo4j của request hiện tại (None = không đo). ContextVar
+# nên các request async song song không lẫn nhau, và đi theo asyncio.to_thread
+_neo4j_usage: ContextVar[Optional[Dict[str, float]]] = ContextVar("neo4j_usage", default=None)
+
+
+@contextmanager
+def track_neo4j_usage():
+    """Đo các query Neo4j chạy trong khối with: {"round_trips", "latency_ms", "channels"}.
+    
+    channels: {kênh retrieval (vector | bm25 | fulltext): {"hits", "latency_ms"}}.
+    """
+    usage = {"round_trips": 0, "latency_ms": 0.0, "channels": {}}
+    token = _neo4j_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _neo4j_usage.reset(token)
+
+
+def _record_neo4j_usage(start: float) -> None:
+    usage = _neo4j_usage.get()
+    if usage is not None:
+        usage["round_trips"] += 1
+        usage["latency_ms"] += (time.perf_counter() - start) * 1000
+
+
+def _record_channel(channel: str, hits: int, start: float) -> None:
+    usage = _neo4j_usage.get()
+    if usage is not None:
+        usage["channels"][channel] = {"hits": hits, "latency_ms": (time.perf_counter() - start) * 1000}
+
+
+def _merge_neo4j_usage(other: Dict[str, Any]) -> None:
+    """Cộng usage đo ở task khác (vd. SpeculativeRetrieval) vào usage hiện tại."""
+    usage = _neo4j_usage.get()
+    if usage is not None:
+        usage["round_trips"] += other["round_trips"]
+        usage["latency_ms"] += other["latency_ms"]
+        usage["channels"].update(other["channels"])
+
+
+def _read(driver, cypher: str, params: Optional[Dict[str, Any]] = None) -> List[Any]:
+    """Chạy Cypher đọc trên driver sync, trả về toàn bộ records.
+    
+    Neo4jConnection: managed read transaction (retry, read routing, database, fetch size).
+    """
+    start = time.perf_counter()
+    if isinstance(driver, Neo4jConnection):
+        records = driver.execute_read(cypher, params)
+    else:
+        with driver.session() as session:
+            records = list(session.run(cypher, params or {}))
+    _record_neo4j_usage(start)
+    return records
+
+
+async def _aread(driver, async_driver, cypher: str, params: Optional[Dict[str, Any]] = None) -> List[Any]:
+    """Bản async của _read.
+    
+    Neo4jConnection tự quản AsyncDriver theo event loop; ngoài ra dùng
+    AsyncGraphDatabase driver nếu có, không thì đẩy query sync sang thread
+    pool để không chặn event loop.
+    """
+    if isinstance(driver, Neo4jConnection):
+        start = time.perf_counter()
+        records = await driver.aexecute_read(cypher, params)
+        _record_neo4j_usage(start)
+        return records
+    if async_driver is None:
+        return await asyncio.to_thread(_read, driver, cypher, params)
+    start = time.perf_counter()
+    async with async_driver.session() as session:
+        result = await session.run(cypher, params or {})
+        records = [record async for record in result]
+    _record_neo4j_usage(start)
+    return records
+
+
+class _AsyncLoadLock:
+    """asyncio.Lock cho lazy loader async, một lock cho mỗi event loop.
+    
+    Coroutine đầu tiên nạp, các coroutine đồng thời khác chờ rồi dùng kết quả
+    (double-checked như threading.Lock của bản sync). asyncio.Lock gắn với một
+    loop nên giữ riêng theo loop; loop bị thu hồi thì lock cũng mất theo.
+    """
+    
+    def __init__(self):
+        self._locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+    
+    def __call__(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+        return lock
+
+
+class GraphVersion:
+    """Stamp version của knowledge graph, do DataIngestion ghi sau mỗi lần nạp.
+    
+    Chỉ đọc lại từ Neo4j mỗi GRAPH_VERSION_CHECK_SECONDS giây, để các cache
+    in-memory biết lúc nào cần refresh mà không tốn round-trip cho từng request.
+    """
+    
+    VERSION_CYPHER = """
+    OPTIONAL MATCH (m:GraphMeta {id: 'graph'})
+    RETURN m.version AS version, m.embedding_model AS embedding_model, m.embedding_dimension AS embedding_dimension
+    """
+    
+    def __init__(self, neo4j_driver, async_driver=None, check_seconds: Optional[float] = None):
+        self.driver = neo4j_driver
+        self.async_driver = async_driver
+        self.check_seconds = Config.GRAPH_VERSION_CHECK_SECONDS if check_seconds is None else check_seconds
+        self._version: Optional[str] = None
+        self._checked_at: Optional[float] = None
+        # Provider đã tạo Problem.embedding (DataIngestion ghi cùng version)
+        self.embedding_model: Optional[str] = None
+        self.embedding_dimension: Optional[int] = None
+    
+    @property
+    def version(self) -> Optional[str]:
+        """Version đọc ở lần check gần nhất (không gọi Neo4j)."""
+        return self._version
+    
+    def _due(self) -> bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.check_seconds
+    
+    def _update(self, records: List[Any]) -> None:
+        record = records[0] if records else {}
+        version = record.get("version")
+        if self._checked_at is not None and version != self._version:
+            logger.info(f"Graph version changed: {self._version} -> {version}")
+        self._version = version
+        self.embedding_model = record.get("embedding_model")
+        self.embedding_dimension = record.get("embedding_dimension")
+        self._checked_at = time.monotonic()
+    
+    def current(self) -> Optional[str]:
+        if self._due():
+            try:
+                self._update(_read(self.driver, self.VERSION_CYPHER))
+            except Exception as e:
+                logger.warning(f"Graph version check failed: {e}")
+                self._checked_at = time.monotonic()
+        return self._version
+    
+    async def acurrent(self) -> Optional[str]:
+        if self._due():
+            try:
+                self._update(await _aread(self.driver, self.async_driver, self.VERSION_CYPHER))
+            except Exception as e:
+                logger.warning(f"Graph version check failed: {e}")
+                self._checked_at = time.monotonic()
+        return self._version
 
 
 class GraphConstraintFilter:
-    """Lọc không gian tìm kiếm dựa trên service/topic."""
+    """Lọc không gian tìm kiếm dựa trên service/topic.
+    
+    Danh sách Problem active và group của từng Problem được nạp một lần thành
+    catalog in-memory theo graph version; constrained list và global list đều
+    lấy từ catalog này và được làm mới khi DataIngestion ghi version mới.
+    """
+    
+    CATALOG_CYPHER = """
+    MATCH (p:Problem) WHERE p.status = 'active'
+    OPTIONAL MATCH (g:Group)-[:HAS_TOPIC]->(:Topic)-[:HAS_PROBLEM]->(p)
+    RETURN p.id AS problem_id, collect(DISTINCT g.id) AS group_ids
+    """
     
-    def __init__(self, neo4j_driver):
+    _NOT_LOADED = object()
+    
+    def __init__(self, neo4j_driver, async_driver=None, graph_version: Optional[GraphVersion] = None):
         self.driver = neo4j_driver
+        self.async_driver = async_driver
+        self.graph_version = graph_version or GraphVersion(neo4j_driver, async_driver)
         self._group_cache: Dict[tuple, List[str]] = {}
+        self._all_active: List[str] = []
+        self._problem_groups: Dict[str, frozenset] = {}
+        self._catalog_version: Any = self._NOT_LOADED
+        self._catalog_lock = threading.Lock()
+        self._acatalog_lock = _AsyncLoadLock()
     
-    def get_constrained_problems(self, query: StructuredQueryObject) -> List[str]:
-        service_value = query.service.value
-        allowed_groups = SERVICE_GROUP_MAP.get(service_value, [])
-        
+    @staticmethod
+    def _allowed_groups(query: StructuredQueryObject) -> List[str]:
+        allowed_groups = SERVICE_GROUP_MAP.get(query.service.value, [])
         if not allowed_groups:
             allowed_groups = list(SERVICE_GROUP_MAP.get("khac", []))
-        
-        cache_key = tuple(sorted(allowed_groups))
-        if cache_key in self._group_cache:
-            problem_ids = self._group_cache[cache_key]
+        return allowed_groups
+    
+    def _install_catalog(self, records: List[Any], version: Optional[str]) -> None:
+        all_active = [record["problem_id"] for record in records]
+        problem_groups = {
+            record["problem_id"]: frozenset(record["group_ids"] or []) for record in records
+        }
+        # Dựng xong mới gán; groups trước all_active để reader đang chạy không gặp ID lạ
+        self._problem_groups = problem_groups
+        self._all_active = all_active
+        self._group_cache = {}
+        self._catalog_version = version
+        logger.info(f"Problem catalog loaded: {len(all_active)} active Problems (graph version={version})")
+    
+    def _ensure_catalog(self) -> None:
+        version = self.graph_version.current()
+        if self._catalog_version != version:
+            with self._catalog_lock:
+                if self._catalog_version != version:
+                    self._install_catalog(_read(self.driver, self.CATALOG_CYPHER), version)
+    
+    async def _aensure_catalog(self) -> None:
+        version = await self.graph_version.acurrent()
+        if self._catalog_version != version:
+            async with self._acatalog_lock():
+                if self._catalog_version != version:
+                    self._install_catalog(await _aread(self.driver, self.async_driver, self.CATALOG_CYPHER), version)
+    
+    def _constrained(self, query: StructuredQueryObject) -> List[str]:
+        allowed_groups = self._allowed_groups(query)
+        key = tuple(sorted(allowed_groups))
+        cache = self._group_cache
+        problem_ids = cache.get(key)
+        if problem_ids is not None:
             logger.info(f"Constrained to {len(problem_ids)} Problems (cached)")
             return problem_ids
-        
-        cypher = """
-        MATCH (g:Group)-[:HAS_TOPIC]->(t:Topic)-[:HAS_PROBLEM]->(p:Problem)
-        WHERE g.id IN $allowed_groups AND p.status = 'active'
-        RETURN DISTINCT p.id AS problem_id
-        """
-        
-        with self.driver.session() as session:
-            result = session.run(cypher, {"allowed_groups": allowed_groups})
-            problem_ids = [record["problem_id"] for record in result]
-        
-        self._group_cache[cache_key] = problem_ids
+        allowed = set(allowed_groups)
+        problem_groups = self._problem_groups
+        problem_ids = [pid for pid in self._all_active if problem_groups.get(pid, frozenset()) & allowed]
+        cache[key] = problem_ids
         logger.info(f"Constrained to {len(problem_ids)} Problems from groups: {allowed_groups}")
         return problem_ids
     
+    def get_constrained_problems(self, query: StructuredQueryObject) -> List[str]:
+        self._ensure_catalog()
+        return self._constrained(query)
+    
+    async def aget_constrained_problems(self, query: StructuredQueryObject) -> List[str]:
+        await self._aensure_catalog()
+        return self._constrained(query)
+    
     def get_all_active_problems(self) -> List[str]:
-        cypher = "MATCH (p:Problem) WHERE p.status = 'active' RETURN p.id AS problem_id"
-        with self.driver.session() as session:
-            result = session.run(cypher)
-            return [record["problem_id"] for record in result]
+        self._ensure_catalog()
+        return self._all_active
+    
+    async def aget_all_active_problems(self) -> List[str]:
+        await self._aensure_catalog()
+        return self._all_active
 
 
 class ConstrainedVectorSearch:
     """Vector search trên tập Problem đã được lọc."""
     
-    def __init__(self, neo4j_driver, embedding_client):
+    SEARCH_CYPHER = """
+    CALL db.index.vector.queryNodes('problem_embedding_index', $top_k * 5, $embedding)
+    YIELD node, score
+    WHERE node.id IN $constrained_ids
+    RETURN node.id AS problem_id, node.title AS title, node.description AS description,
+           node.intent AS intent, node.keywords AS keywords, score AS similarity_score
+    ORDER BY score DESC
+    LIMIT $top_k
+    """
+    
+    # Cùng tập ứng viên với SEARCH_CYPHER nhưng không LIMIT, để search_with_fallback
+    # lọc cả constrained lẫn global top-k từ một lần query khi không có VectorIndex
+    POOL_CYPHER = """
+    CALL db.index.vector.queryNodes('problem_embedding_index', $top_k * 5, $embedding)
+    YIELD node, score
+    WHERE node.id IN $problem_ids
+    RETURN node.id AS problem_id, node.title AS title, node.description AS description,
+           node.intent AS intent, node.keywords AS keywords, score AS similarity_score
+    ORDER BY score DESC
+    """
+    
+    # POOL_CYPHER cho nhiều query trong một round-trip (retrieve_batch), mỗi q = {index, embedding}
+    BATCH_POOL_CYPHER = """
+    UNWIND $queries AS q
+    CALL db.index.vector.queryNodes('problem_embedding_index', $top_k * 5, q.embedding)
+    YIELD node, score
+    WHERE node.id IN $problem_ids
+    RETURN q.index AS query_index, node.id AS problem_id, node.title AS title,
+           node.description AS description, node.intent AS intent, node.keywords AS keywords,
+           score AS similarity_score
+    ORDER BY query_index, similarity_score DESC
+    """
+    
+    # Một round-trip cho cả retrieve_with_fallback khi không có VectorIndex in-memory:
+    # ràng buộc group bằng graph pattern (không gửi list constrained_ids), chỉ giữ
+    # constrained top-k + global top-k (cho cross-check) và mở rộng luôn sang
+    # Answer/Topic/Group (cùng các dòng như GraphTraversal.CONTEXT_CYPHER)
+    COMBINED_CYPHER = """
+    CALL db.index.vector.queryNodes('problem_embedding_index', $top_k * 5, $embedding)
+    YIELD node AS p, score
+    WHERE p.status = 'active'
+    WITH p, score, EXISTS {
+        MATCH (g:Group)-[:HAS_TOPIC]->(:Topic)-[:HAS_PROBLEM]->(p) WHERE g.id IN $allowed_groups
+    } AS in_scope
+    ORDER BY score DESC
+    WITH collect({problem: p, score: score, in_scope: in_scope}) AS pool
+    UNWIND [hit IN pool WHERE hit.in_scope][..$top_k] + pool[..$top_k] AS hit
+    WITH DISTINCT hit.problem AS p, hit.score AS score
+    RETURN p.id AS problem_id, p.title AS title, p.description AS description,
+           p.intent AS intent, p.keywords AS keywords, score AS similarity_score,
+           [(p)-[:HAS_ANSWER]->(a:Answer) | {answer_id: a.id, answer_content: a.content,
+                                             answer_steps: a.steps, answer_notes: a.notes}] AS answers,
+           [(g:Group)-[:HAS_TOPIC]->(t:Topic)-[:HAS_PROBLEM]->(p) | {topic_id: t.id, topic_name: t.name,
+                                                                    group_id: g.id, group_name: g.name}] AS placements
+    ORDER BY similarity_score DESC
+    """
+    
+    # Cross-check threshold: when constrained results aren't a strong match,
+    # always verify against the full KB. This catches intent misclassification
+    # (e.g., "bỏ tiền vào ví" parsed as dieu_khoan instead of nap_tien).
+    # Threshold raised from 0.75→0.88: wrong-group content can score 0.80+
+    # due to partial semantic overlap (e.g., "Mobile Money" appears in many groups).
+    CROSS_CHECK_THRESHOLD = 0.88
+    
+    # Nạp toàn bộ Problem embeddings cho VectorIndex in-memory (~600 x 1536 float32)
+    INDEX_CYPHER = """
+    MATCH (p:Problem)
+    WHERE p.embedding IS NOT NULL
+    RETURN p.id AS problem_id, p.title AS title, p.description AS description,
+           p.intent AS intent, p.keywords AS keywords, p.embedding AS embedding
+    """
+    
+    # Chỉ metadata, dùng khi vectors lấy từ EmbeddingStore trên đĩa
+    INDEX_META_CYPHER = """
+    MATCH (p:Problem)
+    WHERE p.embedding IS NOT NULL
+    RETURN p.id AS problem_id, p.title AS title, p.description AS description,
+           p.intent AS intent, p.keywords AS keywords
+    """
+    
+    # Embedding của vài Problem cụ thể (hit BM25 ngoài top-k vector) khi không có VectorIndex
+    EMBEDDINGS_CYPHER = """
+    MATCH (p:Problem)
+    WHERE p.id IN $problem_ids AND p.embedding IS NOT NULL
+    RETURN p.id AS problem_id, p.embedding AS embedding
+    """
+    
+    _NOT_LOADED = object()
+    
+    def __init__(
+        self,
+        neo4j_driver,
+        embedding_client,
+        async_driver=None,
+        async_embedding_client=None,
+        graph_version: Optional[GraphVersion] = None,
+        embedding_provider: Optional[EmbeddingProvider] = None
+    ):
         self.driver = neo4j_driver
-        self.embedding_client = embedding_client
-        self.embedding_model = Config.EMBEDDING_MODEL
+        self.async_driver = async_driver
+        self.embedding_provider = embedding_provider or OpenAIEmbeddingProvider(embedding_client, async_embedding_client)
+        self.embedding_model = self.embedding_provider.model_id
+        self.embedding_dimension = self.embedding_provider.dimension
         self.top_k = Config.VECTOR_SEARCH_TOP_K
-        self.cache = _embedding_cache
+        self.cache = get_embedding_cache(self.embedding_model, self.embedding_dimension)
+        
+        # Neo4j vẫn là source of truth; index được nạp lại khi graph version đổi
+        self.graph_version = graph_version or GraphVersion(neo4j_driver, async_driver)
+        self.use_index = Config.USE_IN_MEMORY_VECTOR_INDEX
+        self._index: Optional[VectorIndex] = None
+        self._index_version: Any = self._NOT_LOADED
+        self._index_lock = threading.Lock()
+        self._aindex_lock = _AsyncLoadLock()
+        self.embedding_store_path = Config.PROBLEM_EMBEDDING_STORE
     
-    def embed(self, text: str) -> List[float]:
+    def embed(self, text: str) -> np.ndarray:
         cached = self.cache.get(text)
         if cached is not None:
             return cached
-        response = self.embedding_client.embeddings.create(model=self.embedding_model, input=text)
-        embedding = response.data[0].embedding
+        return self._embed_uncached(text)
+    
+    def _embed_uncached(self, text: str) -> np.ndarray:
+        embedding = self.embedding_provider.embed_one(text)
         self.cache.set(text, embedding)
         return embedding
     
+    def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        """embed() cho nhiều text: phần chưa có trong cache được embed trong một lần gọi provider.
+        
+        Text trùng key cache (chỉ khác hoa/thường, khoảng trắng) chỉ embed một lần,
+        giống gọi embed() tuần tự.
+        """
+        embeddings: Dict[str, np.ndarray] = {}
+        missing: Dict[str, str] = {}
+        for text in texts:
+            key = self.cache._hash_query(text)
+            if key in embeddings or key in missing:
+                continue
+            cached = self.cache.get(text)
+            if cached is not None:
+                embeddings[key] = cached
+            else:
+                missing[key] = text
+        if missing:
+            for (key, text), embedding in zip(missing.items(), self.embedding_provider.embed_many(list(missing.values()))):
+                self.cache.set(text, embedding)
+                embeddings[key] = embedding
+        return [embeddings[self.cache._hash_query(text)] for text in texts]
+    
+    async def aembed(self, text: str) -> np.ndarray:
+        cached = await self.cache.aget(text)
+        if cached is not None:
+            return cached
+        embedding = await self.embedding_provider.aembed_one(text)
+        await self.cache.aset(text, embedding)
+        return embedding
+    
+    def _check_provider(self) -> None:
+        """Raise ValueError nếu Problem.embedding trong graph được tạo bởi provider khác.
+        
+        Graph nạp trước khi có GraphMeta.embedding_model được coi là model OpenAI mặc định.
+        """
+        if self.graph_version.version is None:
+            return
+        graph_model = self.graph_version.embedding_model or Config.EMBEDDING_MODEL
+        graph_dimension = self.graph_version.embedding_dimension or Config.EMBEDDING_DIMENSION
+        if (graph_model, graph_dimension) != (self.embedding_model, self.embedding_dimension):
+            raise ValueError(
+                f"Graph embeddings built with {graph_model} ({graph_dimension} dims) but query provider is "
+                f"{self.embedding_model} ({self.embedding_dimension} dims); re-run ingestion with the same EMBEDDING_PROVIDER"
+            )
+    
+    def _query_embedding(self, query: str) -> np.ndarray:
+        self.graph_version.current()
+        self._check_provider()
+        return self.embed(query)
+    
+    def _query_embeddings(self, queries: List[str]) -> List[np.ndarray]:
+        self.graph_version.current()
+        self._check_provider()
+        return self.embed_many(queries)
+    
+    async def _aquery_embedding(self, query: str, query_embedding: Optional[np.ndarray] = None) -> np.ndarray:
+        """query_embedding: embedding đã có sẵn cho query (vd. SpeculativeEmbedding), bỏ qua bước embed."""
+        await self.graph_version.acurrent()
+        self._check_provider()
+        if query_embedding is not None:
+            return query_embedding
+        return await self.aembed(query)
+    
+    @staticmethod
+    def _to_candidates(records: List[Any]) -> List[CandidateProblem]:
+        candidates = []
+        for record in records:
+            keywords = record["keywords"]
+            if isinstance(keywords, str):
+                keywords = keywords.split(",") if keywords else []
+            candidates.append(CandidateProblem(
+                problem_id=record["problem_id"],
+                title=record["title"],
+                description=record["description"],
+                intent=record["intent"],
+                keywords=keywords,
+                similarity_score=record["similarity_score"]
+            ))
+        return candidates
+    
+    def _open_store(self, version: Optional[str]) -> Optional[EmbeddingStore]:
+        """EmbeddingStore trên đĩa, chỉ khi được ghi cho đúng graph version và model hiện tại."""
+        if not self.embedding_store_path or version is None:
+            return None
+        try:
+            store = EmbeddingStore.open(self.embedding_store_path, model=self.embedding_model, dimension=self.embedding_dimension)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Embedding store unusable, loading vectors from Neo4j: {e}")
+            return None
+        if store.version != version:
+            logger.info(f"Embedding store version {store.version} != graph version {version}, loading vectors from Neo4j")
+            return None
+        return store
+    
+    @staticmethod
+    def _new_index(ids: List[str], vectors: Any, payloads: List[Dict[str, Any]], version: Optional[str], normalized: bool = False) -> VectorIndex:
+        backend = Config.VECTOR_INDEX_BACKEND
+        if backend == "hnsw":
+            return HnswVectorIndex(
+                ids, vectors, payloads, version, normalized=normalized,
+                M=Config.HNSW_M,
+                ef_construction=Config.HNSW_EF_CONSTRUCTION,
+                ef_search=Config.HNSW_EF_SEARCH,
+                exact_below=Config.HNSW_EXACT_BELOW,
+                path=Config.HNSW_INDEX_PATH
+            )
+        if backend != "exact":
+            raise ValueError(f"Unknown VECTOR_INDEX_BACKEND: {backend} (exact | hnsw)")
+        quantization = Config.VECTOR_INDEX_QUANTIZATION
+        if quantization == "none":
+            return VectorIndex(ids, vectors, payloads, version, normalized=normalized)
+        if quantization != "int8":
+            raise ValueError(f"Unknown VECTOR_INDEX_QUANTIZATION: {quantization} (none | int8)")
+        if not is_memory_mapped(vectors):
+            # Vectors từ Neo4j phải giữ float32 trong RAM để chấm lại → int8 chỉ làm to thêm
+            logger.warning("VECTOR_INDEX_QUANTIZATION=int8 cần EmbeddingStore (mmap) cùng graph version, dùng index float32")
+            return VectorIndex(ids, vectors, payloads, version, normalized=normalized)
+        return QuantizedVectorIndex(
+            ids, vectors, payloads, version, normalized=normalized,
+            binary_prefilter=Config.VECTOR_INDEX_BINARY_PREFILTER,
+            rescore_factor=Config.VECTOR_INDEX_RESCORE_FACTOR,
+            prefilter_factor=Config.VECTOR_INDEX_PREFILTER_FACTOR
+        )
+    
+    def _install_index(self, records: Optional[List[Any]], version: Optional[str], store: Optional[EmbeddingStore] = None) -> None:
+        index = None
+        if records is not None:
+            try:
+                payloads = {
+                    record["problem_id"]: {
+                        "problem_id": record["problem_id"],
+                        "title": record["title"],
+                        "description": record["description"],
+                        "intent": record["intent"],
+                        "keywords": record["keywords"],
+                    } for record in records
+                }
+                if store is not None:
+                    # Vectors mmap từ đĩa, dùng trực tiếp không copy
+                    index = self._new_index(store.ids, store.matrix, [payloads[pid] for pid in store.ids], version, normalized=True)
+                else:
+                    index = self._new_index(
+                        list(payloads),
+                        [record["embedding"] for record in records],
+                        list(payloads.values()),
+                        version
+                    )
+                if index.size and index.dimension != self.embedding_dimension:
+                    raise ValueError(f"embedding dimension {index.dimension} != {self.embedding_dimension}")
+                source = "embedding store" if store is not None else "Neo4j"
+                logger.info(f"Vector index loaded from {source}: {index.size} Problems x {index.dimension} dims (graph version={version})")
+                if isinstance(index, QuantizedVectorIndex):
+                    logger.info(f"Vector index quantized: {index.memory_bytes()} bytes (binary prefilter={index.binary_prefilter})")
+            except Exception as e:
+                logger.warning(f"Vector index build failed, using Neo4j vector search: {e}")
+                index = None
+        # Lỗi cũng được ghi nhận theo version để không thử nạp lại ở mỗi request
+        self._index = index
+        self._index_version = version
+    
+    def _get_index(self) -> Optional[VectorIndex]:
+        if not self.use_index:
+            return None
+        version = self.graph_version.current()
+        if self._index_version != version:
+            with self._index_lock:
+                if self._index_version != version:
+                    store = self._open_store(version)
+                    try:
+                        records = _read(self.driver, self.INDEX_META_CYPHER if store is not None else self.INDEX_CYPHER)
+                    except Exception as e:
+                        logger.warning(f"Vector index load failed, using Neo4j vector search: {e}")
+                        records = None
+                    self._install_index(records, version, store)
+        return self._index
+    
+    async def _aget_index(self) -> Optional[VectorIndex]:
+        if not self.use_index:
+            return None
+        version = await self.graph_version.acurrent()
+        if self._index_version != version:
+            async with self._aindex_lock():
+                if self._index_version != version:
+                    store = self._open_store(version)
+                    try:
+                        records = await _aread(
+                            self.driver, self.async_driver,
+                            self.INDEX_META_CYPHER if store is not None else self.INDEX_CYPHER
+                        )
+                    except Exception as e:
+                        logger.warning(f"Vector index load failed, using Neo4j vector search: {e}")
+                        records = None
+                    # Build index (chuẩn hóa, quantize, HNSW) tốn CPU → chạy ngoài event loop
+                    await asyncio.to_thread(self._install_index, records, version, store)
+        return self._index
+    
+    def _index_top_k(self, index: VectorIndex, scores: Any, problem_ids: List[str], top_k: int) -> List[CandidateProblem]:
+        hits = index.top_k(scores, top_k, index.mask_for_ids(problem_ids))
+        return self._to_candidates([
+            {**index.payload(problem_id), "similarity_score": score} for problem_id, score in hits
+        ])
+    
     def search(self, query: str, constrained_ids: List[str], top_k: Optional[int] = None) -> List[CandidateProblem]:
         if not constrained_ids:
             logger.warning("Không có constrained IDs")
             return []
         
         top_k = top_k or self.top_k
-        query_embedding = self.embed(query)
-        
-        cypher = """
-        CALL db.index.vector.queryNodes('problem_embedding_index', $top_k * 5, $embedding)
-        YIELD node, score
-        WHERE node.id IN $constrained_ids
-        RETURN node.id AS problem_id, node.title AS title, node.description AS description,
-               node.intent AS intent, node.keywords AS keywords, score AS similarity_score
-        ORDER BY score DESC
-        LIMIT $top_k
-        """
+        query_embedding = self._query_embedding(query)
+        index = self._get_index()
+        if index is not None:
+            return self._index_top_k(index, index.scores(query_embedding), constrained_ids, top_k)
+        # Driver Neo4j cần list → chỉ chuyển ở đây
+        records = _read(self.driver, self.SEARCH_CYPHER, {"embedding": query_embedding.tolist(), "constrained_ids": constrained_ids, "top_k": top_k})
+        return self._to_candidates(records)
+    
+    async def asearch(self, query: str, constrained_ids: List[str], top_k: Optional[int] = None) -> List[CandidateProblem]:
+        if not constrained_ids:
+            logger.warning("Không có constrained IDs")
+            return []
         
-        with self.driver.session() as session:
-            result = session.run(cypher, {"embedding": query_embedding, "constrained_ids": constrained_ids, "top_k": top_k})
-            candidates = []
-            for record in result:
-                keywords = record["keywords"]
-                if isinstance(keywords, str):
-                    keywords = keywords.split(",") if keywords else []
-                candidates.append(CandidateProblem(
-                    problem_id=record["problem_id"],
-                    title=record["title"],
-                    description=record["description"],
-                    intent=record["intent"],
-                    keywords=keywords,
-                    similarity_score=record["similarity_score"]
-                ))
-            return candidates
+        top_k = top_k or self.top_k
+        query_embedding = await self._aquery_embedding(query)
+        index = await self._aget_index()
+        if index is not None:
+            return self._index_top_k(index, index.scores(query_embedding), constrained_ids, top_k)
+        records = await _aread(
+            self.driver, self.async_driver, self.SEARCH_CYPHER,
+            {"embedding": query_embedding.tolist(), "constrained_ids": constrained_ids, "top_k": top_k}
+        )
+        return self._to_candidates(records)
     
-    def search_with_fallback(self, query: str, constrained_ids: List[str], all_problem_ids: List[str], top_k: Optional[int] = None) -> List[CandidateProblem]:
-        candidates = self.search(query, constrained_ids, top_k)
+    @staticmethod
+    def _index_similarities(index: VectorIndex, query_embedding: np.ndarray, problem_ids: List[str]) -> Dict[str, float]:
+        scores = index.scores(query_embedding)
+        return {pid: float(scores[index.row_of[pid]]) for pid in problem_ids if pid in index.row_of}
+    
+    def similarities(self, query: str, problem_ids: List[str]) -> Dict[str, float]:
+        """Similarity của query với các Problem cho trước, cùng thang (1 + cos) / 2 với search."""
+        if not problem_ids:
+            return {}
+        query_embedding = self._query_embedding(query)
+        index = self._get_index()
+        if index is None:
+            records = _read(self.driver, self.EMBEDDINGS_CYPHER, {"problem_ids": problem_ids})
+            index = VectorIndex([r["problem_id"] for r in records], [r["embedding"] for r in records])
+        return self._index_similarities(index, query_embedding, problem_ids)
+    
+    def similarities_batch(self, query_embeddings: List[np.ndarray], problem_ids: List[List[str]]) -> List[Dict[str, float]]:
+        """similarities cho nhiều query đã embed; không có VectorIndex thì một EMBEDDINGS_CYPHER cho cả batch."""
+        wanted = list(dict.fromkeys(pid for ids in problem_ids for pid in ids))
+        if not wanted:
+            return [{} for _ in problem_ids]
+        index = self._get_index()
+        if index is None:
+            records = _read(self.driver, self.EMBEDDINGS_CYPHER, {"problem_ids": wanted})
+            index = VectorIndex([r["problem_id"] for r in records], [r["embedding"] for r in records])
+        return [
+            self._index_similarities(index, query_embedding, ids) if ids else {}
+            for query_embedding, ids in zip(query_embeddings, problem_ids)
+        ]
+    
+    async def asimilarities(self, query: str, problem_ids: List[str], query_embedding: Optional[np.ndarray] = None) -> Dict[str, float]:
+        if not problem_ids:
+            return {}
+        query_embedding = await self._aquery_embedding(query, query_embedding)
+        index = await self._aget_index()
+        if index is None:
+            records = await _aread(self.driver, self.async_driver, self.EMBEDDINGS_CYPHER, {"problem_ids": problem_ids})
+            index = VectorIndex([r["problem_id"] for r in records], [r["embedding"] for r in records])
+        return self._index_similarities(index, query_embedding, problem_ids)
+    
+    def uses_index(self) -> bool:
+        return self._get_index() is not None
+    
+    async def auses_index(self) -> bool:
+        return await self._aget_index() is not None
+    
+    @staticmethod
+    def _combined_contexts(records: List[Any], candidates: List[CandidateProblem]) -> List[RetrievedContext]:
+        """Context của các candidate được chọn, theo thứ tự candidate (giống ContextStore)."""
+        by_problem = {record["problem_id"]: record for record in records}
+        rows = []
+        for candidate in candidates:
+            record = by_problem[candidate.problem_id]
+            problem_rows = [
+                {"problem_id": record["problem_id"], "problem_title": record["title"], **answer, **placement}
+                for answer in record["answers"]
+                for placement in record["placements"]
+            ]
+            problem_rows.sort(key=lambda row: (row["answer_id"] or "", row["group_id"] or "", row["topic_id"] or ""))
+            rows.extend(problem_rows)
+        return GraphTraversal._to_contexts(rows)
+    
+    def _combined_result(
+        self,
+        records: List[Any],
+        constrained_ids: List[str],
+        all_problem_ids: List[str],
+        top_k: int
+    ) -> Tuple[List[CandidateProblem], List[RetrievedContext]]:
+        candidates = self._single_pass(self._pool_top_k_within(records, top_k), constrained_ids, all_problem_ids)
+        return candidates, self._combined_contexts(records, candidates)
+    
+    def search_with_context(
+        self,
+        query: str,
+        allowed_groups: List[str],
+        constrained_ids: List[str],
+        all_problem_ids: List[str],
+        top_k: Optional[int] = None
+    ) -> Tuple[List[CandidateProblem], List[RetrievedContext]]:
+        """search_with_fallback + fetch_context trong một Cypher (COMBINED_CYPHER).
         
-        top_similarity = candidates[0].similarity_score if candidates else 0.0
+        constrained_ids/all_problem_ids (từ catalog in-memory) chỉ dùng để quyết định
+        cross-check ở phía Python, không gửi sang Neo4j.
+        """
+        if not constrained_ids and not all_problem_ids:
+            logger.warning("Không có constrained IDs")
+            return [], []
         
-        # Cross-check threshold: when constrained results aren't a strong match,
-        # always verify against the full KB. This catches intent misclassification
-        # (e.g., "bỏ tiền vào ví" parsed as dieu_khoan instead of nap_tien).
-        # Threshold raised from 0.75→0.88: wrong-group content can score 0.80+
-        # due to partial semantic overlap (e.g., "Mobile Money" appears in many groups).
-        CROSS_CHECK_THRESHOLD = 0.88
+        top_k = top_k or self.top_k
+        query_embedding = self._query_embedding(query)
+        records = _read(self.driver, self.COMBINED_CYPHER, {
+            "embedding": query_embedding.tolist(),
+            "allowed_groups": allowed_groups,
+            "top_k": top_k
+        })
+        return self._combined_result(records, constrained_ids, all_problem_ids, top_k)
+    
+    async def asearch_with_context(
+        self,
+        query: str,
+        allowed_groups: List[str],
+        constrained_ids: List[str],
+        all_problem_ids: List[str],
+        top_k: Optional[int] = None,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> Tuple[List[CandidateProblem], List[RetrievedContext]]:
+        if not constrained_ids and not all_problem_ids:
+            logger.warning("Không có constrained IDs")
+            return [], []
         
+        top_k = top_k or self.top_k
+        query_embedding = await self._aquery_embedding(query, query_embedding)
+        records = await _aread(self.driver, self.async_driver, self.COMBINED_CYPHER, {
+            "embedding": query_embedding.tolist(),
+            "allowed_groups": allowed_groups,
+            "top_k": top_k
+        })
+        return self._combined_result(records, constrained_ids, all_problem_ids, top_k)
+    
+    def _should_cross_check(self, candidates: List[CandidateProblem], constrained_ids: List[str], all_problem_ids: List[str]) -> bool:
+        top_similarity = candidates[0].similarity_score if candidates else 0.0
         should_fallback = (
             len(candidates) < 3 or
-            top_similarity < CROSS_CHECK_THRESHOLD
+            top_similarity < self.CROSS_CHECK_THRESHOLD
         )
-        
         if should_fallback and len(all_problem_ids) > len(constrained_ids):
             logger.info(
                 f"Cross-check triggered: {len(candidates)} candidates, "
-                f"top_similarity={top_similarity:.3f} < {CROSS_CHECK_THRESHOLD}, "
+                f"top_similarity={top_similarity:.3f} < {self.CROSS_CHECK_THRESHOLD}, "
                 f"expanding to all {len(all_problem_ids)} problems"
             )
-            fallback_candidates = self.search(query, all_problem_ids, top_k)
-            
-            # Use fallback if it finds a notably better match (>0.02 improvement)
-            # or if it finds a match above 0.85 that the constrained search missed
-            if fallback_candidates:
-                fallback_top = fallback_candidates[0].similarity_score
-                improvement = fallback_top - top_similarity
-                
-                if improvement > 0.02 or (fallback_top >= 0.85 and top_similarity < 0.85):
-                    logger.info(
-                        f"Cross-check improved: {fallback_top:.3f} vs {top_similarity:.3f} "
-                        f"(+{improvement:.3f})"
-                    )
-                    candidates = fallback_candidates
-                else:
-                    logger.info(
-                        f"Cross-check: no significant improvement "
-                        f"({fallback_top:.3f} vs {top_similarity:.3f}), keeping constrained"
-                    )
+            return True
+        return False
+    
+    @staticmethod
+    def _pick_cross_check(candidates: List[CandidateProblem], fallback_candidates: List[CandidateProblem]) -> List[CandidateProblem]:
+        # Use fallback if it finds a notably better match (>0.02 improvement)
+        # or if it finds a match above 0.85 that the constrained search missed
+        if not fallback_candidates:
+            return candidates
+        top_similarity = candidates[0].similarity_score if candidates else 0.0
+        fallback_top = fallback_candidates[0].similarity_score
+        improvement = fallback_top - top_similarity
         
+        if improvement > 0.02 or (fallback_top >= 0.85 and top_similarity < 0.85):
+            logger.info(
+                f"Cross-check improved: {fallback_top:.3f} vs {top_similarity:.3f} "
+                f"(+{improvement:.3f})"
+            )
+            return fallback_candidates
+        logger.info(
+            f"Cross-check: no significant improvement "
+            f"({fallback_top:.3f} vs {top_similarity:.3f}), keeping constrained"
+        )
+        return candidates
+    
+    def _single_pass(self, top_k_within, constrained_ids: List[str], all_problem_ids: List[str]) -> List[CandidateProblem]:
+        # top_k_within(ids) lấy top-k từ cùng một lần chấm điểm query, nên
+        # constrained và global top-k không tốn thêm vector search/round-trip
+        if constrained_ids:
+            candidates = top_k_within(constrained_ids)
+        else:
+            logger.warning("Không có constrained IDs")
+            candidates = []
+        if self._should_cross_check(candidates, constrained_ids, all_problem_ids):
+            candidates = self._pick_cross_check(candidates, top_k_within(all_problem_ids))
         return candidates
+    
+    def _pool_top_k_within(self, records: List[Any], top_k: int):
+        pool = self._to_candidates(records)
+        
+        def top_k_within(problem_ids: List[str]) -> List[CandidateProblem]:
+            allowed = set(problem_ids)
+            return [c for c in pool if c.problem_id in allowed][:top_k]
+        return top_k_within
+    
+    def search_with_fallback(self, query: str, constrained_ids: List[str], all_problem_ids: List[str], top_k: Optional[int] = None) -> List[CandidateProblem]:
+        if not constrained_ids and not all_problem_ids:
+            logger.warning("Không có constrained IDs")
+            return []
+        
+        top_k = top_k or self.top_k
+        query_embedding = self._query_embedding(query)
+        index = self._get_index()
+        if index is not None:
+            scores = index.scores(query_embedding)
+            return self._single_pass(
+                lambda ids: self._index_top_k(index, scores, ids, top_k),
+                constrained_ids, all_problem_ids
+            )
+        records = _read(self.driver, self.POOL_CYPHER, {
+            "embedding": query_embedding.tolist(),
+            "problem_ids": list(set(constrained_ids) | set(all_problem_ids)),
+            "top_k": top_k
+        })
+        return self._single_pass(self._pool_top_k_within(records, top_k), constrained_ids, all_problem_ids)
+    
+    async def asearch_with_fallback(
+        self,
+        query: str,
+        constrained_ids: List[str],
+        all_problem_ids: List[str],
+        top_k: Optional[int] = None,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> List[CandidateProblem]:
+        if not constrained_ids and not all_problem_ids:
+            logger.warning("Không có constrained IDs")
+            return []
+        
+        top_k = top_k or self.top_k
+        query_embedding = await self._aquery_embedding(query, query_embedding)
+        index = await self._aget_index()
+        if index is not None:
+            scores = index.scores(query_embedding)
+            return self._single_pass(
+                lambda ids: self._index_top_k(index, scores, ids, top_k),
+                constrained_ids, all_problem_ids
+            )
+        records = await _aread(self.driver, self.async_driver, self.POOL_CYPHER, {
+            "embedding": query_embedding.tolist(),
+            "problem_ids": list(set(constrained_ids) | set(all_problem_ids)),
+            "top_k": top_k
+        })
+        return self._single_pass(self._pool_top_k_within(records, top_k), constrained_ids, all_problem_ids)
+    
+    def search_with_fallback_batch(
+        self,
+        query_embeddings: List[np.ndarray],
+        constrained_ids: List[List[str]],
+        all_problem_ids: List[str],
+        top_k: Optional[int] = None
+    ) -> List[List[CandidateProblem]]:
+        """search_with_fallback cho nhiều query đã embed (_query_embeddings).
+        
+        Không có VectorIndex → một BATCH_POOL_CYPHER cho cả batch thay vì một POOL_CYPHER mỗi query.
+        """
+        top_k = top_k or self.top_k
+        results: List[List[CandidateProblem]] = [[] for _ in query_embeddings]
+        active = [i for i, ids in enumerate(constrained_ids) if ids or all_problem_ids]
+        if len(active) < len(query_embeddings):
+            logger.warning("Không có constrained IDs")
+        if not active:
+            return results
+        
+        index = self._get_index()
+        if index is not None:
+            for i in active:
+                scores = index.scores(query_embeddings[i])
+                results[i] = self._single_pass(
+                    lambda ids: self._index_top_k(index, scores, ids, top_k),
+                    constrained_ids[i], all_problem_ids
+                )
+            return results
+        
+        problem_ids = set(all_problem_ids)
+        for i in active:
+            problem_ids.update(constrained_ids[i])
+        records = _read(self.driver, self.BATCH_POOL_CYPHER, {
+            "queries": [{"index": i, "embedding": query_embeddings[i].tolist()} for i in active],
+            "problem_ids": list(problem_ids),
+            "top_k": top_k
+        })
+        pools: Dict[int, List[Any]] = {i: [] for i in active}
+        for record in records:
+            pools[record["query_index"]].append(record)
+        for i in active:
+            results[i] = self._single_pass(self._pool_top_k_within(pools[i], top_k), constrained_ids[i], all_problem_ids)
+        return results
 
 
 class GraphTraversal:
-    """Duyệt graph để lấy context đầy đủ."""
+    """Duyệt graph để lấy context đầy đủ.
+    
+    Mặc định toàn bộ context được nạp sẵn vào ContextStore theo graph version
+    (giống catalog/VectorIndex); CONTEXT_CYPHER chỉ còn là đường dự phòng khi
+    store tắt hoặc nạp lỗi.
+    """
+    
+    CONTEXT_CYPHER = """
+    MATCH (p:Problem)-[:HAS_ANSWER]->(a:Answer)
+    WHERE p.id IN $problem_ids
+    MATCH (g:Group)-[:HAS_TOPIC]->(t:Topic)-[:HAS_PROBLEM]->(p)
+    RETURN p.id AS problem_id, p.title AS problem_title, a.id AS answer_id,
+           a.content AS answer_content, a.steps AS answer_steps, a.notes AS answer_notes,
+           t.id AS topic_id, t.name AS topic_name, g.id AS group_id, g.name AS group_name
+    """
+    
+    ALL_CONTEXTS_CYPHER = """
+    MATCH (p:Problem)-[:HAS_ANSWER]->(a:Answer)
+    MATCH (g:Group)-[:HAS_TOPIC]->(t:Topic)-[:HAS_PROBLEM]->(p)
+    RETURN p.id AS problem_id, p.title AS problem_title, a.id AS answer_id,
+           a.content AS answer_content, a.steps AS answer_steps, a.notes AS answer_notes,
+           t.id AS topic_id, t.name AS topic_name, g.id AS group_id, g.name AS group_name
+    ORDER BY problem_id, answer_id, group_id, topic_id
+    """
+    
+    _NOT_LOADED = object()
     
-    def __init__(self, neo4j_driver):
+    def __init__(self, neo4j_driver, async_driver=None, graph_version: Optional[GraphVersion] = None):
         self.driver = neo4j_driver
+        self.async_driver = async_driver
+        self.graph_version = graph_version or GraphVersion(neo4j_driver, async_driver)
+        self.use_store = Config.USE_CONTEXT_STORE
+        self._store: Optional[ContextStore] = None
+        self._store_version: Any = self._NOT_LOADED
+        self._store_lock = threading.Lock()
+        self._astore_lock = _AsyncLoadLock()
+    
+    @staticmethod
+    def _to_contexts(records: List[Any]) -> List[RetrievedContext]:
+        contexts = []
+        for record in records:
+            steps = record["answer_steps"]
+            if isinstance(steps, str):
+                steps = steps.split("\n") if steps else None
+            contexts.append(RetrievedContext(
+                problem_id=record["problem_id"],
+                problem_title=record["problem_title"],
+                answer_id=record["answer_id"],
+                answer_content=record["answer_content"],
+                answer_steps=steps,
+                answer_notes=record["answer_notes"],
+                topic_id=record["topic_id"],
+                topic_name=record["topic_name"],
+                group_id=record["group_id"],
+                group_name=record["group_name"]
+            ))
+        return contexts
+    
+    def _install_store(self, records: Optional[List[Any]], version: Optional[str]) -> None:
+        store = None
+        if records is not None:
+            try:
+                store = ContextStore(self._to_contexts(records), version=version)
+                logger.info(f"Context store loaded: {len(store)} problems, {store.size} contexts (graph version={version})")
+            except Exception as e:
+                logger.warning(f"Context store build failed: {e}")
+                store = None
+        # Dựng xong mới thay store (một phép gán) → request song song không thấy store dở dang.
+        # Lỗi cũng được ghi nhận theo version để không thử nạp lại ở mỗi request
+        self._store = store
+        self._store_version = version
+    
+    def _get_store(self) -> Optional[ContextStore]:
+        if not self.use_store:
+            return None
+        version = self.graph_version.current()
+        if self._store_version != version:
+            with self._store_lock:
+                if self._store_version != version:
+                    try:
+                        records = _read(self.driver, self.ALL_CONTEXTS_CYPHER)
+                    except Exception as e:
+                        logger.warning(f"Context store load failed: {e}")
+                        records = None
+                    self._install_store(records, version)
+        return self._store
+    
+    async def _aget_store(self) -> Optional[ContextStore]:
+        if not self.use_store:
+            return None
+        version = await self.graph_version.acurrent()
+        if self._store_version != version:
+            async with self._astore_lock():
+                if self._store_version != version:
+                    try:
+                        records = await _aread(self.driver, self.async_driver, self.ALL_CONTEXTS_CYPHER)
+                    except Exception as e:
+                        logger.warning(f"Context store load failed: {e}")
+                        records = None
+                    await asyncio.to_thread(self._install_store, records, version)
+        return self._store
     
     def fetch_context(self, problem_ids: List[str]) -> List[RetrievedContext]:
         if not problem_ids:
             return []
-        
-        cypher = """
-        MATCH (p:Problem)-[:HAS_ANSWER]->(a:Answer)
-        WHERE p.id IN $problem_ids
-        MATCH (g:Group)-[:HAS_TOPIC]->(t:Topic)-[:HAS_PROBLEM]->(p)
-        RETURN p.id AS problem_id, p.title AS problem_title, a.id AS answer_id,
-               a.content AS answer_content, a.steps AS answer_steps, a.notes AS answer_notes,
-               t.id AS topic_id, t.name AS topic_name, g.id AS group_id, g.name AS group_name
-        """
-        
-        with self.driver.session() as session:
-            result = session.run(cypher, {"problem_ids": problem_ids})
-            contexts = []
-            for record in result:
-                steps = record["answer_steps"]
-                if isinstance(steps, str):
-                    steps = steps.split("\n") if steps else None
-                contexts.append(RetrievedContext(
-                    problem_id=record["problem_id"],
-                    problem_title=record["problem_title"],
-                    answer_id=record["answer_id"],
-                    answer_content=record["answer_content"],
-                    answer_steps=steps,
-                    answer_notes=record["answer_notes"],
-                    topic_id=record["topic_id"],
-                    topic_name=record["topic_name"],
-                    group_id=record["group_id"],
-                    group_name=record["group_name"]
-                ))
-            return contexts
+        store = self._get_store()
+        if store is not None:
+            return store.get(problem_ids)
+        return self._to_contexts(_read(self.driver, self.CONTEXT_CYPHER, {"problem_ids": problem_ids}))
+    
+    async def afetch_context(self, problem_ids: List[str]) -> List[RetrievedContext]:
+        if not problem_ids:
+            return []
+        store = await self._aget_store()
+        if store is not None:
+            return store.get(problem_ids)
+        records = await _aread(self.driver, self.async_driver, self.CONTEXT_CYPHER, {"problem_ids": problem_ids})
+        return self._to_contexts(records)
     
     def get_context_for_problem(self, problem_id: str) -> Optional[RetrievedContext]:
         contexts = self.fetch_context([problem_id])
@@ -294,14 +1237,506 @@ class QueryNormalizer:
         return normalized
 
 
+class SampleQuestionLookup:
+    """Tra cứu sample_questions của Problem để bỏ qua embedding + vector search.
+    
+    Index được nạp một lần theo graph version (giống catalog/VectorIndex). Khi
+    condensed_query hoặc tin nhắn gốc trùng (hoặc sai khác vài ký tự) với một
+    câu hỏi mẫu, trả về thẳng Problem đó làm candidate duy nhất.
+    """
+    
+    SAMPLE_QUESTIONS_CYPHER = """
+    MATCH (p:Problem)
+    WHERE p.status = 'active' AND p.sample_questions IS NOT NULL AND p.sample_questions <> ''
+    RETURN p.id AS problem_id, p.title AS title, p.description AS description,
+           p.intent AS intent, p.keywords AS keywords, p.sample_questions AS sample_questions
+    """
+    
+    _NOT_LOADED = object()
+    _PUNCTUATION = re.compile(r"[^\w\s]")
+    
+    def __init__(self, neo4j_driver, async_driver=None, graph_version: Optional[GraphVersion] = None):
+        self.driver = neo4j_driver
+        self.async_driver = async_driver
+        self.graph_version = graph_version or GraphVersion(neo4j_driver, async_driver)
+        self.enabled = Config.SAMPLE_QUESTION_LOOKUP
+        self._index: Optional[SampleQuestionIndex] = None
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._version: Any = self._NOT_LOADED
+        self._lock = threading.Lock()
+        self._alock = _AsyncLoadLock()
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+    
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        """Key so khớp: TextNormalizer + QueryNormalizer, bỏ dấu câu, lowercase."""
+        text = QueryNormalizer.normalize(TextNormalizer.normalize(text or "")).lower()
+        return " ".join(cls._PUNCTUATION.sub(" ", text).split())
+    
+    def _install(self, records: Optional[List[Any]], version: Optional[str]) -> None:
+        index = None
+        if records is not None:
+            try:
+                self._payloads = {record["problem_id"]: dict(record) for record in records}
+                index = SampleQuestionIndex(
+                    (
+                        (record["problem_id"], question)
+                        for record in records
+                        for question in (record["sample_questions"] or "").split("|")
+                    ),
+                    self.normalize,
+                    max_edits=Config.SAMPLE_QUESTION_MAX_EDITS,
+                    fuzzy_min_length=Config.SAMPLE_QUESTION_FUZZY_MIN_LENGTH
+                )
+                logger.info(
+                    f"Sample question index loaded: {index.size} questions, {index.fuzzy_keys} fuzzy, "
+                    f"{index.ambiguous} ambiguous skipped (graph version={version})"
+                )
+            except Exception as e:
+                logger.warning(f"Sample question index build failed: {e}")
+                index = None
+        # Lỗi cũng được ghi nhận theo version để không thử nạp lại ở mỗi request
+        self._index = index
+        self._version = version
+    
+    def _get_index(self) -> Optional[SampleQuestionIndex]:
+        if not self.enabled:
+            return None
+        version = self.graph_version.current()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    try:
+                        records = _read(self.driver, self.SAMPLE_QUESTIONS_CYPHER)
+                    except Exception as e:
+                        logger.warning(f"Sample question index load failed: {e}")
+                        records = None
+                    self._install(records, version)
+        return self._index
+    
+    async def _aget_index(self) -> Optional[SampleQuestionIndex]:
+        if not self.enabled:
+            return None
+        version = await self.graph_version.acurrent()
+        if self._version != version:
+            async with self._alock():
+                if self._version != version:
+                    try:
+                        records = await _aread(self.driver, self.async_driver, self.SAMPLE_QUESTIONS_CYPHER)
+                    except Exception as e:
+                        logger.warning(f"Sample question index load failed: {e}")
+                        records = None
+                    # Build (normalize + partition index) tốn CPU → chạy ngoài event loop
+                    await asyncio.to_thread(self._install, records, version)
+        return self._index
+    
+    def _match(self, index: Optional[SampleQuestionIndex], query: StructuredQueryObject) -> Optional[CandidateProblem]:
+        if index is None:
+            return None
+        texts = [query.condensed_query]
+        if query.original_message and query.original_message != query.condensed_query:
+            texts.append(query.original_message)
+        for text in texts:
+            hit = index.match(text)
+            if hit is None:
+                continue
+            problem_id, distance = hit
+            if distance == 0:
+                self.exact_hits += 1
+            else:
+                self.fuzzy_hits += 1
+            logger.info(f"Sample question hit: '{text}' -> {problem_id} (edit distance={distance})")
+            payload = self._payloads[problem_id]
+            keywords = payload["keywords"]
+            if isinstance(keywords, str):
+                keywords = keywords.split(",") if keywords else []
+            return CandidateProblem(
+                problem_id=problem_id,
+                title=payload["title"],
+                description=payload["description"],
+                intent=payload["intent"],
+                keywords=keywords,
+                # Câu hỏi mẫu do người soạn gắn với Problem → coi như near-exact match
+                similarity_score=1.0 - 0.01 * distance,
+                retrieval_source="sample_exact" if distance == 0 else "sample_fuzzy"
+            )
+        self.misses += 1
+        return None
+    
+    def match(self, query: StructuredQueryObject) -> Optional[CandidateProblem]:
+        return self._match(self._get_index(), query)
+    
+    async def amatch(self, query: StructuredQueryObject) -> Optional[CandidateProblem]:
+        return self._match(await self._aget_index(), query)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self._index.size if self._index is not None else 0,
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+        }
+
+
+class LexicalSearch:
+    """Kênh lexical gộp với vector candidates trước MultiSignalRanker.
+    
+    KeywordMatcher của ranker chỉ chấm lại các candidate vector đã trả về, nên
+    Problem khớp nguyên văn nhưng xếp ngoài top-k vector không bao giờ được xét.
+    - backend "memory": BM25Index trên title/description/keywords/sample_questions,
+      nạp một lần theo graph version (giống SampleQuestionLookup)
+    - backend "neo4j": fulltext index problem_text (title, keywords), cho triển khai
+      chỉ dùng Neo4j; RetrievalPipeline chạy song song với vector query
+    """
+    
+    # Trả kèm embedding (Neo4j 5.15 chưa có vector.similarity.cosine) để tính
+    # similarity bằng NumPy; in_scope theo graph pattern như COMBINED_CYPHER
+    FULLTEXT_CYPHER = """
+    CALL db.index.fulltext.queryNodes('problem_text', $text, {limit: $limit})
+    YIELD node AS p, score
+    WHERE p.status = 'active' AND p.embedding IS NOT NULL
+    RETURN p.id AS problem_id, p.title AS title, p.description AS description,
+           p.intent AS intent, p.keywords AS keywords, p.embedding AS embedding,
+           score AS fulltext_score,
+           EXISTS {
+               MATCH (g:Group)-[:HAS_TOPIC]->(:Topic)-[:HAS_PROBLEM]->(p) WHERE g.id IN $allowed_groups
+           } AS in_scope
+    ORDER BY fulltext_score DESC
+    """
+    
+    # FULLTEXT_CYPHER cho nhiều query trong một round-trip (retrieve_batch)
+    BATCH_FULLTEXT_CYPHER = """
+    UNWIND $queries AS q
+    CALL db.index.fulltext.queryNodes('problem_text', q.text, {limit: q.limit})
+    YIELD node AS p, score
+    WHERE p.status = 'active' AND p.embedding IS NOT NULL
+    RETURN q.index AS query_index, p.id AS problem_id, p.title AS title, p.description AS description,
+           p.intent AS intent, p.keywords AS keywords, p.embedding AS embedding,
+           score AS fulltext_score,
+           EXISTS {
+               MATCH (g:Group)-[:HAS_TOPIC]->(:Topic)-[:HAS_PROBLEM]->(p) WHERE g.id IN q.allowed_groups
+           } AS in_scope
+    ORDER BY query_index, fulltext_score DESC
+    """
+    
+    PROBLEM_TEXT_CYPHER = """
+    MATCH (p:Problem) WHERE p.status = 'active'
+    RETURN p.id AS problem_id, p.title AS title, p.description AS description,
+           p.intent AS intent, p.keywords AS keywords, p.sample_questions AS sample_questions
+    """
+    
+    _NOT_LOADED = object()
+    
+    def __init__(self, neo4j_driver, async_driver=None, graph_version: Optional[GraphVersion] = None):
+        self.driver = neo4j_driver
+        self.async_driver = async_driver
+        self.graph_version = graph_version or GraphVersion(neo4j_driver, async_driver)
+        self.enabled = Config.BM25_ENABLED
+        self.backend = Config.LEXICAL_BACKEND
+        self.top_k = Config.BM25_TOP_K
+        self._index: Optional[BM25Index] = None
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._version: Any = self._NOT_LOADED
+        self._lock = threading.Lock()
+        self._alock = _AsyncLoadLock()
+    
+    @staticmethod
+    def _document(record: Any) -> str:
+        keywords = record["keywords"]
+        if isinstance(keywords, list):
+            keywords = " ".join(keywords)
+        return " ".join(
+            text for text in (record["title"], record["description"], keywords, record["sample_questions"]) if text
+        )
+    
+    def _install(self, records: Optional[List[Any]], version: Optional[str]) -> None:
+        index = None
+        if records is not None:
+            try:
+                index = BM25Index(
+                    ((record["problem_id"], self._document(record)) for record in records),
+                    k1=Config.BM25_K1,
+                    b=Config.BM25_B
+                )
+                self._payloads = {record["problem_id"]: dict(record) for record in records}
+                logger.info(f"BM25 index loaded: {index.size} Problems, {len(index.postings)} terms (graph version={version})")
+            except Exception as e:
+                logger.warning(f"BM25 index build failed: {e}")
+                index = None
+        # Lỗi cũng được ghi nhận theo version để không thử nạp lại ở mỗi request
+        self._index = index
+        self._version = version
+    
+    def _get_index(self) -> Optional[BM25Index]:
+        if not self.enabled or self.backend != "memory":
+            return None
+        version = self.graph_version.current()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    try:
+                        records = _read(self.driver, self.PROBLEM_TEXT_CYPHER)
+                    except Exception as e:
+                        logger.warning(f"BM25 index load failed: {e}")
+                        records = None
+                    self._install(records, version)
+        return self._index
+    
+    async def _aget_index(self) -> Optional[BM25Index]:
+        if not self.enabled or self.backend != "memory":
+            return None
+        version = await self.graph_version.acurrent()
+        if self._version != version:
+            async with self._alock():
+                if self._version != version:
+                    try:
+                        records = await _aread(self.driver, self.async_driver, self.PROBLEM_TEXT_CYPHER)
+                    except Exception as e:
+                        logger.warning(f"BM25 index load failed: {e}")
+                        records = None
+                    await asyncio.to_thread(self._install, records, version)
+        return self._index
+    
+    @staticmethod
+    def _candidate(payload: Any, similarity: float, source: str) -> CandidateProblem:
+        keywords = payload["keywords"]
+        if isinstance(keywords, str):
+            keywords = keywords.split(",") if keywords else []
+        return CandidateProblem(
+            problem_id=payload["problem_id"],
+            title=payload["title"],
+            description=payload["description"],
+            intent=payload["intent"],
+            keywords=keywords,
+            similarity_score=similarity,
+            retrieval_source=source
+        )
+    
+    def _search(self, index: Optional[BM25Index], query: str, problem_ids: List[str], top_k: Optional[int]) -> List[CandidateProblem]:
+        if index is None or not problem_ids:
+            return []
+        start = time.perf_counter()
+        # similarity vector thật được điền khi gộp (RetrievalPipeline), để các ngưỡng giữ nguyên ý nghĩa
+        candidates = [
+            self._candidate(self._payloads[problem_id], 0.0, "bm25")
+            for problem_id, _ in index.search(query, top_k or self.top_k, problem_ids)
+        ]
+        _record_channel("bm25", len(candidates), start)
+        return candidates
+    
+    def search(self, query: str, problem_ids: List[str], top_k: Optional[int] = None) -> List[CandidateProblem]:
+        """Top-k BM25 trong problem_ids (theo thứ tự điểm BM25)."""
+        return self._search(self._get_index(), query, problem_ids, top_k)
+    
+    async def asearch(self, query: str, problem_ids: List[str], top_k: Optional[int] = None) -> List[CandidateProblem]:
+        return self._search(await self._aget_index(), query, problem_ids, top_k)
+    
+    @staticmethod
+    def _fulltext_text(query: str) -> str:
+        # Chỉ giữ từ (không ký tự đặc biệt của Lucene), bỏ stopword; các term được OR với nhau
+        return " ".join(word for word in re.findall(r"\w+", query.lower()) if fold_accents(word) not in STOPWORDS)
+    
+    def _fulltext_params(self, query: str, allowed_groups: List[str]) -> Optional[Dict[str, Any]]:
+        text = self._fulltext_text(query)
+        if not self.enabled or self.backend != "neo4j" or not text:
+            return None
+        # Dư ra để còn đủ hit sau khi lọc phạm vi group và bỏ Problem đã là vector candidate
+        return {"text": text, "allowed_groups": allowed_groups, "limit": self.top_k * 5}
+    
+    def fulltext(self, query: str, allowed_groups: List[str]) -> List[Any]:
+        """Hit fulltext (kèm embedding, in_scope) trên toàn KB; lọc phạm vi sau khi có vector candidates."""
+        params = self._fulltext_params(query, allowed_groups)
+        if params is None:
+            return []
+        start = time.perf_counter()
+        try:
+            records = _read(self.driver, self.FULLTEXT_CYPHER, params)
+        except Exception as e:
+            logger.warning(f"Fulltext search failed: {e}")
+            records = []
+        _record_channel("fulltext", len(records), start)
+        return records
+    
+    async def afulltext(self, query: str, allowed_groups: List[str]) -> List[Any]:
+        params = self._fulltext_params(query, allowed_groups)
+        if params is None:
+            return []
+        start = time.perf_counter()
+        try:
+            records = await _aread(self.driver, self.async_driver, self.FULLTEXT_CYPHER, params)
+        except Exception as e:
+            logger.warning(f"Fulltext search failed: {e}")
+            records = []
+        _record_channel("fulltext", len(records), start)
+        return records
+    
+    def fulltext_batch(self, queries: List[Tuple[str, List[str]]]) -> List[List[Any]]:
+        """fulltext cho nhiều (query, allowed_groups) trong một round-trip, theo thứ tự đầu vào."""
+        results: List[List[Any]] = [[] for _ in queries]
+        batch = []
+        for i, (query, allowed_groups) in enumerate(queries):
+            params = self._fulltext_params(query, allowed_groups)
+            if params is not None:
+                batch.append({"index": i, **params})
+        if not batch:
+            return results
+        start = time.perf_counter()
+        try:
+            records = _read(self.driver, self.BATCH_FULLTEXT_CYPHER, {"queries": batch})
+        except Exception as e:
+            logger.warning(f"Fulltext search failed: {e}")
+            records = []
+        for record in records:
+            results[record["query_index"]].append(record)
+        _record_channel("fulltext", len(records), start)
+        return results
+    
+    def fulltext_candidates(
+        self,
+        records: List[Any],
+        candidates: List[CandidateProblem],
+        constrained_scope: bool,
+        query_embedding: np.ndarray
+    ) -> List[CandidateProblem]:
+        """Top-k hit fulltext chưa có trong candidates, similarity tính từ embedding trả kèm."""
+        seen = {c.problem_id for c in candidates}
+        hits = [
+            record for record in records
+            if (record["in_scope"] or not constrained_scope) and record["problem_id"] not in seen
+        ][:self.top_k]
+        if not hits:
+            return []
+        index = VectorIndex([record["problem_id"] for record in hits], [record["embedding"] for record in hits])
+        scores = index.scores(query_embedding)
+        return [self._candidate(record, float(score), "fulltext") for record, score in zip(hits, scores)]
+
+
+class SpeculativeEmbedding:
+    """Embedding của tin nhắn đã chuẩn hóa, chạy song song với LLM intent parse.
+    
+    Dùng lại khi condensed_query của LLM (sau QueryNormalizer) trùng hoặc gần
+    trùng text đã embed: cùng key SampleQuestionLookup.normalize, hoặc sai khác
+    <= SPECULATIVE_EMBEDDING_MAX_EDITS ký tự với câu đủ dài. Ngược lại bị hủy.
+    outcome: None (chưa dùng) | "hit" | "discarded".
+    """
+    
+    def __init__(self, text: str, task: "asyncio.Task[np.ndarray]"):
+        self.text = text
+        self.task = task
+        self.outcome: Optional[str] = None
+        self._key = SampleQuestionLookup.normalize(text)
+    
+    def matches(self, search_query: str) -> bool:
+        key = SampleQuestionLookup.normalize(search_query)
+        if key == self._key:
+            return True
+        if min(len(key), len(self._key)) < Config.SAMPLE_QUESTION_FUZZY_MIN_LENGTH:
+            return False
+        return bounded_edit_distance(key, self._key, Config.SPECULATIVE_EMBEDDING_MAX_EDITS) is not None
+    
+    async def take(self, search_query: str) -> Optional[np.ndarray]:
+        """Embedding để dùng cho search_query, hoặc None (và hủy task nếu chưa ai dùng) khi không khớp.
+        
+        Có thể lấy nhiều lần: SpeculativeRetrieval dùng trước, retrieval theo
+        kết quả LLM vẫn dùng lại được khi retrieval suy đoán bị hủy.
+        """
+        if self.outcome == "discarded":
+            return None
+        if not self.matches(search_query):
+            if self.outcome is None:
+                logger.info(f"Speculative embedding discarded: '{self.text}' vs '{search_query}'")
+                self.discard()
+            return None
+        try:
+            # shield: hủy SpeculativeRetrieval đang chờ không hủy luôn embedding
+            embedding = await asyncio.shield(self.task)
+        except asyncio.CancelledError:
+            if not self.task.cancelled():
+                raise
+            return None
+        except Exception as e:
+            logger.warning(f"Speculative embedding failed: {e}")
+            self.outcome = "discarded"
+            return None
+        self.outcome = "hit"
+        return embedding
+    
+    def discard(self) -> None:
+        if self.outcome is None:
+            self.outcome = "discarded"
+            self.task.cancel()
+
+
+class SpeculativeRetrieval:
+    """Retrieval trên kết quả rule-based parser, chạy song song với LLM intent parse.
+    
+    Dùng lại khi kết quả LLM cho cùng key: tập group (SERVICE_GROUP_MAP) của
+    service, query tìm kiếm sau QueryNormalizer, key câu hỏi mẫu và top_k.
+    Query chỉ gần trùng cho embedding khác nên không dùng lại. Ngược lại bị hủy.
+    outcome: None (chưa dùng) | "hit" | "discarded".
+    """
+    
+    def __init__(self, key: Tuple[Any, ...], task: "asyncio.Task"):
+        self.key = key
+        self.task = task
+        self.outcome: Optional[str] = None
+    
+    async def take(self, key: Tuple[Any, ...]) -> Optional[Tuple[List[CandidateProblem], List[RetrievedContext]]]:
+        """(candidates, contexts) nếu key khớp, hoặc None (và hủy task)."""
+        if self.outcome is not None:
+            return None
+        if key != self.key:
+            logger.info(f"Speculative retrieval discarded: {self.key} vs {key}")
+            self.discard()
+            return None
+        try:
+            result, usage = await self.task
+        except Exception as e:
+            logger.warning(f"Speculative retrieval failed: {e}")
+            self.outcome = "discarded"
+            return None
+        _merge_neo4j_usage(usage)
+        self.outcome = "hit"
+        return result
+    
+    def discard(self) -> None:
+        if self.outcome is None:
+            self.outcome = "discarded"
+            self.task.cancel()
+
+
 class RetrievalPipeline:
     """Pipeline retrieval hoàn chỉnh."""
     
-    def __init__(self, neo4j_driver, embedding_client):
-        self.constraint_filter = GraphConstraintFilter(neo4j_driver)
-        self.vector_search = ConstrainedVectorSearch(neo4j_driver, embedding_client)
-        self.graph_traversal = GraphTraversal(neo4j_driver)
+    def __init__(
+        self,
+        neo4j_driver,
+        embedding_client,
+        async_driver=None,
+        async_embedding_client=None,
+        embedding_provider: Optional[EmbeddingProvider] = None
+    ):
+        self.graph_version = GraphVersion(neo4j_driver, async_driver)
+        self.constraint_filter = GraphConstraintFilter(neo4j_driver, async_driver, graph_version=self.graph_version)
+        self.vector_search = ConstrainedVectorSearch(
+            neo4j_driver, embedding_client, async_driver, async_embedding_client,
+            graph_version=self.graph_version,
+            embedding_provider=embedding_provider
+        )
+        self.graph_traversal = GraphTraversal(neo4j_driver, async_driver, graph_version=self.graph_version)
         self.query_normalizer = QueryNormalizer()
+        self.sample_questions = SampleQuestionLookup(neo4j_driver, async_driver, graph_version=self.graph_version)
+        self.combined_query = Config.COMBINED_RETRIEVAL_QUERY
+        self.speculative_embedding = Config.SPECULATIVE_EMBEDDING
+        self.speculative_retrieval = Config.SPECULATIVE_RETRIEVAL
+        self.lexical_search = LexicalSearch(neo4j_driver, async_driver, graph_version=self.graph_version)
+        # Fulltext Neo4j chạy song song với vector query (bản sync dùng thread pool)
+        self._channel_executor = (
+            ThreadPoolExecutor(max_workers=Config.RETRIEVAL_CHANNEL_WORKERS, thread_name_prefix="retrieval-channel")
+            if self.lexical_search.enabled and self.lexical_search.backend == "neo4j" else None
+        )
     
     def retrieve(self, query: StructuredQueryObject, top_k: Optional[int] = None) -> tuple[List[CandidateProblem], List[RetrievedContext]]:
         constrained_ids = self.constraint_filter.get_constrained_problems(query)
@@ -316,16 +1751,320 @@ class RetrievalPipeline:
         
         return candidates, contexts
     
-    def retrieve_with_fallback(self, query: StructuredQueryObject, top_k: Optional[int] = None) -> tuple[List[CandidateProblem], List[RetrievedContext]]:
-        constrained_ids = self.constraint_filter.get_constrained_problems(query)
-        all_ids = self.constraint_filter.get_all_active_problems()
+    async def aretrieve(self, query: StructuredQueryObject, top_k: Optional[int] = None) -> tuple[List[CandidateProblem], List[RetrievedContext]]:
+        constrained_ids = await self.constraint_filter.aget_constrained_problems(query)
+        logger.info(f"Constrained to {len(constrained_ids)} Problems")
+        
+        candidates = await self.vector_search.asearch(query.condensed_query, constrained_ids, top_k)
+        logger.info(f"Found {len(candidates)} candidates")
+        
+        problem_ids = [c.problem_id for c in candidates]
+        contexts = await self.graph_traversal.afetch_context(problem_ids)
+        logger.info(f"Retrieved {len(contexts)} contexts")
         
+        return candidates, contexts
+    
+    def speculate_embedding(self, user_message: str) -> Optional[SpeculativeEmbedding]:
+        """Bắt đầu embed tin nhắn gốc đã chuẩn hóa (gọi trong event loop, lúc LLM parse bắt đầu).
+        
+        Cùng chuẩn hóa với đường rule-based (TextNormalizer → QueryNormalizer), nên
+        embedding vào EmbeddingCache dưới đúng text đó.
+        """
+        if not self.speculative_embedding:
+            return None
+        text = self.query_normalizer.normalize(TextNormalizer.normalize(user_message))
+        if not text:
+            return None
+        return SpeculativeEmbedding(text, asyncio.create_task(self.vector_search.aembed(text)))
+    
+    def _speculation_key(self, query: StructuredQueryObject, top_k: Optional[int]) -> Tuple[Any, ...]:
+        # Mọi đầu vào của aretrieve_with_fallback: constrained IDs chỉ phụ thuộc tập group
+        return (
+            tuple(sorted(self.constraint_filter._allowed_groups(query))),
+            self.query_normalizer.normalize(query.condensed_query),
+            SampleQuestionLookup.normalize(query.condensed_query),
+            query.original_message,
+            top_k
+        )
+    
+    def speculate_retrieval(
+        self,
+        query: StructuredQueryObject,
+        speculative: Optional[SpeculativeEmbedding] = None
+    ) -> Optional[SpeculativeRetrieval]:
+        """Bắt đầu retrieval trên kết quả rule-based (gọi trong event loop, lúc LLM parse bắt đầu)."""
+        if not self.speculative_retrieval:
+            return None
+        return SpeculativeRetrieval(
+            self._speculation_key(query, None),
+            asyncio.create_task(self._aspeculative_retrieve(query, speculative))
+        )
+    
+    async def _aspeculative_retrieve(
+        self,
+        query: StructuredQueryObject,
+        speculative: Optional[SpeculativeEmbedding]
+    ) -> Tuple[Tuple[List[CandidateProblem], List[RetrievedContext]], Dict[str, Any]]:
+        # Task chạy trước khối track_neo4j_usage của request → đo riêng, cộng lại khi được dùng
+        with track_neo4j_usage() as usage:
+            result = await self.aretrieve_with_fallback(query, speculative=speculative)
+        return result, usage
+    
+    def _search_query(self, query: StructuredQueryObject) -> str:
         # Normalize query for better matching with informal/slang input
         search_query = self.query_normalizer.normalize(query.condensed_query)
         if search_query != query.condensed_query:
             logger.info(f"Query normalized: '{query.condensed_query}' -> '{search_query}'")
+        return search_query
+    
+    @staticmethod
+    def _constrained_scope(candidates: List[CandidateProblem], constrained_ids: List[str]) -> bool:
+        # Cross-check đã chọn kết quả toàn KB → kênh lexical cũng tìm trên toàn KB
+        constrained = set(constrained_ids)
+        return bool(constrained_ids) and all(c.problem_id in constrained for c in candidates)
+    
+    @staticmethod
+    def _with_similarity(hits: List[CandidateProblem], similarity: Dict[str, float]) -> List[CandidateProblem]:
+        extras = []
+        for hit in hits:
+            # Problem chưa có embedding thì không so được với các ngưỡng similarity → bỏ
+            if hit.problem_id not in similarity:
+                continue
+            hit.similarity_score = similarity[hit.problem_id]
+            extras.append(hit)
+        return extras
+    
+    def _lexical_candidates(self, search_query: str, candidates: List[CandidateProblem], constrained_ids: List[str], all_ids: List[str]) -> List[CandidateProblem]:
+        """Hit BM25 chưa có trong candidates, kèm similarity vector thật."""
+        scope = constrained_ids if self._constrained_scope(candidates, constrained_ids) else all_ids
+        seen = {c.problem_id for c in candidates}
+        hits = [hit for hit in self.lexical_search.search(search_query, scope) if hit.problem_id not in seen]
+        if not hits:
+            return []
+        similarity = self.vector_search.similarities(search_query, [hit.problem_id for hit in hits])
+        return self._with_similarity(hits, similarity)
+    
+    async def _alexical_candidates(
+        self,
+        search_query: str,
+        candidates: List[CandidateProblem],
+        constrained_ids: List[str],
+        all_ids: List[str],
+        query_embedding: Optional[np.ndarray] = None
+    ) -> List[CandidateProblem]:
+        scope = constrained_ids if self._constrained_scope(candidates, constrained_ids) else all_ids
+        seen = {c.problem_id for c in candidates}
+        hits = [hit for hit in await self.lexical_search.asearch(search_query, scope) if hit.problem_id not in seen]
+        if not hits:
+            return []
+        similarity = await self.vector_search.asimilarities(search_query, [hit.problem_id for hit in hits], query_embedding)
+        return self._with_similarity(hits, similarity)
+    
+    @staticmethod
+    def _fuse(candidates: List[CandidateProblem], extras: List[CandidateProblem]) -> List[CandidateProblem]:
+        # Ranker/decision đọc candidates[0] như top similarity → giữ thứ tự giảm dần
+        if not extras:
+            return candidates
+        logger.info(f"Lexical channel added {len(extras)} candidates: {[c.problem_id for c in extras]}")
+        return sorted(candidates + extras, key=lambda c: c.similarity_score, reverse=True)
+    
+    def _vector_channel(
+        self,
+        search_query: str,
+        allowed_groups: List[str],
+        constrained_ids: List[str],
+        all_ids: List[str],
+        top_k: Optional[int]
+    ) -> Tuple[List[CandidateProblem], Optional[List[RetrievedContext]]]:
+        """Vector candidates (+ contexts nếu lấy cùng query COMBINED_CYPHER, ngược lại None)."""
+        start = time.perf_counter()
+        if self.combined_query and not self.vector_search.uses_index():
+            # Không có VectorIndex in-memory → vector search + context trong một round-trip
+            candidates, contexts = self.vector_search.search_with_context(
+                search_query, allowed_groups, constrained_ids, all_ids, top_k
+            )
+        else:
+            candidates = self.vector_search.search_with_fallback(search_query, constrained_ids, all_ids, top_k)
+            contexts = None
+        _record_channel("vector", len(candidates), start)
+        return candidates, contexts
+    
+    async def _avector_channel(
+        self,
+        search_query: str,
+        allowed_groups: List[str],
+        constrained_ids: List[str],
+        all_ids: List[str],
+        top_k: Optional[int],
+        query_embedding: Optional[np.ndarray] = None
+    ) -> Tuple[List[CandidateProblem], Optional[List[RetrievedContext]]]:
+        start = time.perf_counter()
+        if self.combined_query and not await self.vector_search.auses_index():
+            candidates, contexts = await self.vector_search.asearch_with_context(
+                search_query, allowed_groups, constrained_ids, all_ids, top_k, query_embedding
+            )
+        else:
+            candidates = await self.vector_search.asearch_with_fallback(
+                search_query, constrained_ids, all_ids, top_k, query_embedding
+            )
+            contexts = None
+        _record_channel("vector", len(candidates), start)
+        return candidates, contexts
+    
+    def retrieve_with_fallback(self, query: StructuredQueryObject, top_k: Optional[int] = None) -> tuple[List[CandidateProblem], List[RetrievedContext]]:
+        # Trùng câu hỏi mẫu → lấy thẳng context của Problem đó, không embedding/vector search
+        sample_hit = self.sample_questions.match(query)
+        if sample_hit is not None:
+            return [sample_hit], self.graph_traversal.fetch_context([sample_hit.problem_id])
         
-        candidates = self.vector_search.search_with_fallback(search_query, constrained_ids, all_ids, top_k)
-        problem_ids = [c.problem_id for c in candidates]
-        contexts = self.graph_traversal.fetch_context(problem_ids)
+        constrained_ids = self.constraint_filter.get_constrained_problems(query)
+        all_ids = self.constraint_filter.get_all_active_problems()
+        allowed_groups = self.constraint_filter._allowed_groups(query)
+        search_query = self._search_query(query)
+        
+        if self._channel_executor is not None:
+            # Fulltext + vector song song: wall-clock = query chậm hơn, không phải tổng hai query
+            vector_future = self._channel_executor.submit(
+                contextvars.copy_context().run, self._vector_channel,
+                search_query, allowed_groups, constrained_ids, all_ids, top_k
+            )
+            records = self.lexical_search.fulltext(search_query, allowed_groups)
+            candidates, contexts = vector_future.result()
+            extras = self.lexical_search.fulltext_candidates(
+                records, candidates, self._constrained_scope(candidates, constrained_ids), self.vector_search.embed(search_query)
+            )
+        else:
+            candidates, contexts = self._vector_channel(search_query, allowed_groups, constrained_ids, all_ids, top_k)
+            extras = self._lexical_candidates(search_query, candidates, constrained_ids, all_ids)
+        
+        candidates = self._fuse(candidates, extras)
+        if contexts is None:
+            contexts = self.graph_traversal.fetch_context([c.problem_id for c in candidates])
+        elif extras:
+            contexts = contexts + self.graph_traversal.fetch_context([c.problem_id for c in extras])
+        return candidates, contexts
+    
+    def _lexical_candidates_batch(
+        self,
+        search_queries: List[str],
+        query_embeddings: List[np.ndarray],
+        candidates: List[List[CandidateProblem]],
+        constrained_ids: List[List[str]],
+        all_ids: List[str],
+        allowed_groups: List[List[str]]
+    ) -> List[List[CandidateProblem]]:
+        if self._channel_executor is not None:
+            records = self.lexical_search.fulltext_batch(list(zip(search_queries, allowed_groups)))
+            return [
+                self.lexical_search.fulltext_candidates(hits, found, self._constrained_scope(found, ids), query_embedding)
+                for hits, found, ids, query_embedding in zip(records, candidates, constrained_ids, query_embeddings)
+            ]
+        hits = []
+        for search_query, found, ids in zip(search_queries, candidates, constrained_ids):
+            scope = ids if self._constrained_scope(found, ids) else all_ids
+            seen = {c.problem_id for c in found}
+            hits.append([hit for hit in self.lexical_search.search(search_query, scope) if hit.problem_id not in seen])
+        similarities = self.vector_search.similarities_batch(
+            query_embeddings, [[hit.problem_id for hit in query_hits] for query_hits in hits]
+        )
+        return [self._with_similarity(query_hits, similarity) for query_hits, similarity in zip(hits, similarities)]
+    
+    def retrieve_batch(
+        self,
+        queries: List[StructuredQueryObject],
+        top_k: Optional[int] = None
+    ) -> List[Tuple[List[CandidateProblem], List[RetrievedContext]]]:
+        """retrieve_with_fallback cho nhiều query (eval, phân tích offline, công cụ bulk).
+        
+        Kết quả từng query giống retrieve_with_fallback, nhưng I/O được gom cho cả batch:
+        embedding chưa cache trong một lần gọi provider, vector search (và fulltext)
+        trong một query UNWIND khi không có VectorIndex, context của mọi candidate
+        trong một lần fetch. Số round-trip không tăng theo số query.
+        """
+        results: List[List[CandidateProblem]] = [[] for _ in queries]
+        # Thứ tự context của từng query, giống retrieve_with_fallback
+        context_ids: List[List[str]] = [[] for _ in queries]
+        pending = []
+        for i, query in enumerate(queries):
+            sample_hit = self.sample_questions.match(query)
+            if sample_hit is not None:
+                results[i] = [sample_hit]
+                context_ids[i] = [sample_hit.problem_id]
+            else:
+                pending.append(i)
+        
+        if pending:
+            all_ids = self.constraint_filter.get_all_active_problems()
+            constrained_ids = [self.constraint_filter.get_constrained_problems(queries[i]) for i in pending]
+            allowed_groups = [self.constraint_filter._allowed_groups(queries[i]) for i in pending]
+            search_queries = [self._search_query(queries[i]) for i in pending]
+            query_embeddings = self.vector_search._query_embeddings(search_queries)
+            
+            start = time.perf_counter()
+            candidates = self.vector_search.search_with_fallback_batch(query_embeddings, constrained_ids, all_ids, top_k)
+            _record_channel("vector", sum(len(found) for found in candidates), start)
+            extras = self._lexical_candidates_batch(
+                search_queries, query_embeddings, candidates, constrained_ids, all_ids, allowed_groups
+            )
+            # COMBINED_CYPHER trả context của vector candidates trước, context của extras nối sau
+            combined = self.combined_query and not self.vector_search.uses_index()
+            for i, found, extra in zip(pending, candidates, extras):
+                results[i] = self._fuse(found, extra)
+                context_ids[i] = [c.problem_id for c in (found + extra if combined else results[i])]
+        
+        # Một lần fetch cho cả batch rồi chia lại theo từng query; ContextStore.get
+        # trả bản sao nên các query trùng Problem không dùng chung object
+        problem_ids = list(dict.fromkeys(pid for ids in context_ids for pid in ids))
+        store = ContextStore(self.graph_traversal.fetch_context(problem_ids))
+        return [(found, store.get(ids)) for found, ids in zip(results, context_ids)]
+    
+    async def aretrieve_with_fallback(
+        self,
+        query: StructuredQueryObject,
+        top_k: Optional[int] = None,
+        speculative: Optional[SpeculativeEmbedding] = None,
+        speculative_retrieval: Optional[SpeculativeRetrieval] = None
+    ) -> tuple[List[CandidateProblem], List[RetrievedContext]]:
+        """Các tham số speculative* là việc đã chạy trước lúc LLM parse, dùng nếu khớp query.
+        
+        speculative: embedding tin nhắn gốc (speculate_embedding).
+        speculative_retrieval: retrieval trên kết quả rule-based (speculate_retrieval).
+        Caller hủy phần không dùng tới (discard).
+        """
+        if speculative_retrieval is not None:
+            result = await speculative_retrieval.take(self._speculation_key(query, top_k))
+            if result is not None:
+                return result
+        
+        sample_hit = await self.sample_questions.amatch(query)
+        if sample_hit is not None:
+            return [sample_hit], await self.graph_traversal.afetch_context([sample_hit.problem_id])
+        
+        constrained_ids = await self.constraint_filter.aget_constrained_problems(query)
+        all_ids = await self.constraint_filter.aget_all_active_problems()
+        allowed_groups = self.constraint_filter._allowed_groups(query)
+        search_query = self._search_query(query)
+        query_embedding = await speculative.take(search_query) if speculative is not None else None
+        
+        if self._channel_executor is not None:
+            (candidates, contexts), records = await asyncio.gather(
+                self._avector_channel(search_query, allowed_groups, constrained_ids, all_ids, top_k, query_embedding),
+                self.lexical_search.afulltext(search_query, allowed_groups)
+            )
+            if query_embedding is None:
+                query_embedding = await self.vector_search.aembed(search_query)
+            extras = self.lexical_search.fulltext_candidates(
+                records, candidates, self._constrained_scope(candidates, constrained_ids), query_embedding
+            )
+        else:
+            candidates, contexts = await self._avector_channel(
+                search_query, allowed_groups, constrained_ids, all_ids, top_k, query_embedding
+            )
+            extras = await self._alexical_candidates(search_query, candidates, constrained_ids, all_ids, query_embedding)
+        
+        candidates = self._fuse(candidates, extras)
+        if contexts is None:
+            contexts = await self.graph_traversal.afetch_context([c.problem_id for c in candidates])
+        elif extras:
+            contexts = contexts + await self.graph_traversal.afetch_context([c.problem_id for c in extras])
         return candidates, contexts
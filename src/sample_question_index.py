@@ -0,0 +1,147 @@
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Levenshtein distance nếu <= max_distance, ngược lại None.
+    
+    Chỉ tính dải |i - j| <= max_distance của bảng DP và dừng sớm khi cả hàng vượt ngưỡng.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    too_far = max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        low, high = max(1, i - max_distance), min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        if low == 1:
+            current[0] = i
+        for j in range(low, high + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != b[j - 1])
+            )
+        if min(current[low - 1:high + 1]) > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class SampleQuestionIndex:
+    """Index câu hỏi mẫu (sample_questions) → problem_id.
+    
+    - Exact: dict theo key đã chuẩn hóa (normalize do caller truyền vào)
+    - Fuzzy: lọc ứng viên theo nguyên lý chuồng bồ câu (partition filter): mỗi key
+      chia thành max_edits + 1 đoạn, chuỗi cách key <= max_edits edit phải chứa
+      nguyên vẹn ít nhất một đoạn, lệch vị trí không quá max_edits. Index chỉ có
+      (max_edits + 1) entry mỗi key; ứng viên được kiểm lại bằng edit distance <= max_edits
+    Câu hỏi mẫu trùng nhau giữa nhiều Problem bị bỏ (không đoán). Key có key của
+    Problem khác nằm trong phạm vi max_edits chỉ được khớp exact.
+    """
+    
+    def __init__(
+        self,
+        questions: Iterable[Tuple[str, str]],
+        normalize: Callable[[str], str],
+        max_edits: int = 2,
+        fuzzy_min_length: int = 20
+    ):
+        self.normalize = normalize
+        self.max_edits = max_edits
+        self.fuzzy_min_length = fuzzy_min_length
+        
+        owners: Dict[str, Set[str]] = defaultdict(set)
+        for problem_id, question in questions:
+            key = normalize(question)
+            if key:
+                owners[key].add(problem_id)
+        
+        self._exact: Dict[str, str] = {key: next(iter(ids)) for key, ids in owners.items() if len(ids) == 1}
+        self.ambiguous = len(owners) - len(self._exact)
+        
+        # (độ dài key, số thứ tự đoạn, nội dung đoạn) → các key
+        self._segments: Dict[Tuple[int, int, str], List[str]] = defaultdict(list)
+        for key in self._exact:
+            if len(key) >= fuzzy_min_length:
+                for segment_no, (start, length) in enumerate(self._partition(len(key))):
+                    self._segments[(len(key), segment_no, key[start:start + length])].append(key)
+        
+        # Key quá gần key của Problem khác → fuzzy dễ nhầm, chỉ giữ exact
+        crowded = {
+            key for key in self._exact
+            if len(key) >= fuzzy_min_length and any(
+                self._exact[other] != self._exact[key] for other, _ in self._neighbours(key)
+            )
+        }
+        for segment, keys in list(self._segments.items()):
+            kept = [key for key in keys if key not in crowded]
+            if kept:
+                self._segments[segment] = kept
+            else:
+                del self._segments[segment]
+        self.fuzzy_keys = sum(1 for key in self._exact if len(key) >= fuzzy_min_length) - len(crowded)
+    
+    @property
+    def size(self) -> int:
+        return len(self._exact)
+    
+    @property
+    def index_entries(self) -> int:
+        return sum(len(keys) for keys in self._segments.values())
+    
+    def _partition(self, length: int) -> List[Tuple[int, int]]:
+        """(start, length) của max_edits + 1 đoạn liên tiếp phủ chuỗi dài length."""
+        parts = self.max_edits + 1
+        base, extra = divmod(length, parts)
+        segments = []
+        start = 0
+        for segment_no in range(parts):
+            size = base + (segment_no >= parts - extra)
+            segments.append((start, size))
+            start += size
+        return segments
+    
+    def _neighbours(self, key: str) -> List[Tuple[str, int]]:
+        """Các key fuzzy trong phạm vi max_edits của key (không gồm chính nó)."""
+        seen: Set[str] = set()
+        found = []
+        k = self.max_edits
+        for length in range(max(len(key) - k, self.fuzzy_min_length), len(key) + k + 1):
+            for segment_no, (start, size) in enumerate(self._partition(length)):
+                if size == 0:
+                    continue
+                # Đoạn giữ nguyên chỉ bị dịch bởi số insert/delete đứng trước nó (<= k)
+                for position in range(max(0, start - k), min(len(key) - size, start + k) + 1):
+                    for other in self._segments.get((length, segment_no, key[position:position + size]), ()):
+                        if other == key or other in seen:
+                            continue
+                        seen.add(other)
+                        distance = bounded_edit_distance(key, other, k)
+                        if distance is not None:
+                            found.append((other, distance))
+        return found
+    
+    def match(self, text: str) -> Optional[Tuple[str, int]]:
+        """(problem_id, edit distance) nếu text khớp một câu hỏi mẫu, ngược lại None."""
+        key = self.normalize(text or "")
+        if not key:
+            return None
+        problem_id = self._exact.get(key)
+        if problem_id is not None:
+            return problem_id, 0
+        if len(key) < self.fuzzy_min_length or self.max_edits <= 0:
+            return None
+        
+        best: Optional[Tuple[str, int]] = None
+        tied = False
+        for other, distance in self._neighbours(key):
+            candidate = self._exact[other]
+            if best is None or distance < best[1]:
+                best, tied = (candidate, distance), False
+            elif distance == best[1] and candidate != best[0]:
+                tied = True
+        return None if tied else best
@@ -125,6 +125,7 @@ class CandidateProblem:
     intent: Optional[str]
     keywords: List[str]
     similarity_score: float  # From vector search
+    retrieval_source: str = "vector"  # "vector" | "bm25" | "fulltext" | "sample_exact" | "sample_fuzzy"
 
 
 @dataclass
@@ -217,14 +218,60 @@ class Config:
     # === Embedding ===
     EMBEDDING_MODEL = "text-embedding-3-small"
     EMBEDDING_DIMENSION = 1536
+    EMBEDDING_PROVIDER = "openai"               # openai | local | hash (env EMBEDDING_PROVIDER)
+    LOCAL_EMBEDDING_MODEL_PATH = "models/embedding"  # thư mục sentence-transformers cho provider local
+    HASH_EMBEDDING_DIMENSION = 384              # provider hash (offline, tất định)
+    EMBEDDING_CACHE_SIZE = 500                  # L1 LRU in-process (số query)
+    EMBEDDING_CACHE_TTL_SECONDS = 7 * 24 * 3600  # L2 Redis, float32 bytes
     
 
 
     # === Retrieval ===
+    # Các tính năng đổi câu trả lời/caching (BM25, sample question lookup, speculative,
+    # response cache) mặc định tắt; bật từng cái khi đã kiểm tra bằng quality_guard
     VECTOR_SEARCH_TOP_K = 10
+    USE_IN_MEMORY_VECTOR_INDEX = True   # NumPy index thay cho db.index.vector.queryNodes
+    VECTOR_INDEX_QUANTIZATION = "none"  # none: float32 | int8: quét int8, chấm lại shortlist bằng float32 mmap (cần EmbeddingStore)
+    VECTOR_INDEX_BINARY_PREFILTER = False  # int8: lọc trước bằng sign bit (Hamming) khi KB lớn
+    VECTOR_INDEX_RESCORE_FACTOR = 4     # chấm lại float32 top_k x factor row theo score int8
+    VECTOR_INDEX_PREFILTER_FACTOR = 32  # binary prefilter giữ top_k x factor row cho bước int8
+    VECTOR_INDEX_BACKEND = "exact"      # exact: brute force (float32/int8) | hnsw: đồ thị HNSW (hnswlib) cho KB 100k+
+    HNSW_M = 16                         # số cạnh mỗi node
+    HNSW_EF_CONSTRUCTION = 200          # độ rộng tìm kiếm khi build (chất lượng đồ thị)
+    HNSW_EF_SEARCH = 64                 # độ rộng tìm kiếm khi query (recall vs latency)
+    HNSW_EXACT_BELOW = 2000             # tập ràng buộc <= bấy nhiêu Problem thì chấm brute force
+    HNSW_INDEX_PATH = "data/embeddings/problems.hnsw"      # đồ thị + header .json, build lại khi graph version đổi
+    USE_CONTEXT_STORE = True            # nạp sẵn mọi context Problem/Answer/Topic/Group thay cho query mỗi request
+    COMBINED_RETRIEVAL_QUERY = True     # không có VectorIndex: vector search + ràng buộc group + context trong 1 Cypher
+    BM25_ENABLED = False                # kênh lexical gộp với vector candidates (đổi thứ hạng → bật chủ động)
+    LEXICAL_BACKEND = "memory"          # memory: BM25 in-memory | neo4j: fulltext index problem_text, song song với vector query
+    RETRIEVAL_CHANNEL_WORKERS = 8       # thread pool chạy vector query song song với fulltext (bản sync)
+    SPECULATIVE_EMBEDDING = False       # embed tin nhắn đã chuẩn hóa song song với LLM intent parse
+    SPECULATIVE_EMBEDDING_MAX_EDITS = 2 # condensed_query sai khác tối đa bấy nhiêu ký tự vẫn dùng lại
+    SPECULATIVE_RETRIEVAL = False       # retrieval trên kết quả rule-based song song với LLM intent parse
+    BM25_TOP_K = 5                      # số hit lexical tối đa được thêm vào candidates
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    GRAPH_VERSION_CHECK_SECONDS = 30    # chu kỳ đọc lại graph version để refresh cache in-memory
+    PROBLEM_EMBEDDING_STORE = "data/embeddings/problems"   # .npy + .json do DataIngestion ghi
+    EVAL_EMBEDDING_STORE = "data/embeddings/eval_texts"    # cache embedding câu trả lời/ground truth khi eval
+    SAMPLE_QUESTION_LOOKUP = False      # khớp sample_questions → bỏ qua embedding + vector search
+    SAMPLE_QUESTION_MAX_EDITS = 2       # edit distance tối đa khi khớp gần đúng
+    SAMPLE_QUESTION_FUZZY_MIN_LENGTH = 20  # câu ngắn hơn chỉ khớp exact
+    RESPONSE_CACHE_ENABLED = False      # cache câu trả lời cho lượt không có lịch sử chat
+    RESPONSE_CACHE_SIZE = 1000          # L1 LRU in-process (số câu trả lời)
+    RESPONSE_CACHE_TTL_SECONDS = 24 * 3600  # L2 Redis; entry còn bị bỏ sớm hơn khi Answer đổi
+    
+
+
+    # === Neo4j ===
+    NEO4J_MAX_CONNECTION_POOL_SIZE = 50         # mỗi driver (sync, AsyncDriver của từng event loop)
+    NEO4J_CONNECTION_ACQUISITION_TIMEOUT = 60   # giây chờ lấy connection khi pool đã đầy
+    NEO4J_MAX_CONNECTION_LIFETIME = 3600        # giây, thay connection cũ trước khi LB/firewall cắt
+    NEO4J_MAX_TRANSACTION_RETRY_TIME = 15       # giây execute_read retry lỗi transient (mất connection, leader đổi)
+    NEO4J_FETCH_SIZE = 1000                     # record mỗi lần PULL (-1 = lấy hết trong một lần)
+    NEO4J_ACQUISITION_WAIT_WINDOW = 1000        # số lần đọc gần nhất để tính p50/p95 acquisition wait
     
-
-
     # === Ranking ===
     RRF_K = 60  
     RANKING_WEIGHTS = {
@@ -444,6 +491,12 @@ class InteractionLog:
     # Total
     total_latency_ms: int
     
+    # Neo4j trong bước retrieval (track_neo4j_usage)
+    neo4j_round_trips: int = 0
+    neo4j_latency_ms: int = 0
+    # Kênh retrieval (vector | bm25 | fulltext) → {"hits", "latency_ms"}
+    retrieval_channels: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    
     # Feedback (collected later)
     user_feedback: Optional[str] = None
     resolved: Optional[bool] = None
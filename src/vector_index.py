@@ -0,0 +1,262 @@
+import logging
+import mmap
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """Vector index in-memory cho Problem embeddings.
+    
+    Lưu toàn bộ embedding trong một ma trận float32 contiguous đã chuẩn hóa L2,
+    nên cosine similarity của cả KB chỉ là một phép nhân ma trận-vector.
+    Ràng buộc group/ID được áp dụng bằng boolean mask trên mảng score.
+    """
+    
+    def __init__(
+        self,
+        ids: Sequence[str],
+        vectors: Any,
+        payloads: Optional[Sequence[Dict[str, Any]]] = None,
+        version: Optional[str] = None,
+        normalized: bool = False
+    ):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(ids), -1) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        if normalized and matrix.flags.c_contiguous:
+            # Đã chuẩn hóa sẵn (vd. EmbeddingStore mmap) → dùng trực tiếp, không copy
+            self.matrix = matrix
+        else:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.matrix = np.ascontiguousarray(matrix / norms, dtype=np.float32)
+        self.ids = list(ids)
+        self.row_of: Dict[str, int] = {pid: row for row, pid in enumerate(self.ids)}
+        self.payloads = list(payloads) if payloads is not None else [{} for _ in self.ids]
+        self.version = version
+        self._mask_cache: Dict[Tuple[str, ...], np.ndarray] = {}
+    
+    @property
+    def size(self) -> int:
+        return self.matrix.shape[0]
+    
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+    
+    def payload(self, problem_id: str) -> Dict[str, Any]:
+        return self.payloads[self.row_of[problem_id]]
+    
+    def mask_for_ids(self, problem_ids: Iterable[str]) -> np.ndarray:
+        """Boolean mask các row thuộc tập ID (cache theo tập ID, vì constrained list lặp lại theo group)."""
+        key = tuple(problem_ids)
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            mask = np.zeros(self.size, dtype=bool)
+            rows = [self.row_of[pid] for pid in key if pid in self.row_of]
+            mask[rows] = True
+            if len(self._mask_cache) >= 64:
+                self._mask_cache.clear()
+            self._mask_cache[key] = mask
+        return mask
+    
+    def scores(self, query_embedding: Sequence[float]) -> np.ndarray:
+        """Score của query với mọi row, cùng thang với Neo4j cosine index: (1 + cos) / 2."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if self.size == 0:
+            return np.zeros(0, dtype=np.float32)
+        if norm == 0:
+            return np.full(self.size, 0.5, dtype=np.float32)
+        cosine = self.matrix @ (query / norm)
+        return (cosine + 1.0) * 0.5
+    
+    def top_k(self, scores: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Top-k (id, score) từ mảng score đã tính, chỉ xét các row trong mask."""
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            candidate_scores = scores[rows]
+        else:
+            rows = None
+            candidate_scores = scores
+        
+        n = candidate_scores.shape[0]
+        if n == 0 or k <= 0:
+            return []
+        if k < n:
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-candidate_scores[top], kind="stable")]
+        
+        picked = rows[top] if rows is not None else top
+        return [(self.ids[row], float(scores[row])) for row in picked]
+    
+    def search(self, query_embedding: Sequence[float], k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        return self.top_k(self.scores(query_embedding), k, mask)
+
+
+def is_memory_mapped(array: Any) -> bool:
+    """True nếu array là (view của) ma trận mmap, vd. EmbeddingStore.matrix: nằm trong page cache, không chiếm RAM process."""
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+# popcount theo byte cho NumPy < 2.0 (không có np.bitwise_count)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _hamming(bits: np.ndarray, query_bits: np.ndarray) -> np.ndarray:
+    """Khoảng cách Hamming giữa từng row bit đã pack (uint8) và query bits."""
+    diff = np.bitwise_xor(bits, query_bits)
+    if hasattr(np, "bitwise_count"):
+        if diff.shape[1] % 8 == 0:
+            diff = diff.view(np.uint64)
+        return np.bitwise_count(diff).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[diff].sum(axis=1, dtype=np.int32)
+
+
+class QuantizedScores:
+    """Score của một query trên QuantizedVectorIndex.
+    
+    Score xấp xỉ (int8 / Hamming) chỉ dùng để chọn shortlist và được tính lười,
+    một lần cho mỗi query; score trả ra ngoài (top_k, scores[row]) luôn là
+    cosine float32 chính xác, cùng thang (1 + cos) / 2 với VectorIndex.
+    """
+    
+    def __init__(self, index: "QuantizedVectorIndex", query: np.ndarray):
+        self.index = index
+        self.query = query
+        self._approximate: Optional[np.ndarray] = None
+        self._hamming: Optional[np.ndarray] = None
+    
+    def __getitem__(self, row: int) -> float:
+        return float(self.exact(np.array([row]))[0])
+    
+    def exact(self, rows: np.ndarray) -> np.ndarray:
+        return (np.asarray(self.index.matrix[rows]) @ self.query + 1.0) * 0.5
+    
+    def approximate(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine xấp xỉ từ int8 codes; rows=None → mọi row (cache lại)."""
+        if rows is not None:
+            return self.index.codes[rows].astype(np.float32) @ self.index.query_codes(self.query)
+        if self._approximate is None:
+            self._approximate = self.index.approximate_scores(self.query)
+        return self._approximate
+    
+    def hamming(self) -> np.ndarray:
+        if self._hamming is None:
+            self._hamming = _hamming(self.index.bits, np.packbits(self.query > 0))
+        return self._hamming
+
+
+class QuantizedVectorIndex(VectorIndex):
+    """VectorIndex với int8 scalar quantization, tùy chọn prefilter bằng sign bit.
+    
+    Mỗi chiều được lượng tử hóa đối xứng về int8 (scale = max |x| / 127), nên
+    phần quét toàn KB đọc 1 byte/chiều thay vì 4. Với binary_prefilter, sign bit
+    của từng chiều được pack (1 bit/chiều) và quét bằng Hamming (XOR + popcount)
+    trước, chỉ shortlist k x prefilter_factor row mới tính int8.
+    k x rescore_factor row tốt nhất theo score xấp xỉ được chấm lại bằng cosine
+    float32 chính xác, nên score ranker/decision thấy không đổi thang và ngưỡng.
+    Ma trận float32 chỉ bị đọc theo row để chấm lại và không bị copy: truyền
+    EmbeddingStore.matrix (mmap, normalized=True) thì RAM của process chỉ còn
+    codes + bits; codes/scale/bits được dựng theo block nên cũng không tạo bản
+    float32 tạm của cả KB.
+    """
+    
+    def __init__(
+        self,
+        ids: Sequence[str],
+        vectors: Any,
+        payloads: Optional[Sequence[Dict[str, Any]]] = None,
+        version: Optional[str] = None,
+        normalized: bool = False,
+        binary_prefilter: bool = False,
+        rescore_factor: int = 4,
+        prefilter_factor: int = 32,
+        chunk_rows: int = 4096
+    ):
+        super().__init__(ids, vectors, payloads, version, normalized)
+        self.rescore_factor = rescore_factor
+        self.prefilter_factor = prefilter_factor
+        self.chunk_rows = chunk_rows
+        scale = np.zeros(self.dimension, dtype=np.float32)
+        for block in self._blocks():
+            np.maximum(scale, np.abs(block).max(axis=0), out=scale)
+        scale /= 127.0
+        scale[scale == 0] = 1.0
+        self.scale = scale
+        self.codes = np.empty(self.matrix.shape, dtype=np.int8)
+        self.bits = np.empty((self.size, (self.dimension + 7) // 8), dtype=np.uint8) if binary_prefilter else None
+        for start, block in zip(range(0, self.size, chunk_rows), self._blocks()):
+            self.codes[start:start + chunk_rows] = np.clip(np.rint(block / self.scale), -127, 127)
+            if self.bits is not None:
+                self.bits[start:start + chunk_rows] = np.packbits(block > 0, axis=1)
+    
+    def _blocks(self) -> Iterable[np.ndarray]:
+        for start in range(0, self.size, self.chunk_rows):
+            yield np.asarray(self.matrix[start:start + self.chunk_rows])
+    
+    @property
+    def binary_prefilter(self) -> bool:
+        return self.bits is not None
+    
+    def memory_bytes(self) -> Dict[str, int]:
+        """Kích thước từng phần trong RAM process: float32 (0 nếu mmap), int8 codes, sign bits."""
+        return {
+            "float32": 0 if is_memory_mapped(self.matrix) else int(self.matrix.nbytes),
+            "int8": int(self.codes.nbytes + self.scale.nbytes),
+            "binary": int(self.bits.nbytes) if self.bits is not None else 0,
+        }
+    
+    def query_codes(self, query: np.ndarray) -> np.ndarray:
+        # codes * scale ≈ matrix → codes @ (query * scale) ≈ matrix @ query
+        return query * self.scale
+    
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine xấp xỉ với mọi row; đổi int8 → float32 theo block để dùng BLAS mà không copy cả ma trận."""
+        scaled = self.query_codes(query)
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, self.chunk_rows):
+            scores[start:start + self.chunk_rows] = self.codes[start:start + self.chunk_rows].astype(np.float32) @ scaled
+        return scores
+    
+    def scores(self, query_embedding: Sequence[float]) -> Any:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if self.size == 0 or norm == 0:
+            return super().scores(query)
+        return QuantizedScores(self, query / norm)
+    
+    @staticmethod
+    def _best(values: np.ndarray, rows: np.ndarray, n: int, largest: bool = True) -> np.ndarray:
+        if len(rows) <= n:
+            return rows
+        keys = -values if largest else values
+        return rows[np.argpartition(keys, n - 1)[:n]]
+    
+    def top_k(self, scores: Any, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        if not isinstance(scores, QuantizedScores):
+            return super().top_k(scores, k, mask)
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(self.size)
+        if len(rows) == 0 or k <= 0:
+            return []
+        
+        if self.bits is not None:
+            rows = self._best(scores.hamming()[rows], rows, k * self.prefilter_factor, largest=False)
+            rows = self._best(scores.approximate(rows), rows, k * self.rescore_factor)
+        else:
+            rows = self._best(scores.approximate()[rows], rows, k * self.rescore_factor)
+        
+        # Chấm lại shortlist bằng float32; sort theo row trước để tie-break giống VectorIndex
+        rows = np.sort(rows)
+        exact = scores.exact(rows)
+        top = np.argsort(-exact, kind="stable")[:k]
+        return [(self.ids[row], float(exact[i])) for row, i in zip(rows[top], top)]
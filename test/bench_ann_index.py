@@ -0,0 +1,108 @@
+"""
+Recall@10 + p50/p99 của HnswVectorIndex so với exact search (VectorIndex).
+
+Dùng cùng KB/query với bench_quantized_index.py (Problem trong db/import,
+--scale thêm Problem tổng hợp để mô phỏng KB 100k+). Với mỗi ef_search đo:
+- toàn KB (không ràng buộc)
+- ràng buộc theo group, filter chạy trong lúc duyệt đồ thị (--exact-below 0
+  để mọi group đi qua HNSW thay vì brute force trên tập nhỏ)
+In thêm thời gian build, save và load_index từ đĩa (worker khởi động).
+
+Cần hnswlib (pip install hnswlib).
+
+Usage:
+    python test/bench_ann_index.py --provider hash --scale 100
+    python test/bench_ann_index.py --scale 200 --M 32 --ef-search 32 64 128 256
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from schema import Config
+from vector_index import VectorIndex
+from ann_index import HnswVectorIndex
+from embedding_provider import create_embedding_provider
+from bench_quantized_index import load_corpus, scale_up, percentile
+
+
+def run(index: VectorIndex, baseline: VectorIndex, queries: np.ndarray, masks: List[Optional[np.ndarray]], k: int) -> Dict[str, float]:
+    recalls, latencies = [], []
+    for i, query in enumerate(queries):
+        mask = masks[i % len(masks)]
+        expected = {pid for pid, _ in baseline.search(query, k, mask)}
+        start = time.perf_counter()
+        hits = index.search(query, k, mask)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected & {pid for pid, _ in hits}) / max(len(expected), 1))
+    return {"recall": float(np.mean(recalls)), "p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall + p99 của HNSW so với exact search")
+    parser.add_argument("--provider", default=None, help="openai | local | hash (mặc định env EMBEDDING_PROVIDER)")
+    parser.add_argument("--scale", type=int, default=100, help="Số bản sao KB (mô phỏng KB lớn hơn)")
+    parser.add_argument("--queries", type=int, default=500, help="Số sample question dùng làm query")
+    parser.add_argument("--k", type=int, default=Config.VECTOR_SEARCH_TOP_K)
+    parser.add_argument("--M", type=int, default=Config.HNSW_M)
+    parser.add_argument("--ef-construction", type=int, default=Config.HNSW_EF_CONSTRUCTION)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[32, Config.HNSW_EF_SEARCH, 128, 256])
+    parser.add_argument("--exact-below", type=int, default=0, help="Tập ràng buộc <= bấy nhiêu row thì chấm brute force")
+    args = parser.parse_args()
+
+    client = None
+    if (args.provider or os.getenv("EMBEDDING_PROVIDER") or Config.EMBEDDING_PROVIDER) == "openai":
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    provider = create_embedding_provider(args.provider, client=client)
+
+    ids, texts, groups, questions = load_corpus()
+    matrix = np.vstack(provider.embed_many(texts)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    ids, groups, matrix = scale_up(ids, groups, matrix, args.scale)
+    queries = np.vstack(provider.embed_many(questions[:args.queries]))
+    print(f"{provider}: KB {len(ids)} x {matrix.shape[1]} dims, {len(queries)} queries, k={args.k}")
+
+    baseline = VectorIndex(ids, matrix, normalized=True)
+    group_masks = [baseline.mask_for_ids([pid for pid, g in zip(ids, groups) if g == group]) for group in sorted(set(groups))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "problems.hnsw")
+        start = time.perf_counter()
+        HnswVectorIndex(ids, matrix, version="bench", normalized=True, M=args.M, ef_construction=args.ef_construction, path=path)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = HnswVectorIndex(
+            ids, matrix, version="bench", normalized=True, M=args.M, ef_construction=args.ef_construction,
+            exact_below=args.exact_below, path=path
+        )
+        load_s = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 2**20
+    print(f"HNSW M={args.M} ef_construction={args.ef_construction}: build+save {build_s:.1f}s, load {load_s:.2f}s, {size_mb:.1f} MB trên đĩa")
+
+    for scope, masks in (("toàn KB", [None]), ("theo group", group_masks)):
+        exact = run(baseline, baseline, queries, masks, args.k)
+        print(f"[{scope}] exact          recall@{args.k}=1.0000  p50={exact['p50']:.2f}ms p99={exact['p99']:.2f}ms")
+        for ef in args.ef_search:
+            loaded.ef_search = ef
+            loaded.graph.set_ef(ef)
+            report = run(loaded, baseline, queries, masks, args.k)
+            print(
+                f"[{scope}] hnsw ef={ef:<5} recall@{args.k}={report['recall']:.4f}  "
+                f"p50={report['p50']:.2f}ms p99={report['p99']:.2f}ms  (x{exact['p99'] / report['p99']:.1f} p99)"
+            )
+
+
+if __name__ == "__main__":
+    main()
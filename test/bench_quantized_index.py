@@ -0,0 +1,157 @@
+"""
+Recall@10 + bộ nhớ + latency của QuantizedVectorIndex so với brute force float32.
+
+Problem (title + description + intent) trong db/import được embed làm KB,
+sample_questions làm query. --scale nhân KB lên bằng Problem tổng hợp (trộn hai
+Problem cùng group) để mô phỏng khi nạp thêm catalog sản phẩm. Mỗi chế độ được
+so với VectorIndex float32 trên cùng query, cả toàn KB lẫn tập ràng buộc theo group:
+- float32:      VectorIndex (brute force, mốc so sánh)
+- int8:         quét int8, chấm lại top_k x rescore_factor bằng float32
+- int8+binary:  sign-bit Hamming prefilter → int8 → float32
+Score của các hit chung phải trùng brute force (chấm lại bằng float32).
+Index int8 được dựng trên EmbeddingStore tạm (mmap) như khi chạy thật, nên
+bộ nhớ báo ra là phần thực sự nằm trong RAM process (codes + bits).
+
+Mặc định dùng provider theo EMBEDDING_PROVIDER; --provider hash chạy offline.
+Embedding hash thưa (đa số chiều = 0) nên sign bit ít thông tin, recall của
+binary prefilter chỉ có ý nghĩa với provider dense (openai, local).
+
+Usage:
+    python test/bench_quantized_index.py --provider hash
+    python test/bench_quantized_index.py --scale 50 --queries 300
+"""
+
+import os
+import sys
+import csv
+import glob
+import time
+import argparse
+import tempfile
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from schema import Config
+from vector_index import VectorIndex, QuantizedVectorIndex
+from embedding_store import EmbeddingStore
+from embedding_provider import create_embedding_provider
+
+IMPORT_DIR = os.path.join(os.path.dirname(__file__), "..", "db", "import")
+
+
+def load_corpus() -> Tuple[List[str], List[str], List[str], List[str]]:
+    """(ids, texts, groups, sample_questions) của các Problem active."""
+    ids, texts, groups, questions = [], [], [], []
+    for path in sorted(glob.glob(os.path.join(IMPORT_DIR, "nodes_problem*.csv"))):
+        with open(path, encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                if (row.get("status") or "active") != "active":
+                    continue
+                ids.append(row["id"])
+                texts.append(" ".join(filter(None, [row["title"], row.get("description"), row.get("intent")])))
+                groups.append(row["id"].split("__")[0])
+                questions.extend(q.strip() for q in (row.get("sample_questions") or "").split("|") if q.strip())
+    return ids, texts, groups, questions
+
+
+def scale_up(ids: List[str], groups: List[str], matrix: np.ndarray, scale: int) -> Tuple[List[str], List[str], np.ndarray]:
+    """Thêm (scale - 1) x KB Problem tổng hợp: trộn 2 Problem cùng group (trọng số ngẫu nhiên), chuẩn hóa lại."""
+    rng = np.random.default_rng(0)
+    rows_of: Dict[str, List[int]] = {}
+    for row, group in enumerate(groups):
+        rows_of.setdefault(group, []).append(row)
+    blocks, all_ids, all_groups = [matrix], list(ids), list(groups)
+    for copy in range(1, scale):
+        partners = np.array([rng.choice(rows_of[group]) for group in groups])
+        weights = rng.uniform(0.3, 0.7, size=(len(ids), 1)).astype(np.float32)
+        block = weights * matrix + (1 - weights) * matrix[partners]
+        blocks.append(block / np.linalg.norm(block, axis=1, keepdims=True))
+        all_ids.extend(f"{pid}#{copy}" for pid in ids)
+        all_groups.extend(groups)
+    return all_ids, all_groups, np.ascontiguousarray(np.vstack(blocks), dtype=np.float32)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] if ordered else 0.0
+
+
+def run(index: VectorIndex, baseline: VectorIndex, queries: np.ndarray, masks: List[np.ndarray], k: int) -> Dict[str, float]:
+    recalls, latencies, score_error = [], [], 0.0
+    for i, query in enumerate(queries):
+        mask = masks[i % len(masks)]
+        for scope in (None, mask):
+            expected = dict(baseline.search(query, k, scope))
+            start = time.perf_counter()
+            hits = index.search(query, k, scope)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(expected.keys() & {pid for pid, _ in hits}) / max(len(expected), 1))
+            score_error = max([score_error] + [abs(expected[pid] - score) for pid, score in hits if pid in expected])
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "score_error": score_error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@10 của QuantizedVectorIndex so với brute force")
+    parser.add_argument("--provider", default=None, help="openai | local | hash (mặc định env EMBEDDING_PROVIDER)")
+    parser.add_argument("--scale", type=int, default=20, help="Số bản sao KB (mô phỏng KB lớn hơn)")
+    parser.add_argument("--queries", type=int, default=200, help="Số sample question dùng làm query")
+    parser.add_argument("--k", type=int, default=Config.VECTOR_SEARCH_TOP_K)
+    parser.add_argument("--rescore-factor", type=int, default=Config.VECTOR_INDEX_RESCORE_FACTOR)
+    parser.add_argument("--prefilter-factor", type=int, default=Config.VECTOR_INDEX_PREFILTER_FACTOR)
+    args = parser.parse_args()
+
+    client = None
+    if (args.provider or os.getenv("EMBEDDING_PROVIDER") or Config.EMBEDDING_PROVIDER) == "openai":
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    provider = create_embedding_provider(args.provider, client=client)
+
+    ids, texts, groups, questions = load_corpus()
+    matrix = np.vstack(provider.embed_many(texts)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    ids, groups, matrix = scale_up(ids, groups, matrix, args.scale)
+    queries = np.vstack(provider.embed_many(questions[:args.queries]))
+    print(f"{provider}: KB {len(ids)} x {matrix.shape[1]} dims, {len(queries)} queries, k={args.k}")
+
+    baseline = VectorIndex(ids, matrix, normalized=True)
+    store = EmbeddingStore.write(
+        os.path.join(tempfile.mkdtemp(), "bench"), ids, matrix, model=provider.model_id, dimension=matrix.shape[1]
+    )
+    # Tập ràng buộc giống ConstraintFilter: mọi Problem của một group
+    masks = [baseline.mask_for_ids([pid for pid, g in zip(ids, groups) if g == group]) for group in sorted(set(groups))]
+    indexes = {
+        "float32": baseline,
+        "int8": QuantizedVectorIndex(store.ids, store.matrix, normalized=True, rescore_factor=args.rescore_factor),
+        "int8+binary": QuantizedVectorIndex(
+            store.ids, store.matrix, normalized=True, binary_prefilter=True,
+            rescore_factor=args.rescore_factor, prefilter_factor=args.prefilter_factor
+        ),
+    }
+    for mode, index in indexes.items():
+        report = run(index, baseline, queries, masks, args.k)
+        if isinstance(index, QuantizedVectorIndex):
+            resident = sum(index.memory_bytes().values())
+        else:
+            resident = index.matrix.nbytes
+        print(
+            f"{mode:<12} recall@{args.k}={report['recall']:.4f}  "
+            f"index {resident / 2**20:.1f} MB (x{baseline.matrix.nbytes / resident:.1f} nhỏ hơn float32)  "
+            f"p50={report['p50']:.2f}ms p95={report['p95']:.2f}ms  "
+            f"lệch score tối đa={report['score_error']:.1e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
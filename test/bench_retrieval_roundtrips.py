@@ -0,0 +1,151 @@
+"""
+Benchmark số round-trip + thời gian Neo4j mỗi request của retrieve_with_fallback.
+
+So sánh 3 chế độ trên cùng tập câu hỏi (sample_questions trong db/import,
+parse bằng IntentParserLocal), embedding được làm nóng trước nên chỉ đo Neo4j:
+- split:     vector search Neo4j + CONTEXT_CYPHER mỗi request (trước đây)
+- combined:  COMBINED_CYPHER, vector search + group pattern + context trong 1 query
+- in-memory: VectorIndex + ContextStore (mặc định), không round-trip trong steady state
+Kiểm tra candidates + contexts giống hệt nhau giữa các chế độ trước khi in kết quả.
+Mỗi chế độ chạy thêm retrieve_batch theo lô --batch-size câu (phải trùng kết quả
+retrieve_with_fallback từng câu), in round-trip mỗi lô và thời gian mỗi câu.
+
+Cần Neo4j đã nạp dữ liệu (NEO4J_URI/NEO4J_USER/NEO4J_PASSWORD) và embedding
+provider tương ứng (EMBEDDING_PROVIDER, OPENAI_API_KEY nếu dùng openai).
+
+Usage:
+    python test/bench_retrieval_roundtrips.py
+    python test/bench_retrieval_roundtrips.py --limit 50 --repeat 3
+    python test/bench_retrieval_roundtrips.py --modes split in-memory --batch-size 64
+"""
+
+import os
+import sys
+import csv
+import glob
+import time
+import argparse
+import statistics
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from schema import Config
+from intent_parser import IntentParserLocal
+from retrieval import RetrievalPipeline, track_neo4j_usage
+from embedding_provider import create_embedding_provider
+
+IMPORT_DIR = os.path.join(os.path.dirname(__file__), "..", "db", "import")
+
+MODES = {
+    "split": {"USE_IN_MEMORY_VECTOR_INDEX": False, "USE_CONTEXT_STORE": False, "COMBINED_RETRIEVAL_QUERY": False},
+    "combined": {"USE_IN_MEMORY_VECTOR_INDEX": False, "USE_CONTEXT_STORE": False, "COMBINED_RETRIEVAL_QUERY": True},
+    "in-memory": {"USE_IN_MEMORY_VECTOR_INDEX": True, "USE_CONTEXT_STORE": True, "COMBINED_RETRIEVAL_QUERY": True},
+}
+
+
+def load_questions(limit: int) -> List[str]:
+    questions = []
+    for path in sorted(glob.glob(os.path.join(IMPORT_DIR, "nodes_problem*.csv"))):
+        with open(path, encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                questions.extend(q.strip() for q in (row.get("sample_questions") or "").split("|") if q.strip())
+    # Câu hỏi mẫu khớp thẳng SampleQuestionLookup → thêm hậu tố để đi qua vector search
+    return [f"{q} giúp mình với" for q in questions[:limit]]
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] if ordered else 0.0
+
+
+def summarize(results) -> List[object]:
+    return [
+        ([(c.problem_id, round(c.similarity_score, 4)) for c in candidates], [c.answer_id for c in contexts])
+        for candidates, contexts in results
+    ]
+
+
+def run_mode(mode: str, driver, provider, queries, repeat: int, batch_size: int) -> Dict[str, object]:
+    for name, value in MODES[mode].items():
+        setattr(Config, name, value)
+    pipeline = RetrievalPipeline(driver, None, embedding_provider=provider)
+
+    # Làm nóng: embedding cache, catalog, VectorIndex/ContextStore
+    results = [pipeline.retrieve_with_fallback(query) for query in queries]
+
+    round_trips, neo4j_ms, total_ms = [], [], []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            with track_neo4j_usage() as usage:
+                pipeline.retrieve_with_fallback(query)
+            total_ms.append((time.perf_counter() - start) * 1000)
+            round_trips.append(usage["round_trips"])
+            neo4j_ms.append(usage["latency_ms"])
+
+    batches = [queries[i:i + batch_size] for i in range(0, len(queries), batch_size)]
+    batch_results, batch_round_trips = [], []
+    start = time.perf_counter()
+    for batch in batches:
+        with track_neo4j_usage() as usage:
+            batch_results.extend(pipeline.retrieve_batch(batch))
+        batch_round_trips.append(usage["round_trips"])
+    batch_ms = (time.perf_counter() - start) * 1000
+    expected = summarize(results)
+    return {
+        "results": expected,
+        "batch_mismatches": sum(1 for a, b in zip(expected, summarize(batch_results)) if a != b),
+        "batch_round_trips": statistics.mean(batch_round_trips),
+        "batch_ms_per_query": batch_ms / max(len(queries), 1),
+        "round_trips": statistics.mean(round_trips),
+        "neo4j_p50": percentile(neo4j_ms, 0.5),
+        "neo4j_p95": percentile(neo4j_ms, 0.95),
+        "total_p50": percentile(total_ms, 0.5),
+        "total_p95": percentile(total_ms, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Neo4j round-trips của retrieval")
+    parser.add_argument("--limit", type=int, default=100, help="Số câu hỏi")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần chạy lại tập câu hỏi mỗi chế độ")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--batch-size", type=int, default=32, help="Số câu mỗi lô retrieve_batch")
+    args = parser.parse_args()
+
+    from neo4j import GraphDatabase
+    from openai import OpenAI
+
+    driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD")))
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
+    provider = create_embedding_provider(client=client)
+    Config.SAMPLE_QUESTION_LOOKUP = False
+
+    parser_local = IntentParserLocal()
+    queries = [parser_local.parse(q) for q in load_questions(args.limit)]
+    print(f"Queries: {len(queries)}, repeat: {args.repeat}")
+
+    reports = {mode: run_mode(mode, driver, provider, queries, args.repeat, args.batch_size) for mode in args.modes}
+    baseline = reports[args.modes[0]]["results"]
+    for mode, report in reports.items():
+        mismatches = sum(1 for a, b in zip(baseline, report["results"]) if a != b)
+        print(
+            f"{mode:<10} round-trips/request={report['round_trips']:.2f}  "
+            f"neo4j p50={report['neo4j_p50']:.1f}ms p95={report['neo4j_p95']:.1f}ms  "
+            f"retrieval p50={report['total_p50']:.1f}ms p95={report['total_p95']:.1f}ms  "
+            f"khác {args.modes[0]}: {mismatches}"
+        )
+        print(
+            f"{'':<10} retrieve_batch({args.batch_size}): round-trips/lô={report['batch_round_trips']:.2f}  "
+            f"{report['batch_ms_per_query']:.2f}ms/câu  khác từng câu: {report['batch_mismatches']}"
+        )
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark TextNormalizer.normalize() - VNPT Money Chatbot.
+
+So sánh với vòng `str.replace` cũ (sort NO_ACCENT_MAP mỗi lần gọi, 150+ lượt
+replace) trên title + sample_questions trong db/import, cả bản có dấu và bản
+bỏ dấu (giống tin nhắn gõ không dấu). Kiểm tra output giống hệt trước khi đo.
+
+Usage:
+    python test/bench_text_normalizer.py
+    python test/bench_text_normalizer.py --repeat 5
+"""
+
+import os
+import sys
+import csv
+import glob
+import time
+import argparse
+import unicodedata
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from intent_parser import TextNormalizer
+
+IMPORT_DIR = os.path.join(os.path.dirname(__file__), "..", "db", "import")
+
+
+def legacy_normalize(text: str) -> str:
+    """TextNormalizer.normalize() trước khi có scanner (để đối chiếu)."""
+    if not text:
+        return text
+    text_lower = text.lower().strip()
+    for no_accent, with_accent in sorted(TextNormalizer.NO_ACCENT_MAP.items(), key=lambda x: -len(x[0])):
+        text_lower = text_lower.replace(no_accent, with_accent)
+    words = text_lower.split()
+    return " ".join(TextNormalizer.ABBREVIATIONS.get(word, word) for word in words)
+
+
+def strip_accents(text: str) -> str:
+    text = text.replace("đ", "d").replace("Đ", "D")
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+def load_messages() -> List[str]:
+    messages = []
+    for path in sorted(glob.glob(os.path.join(IMPORT_DIR, "nodes_problem*.csv"))):
+        with open(path, encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                messages.append(row["title"])
+                messages.extend(q.strip() for q in (row.get("sample_questions") or "").split("|") if q.strip())
+    return messages + [strip_accents(m) for m in messages]
+
+
+def bench(fn: Callable[[str], str], messages: List[str], repeat: int) -> float:
+    """µs / message (lấy lần chạy nhanh nhất)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            fn(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark TextNormalizer")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần chạy mỗi phiên bản")
+    args = parser.parse_args()
+
+    messages = load_messages()
+    mismatches = [m for m in messages if legacy_normalize(m) != TextNormalizer.normalize(m)]
+    print(f"Messages: {len(messages)}, output khác nhau: {len(mismatches)}")
+    for message in mismatches[:5]:
+        print(f"  {message!r}")
+
+    before = bench(legacy_normalize, messages, args.repeat)
+    after = bench(TextNormalizer.normalize, messages, args.repeat)
+    print(f"Before (sorted replace loop): {before:.1f} µs/msg")
+    print(f"After  (trie scanner):        {after:.1f} µs/msg  (x{before / after:.1f})")
+
+
+if __name__ == "__main__":
+    main()
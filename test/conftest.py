@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def run(self, cypher, params=None):
+        self.driver.queries.append(cypher)
+        return list(self.driver.handler(cypher, params or {}))
+
+
+class FakeDriver:
+    """Driver Neo4j giả: handler(cypher, params) → list record (dict)."""
+    
+    def __init__(self, handler):
+        self.handler = handler
+        self.queries = []
+    
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+
+@pytest.fixture
+def fake_driver():
+    return FakeDriver
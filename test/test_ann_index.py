@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("hnswlib")
+
+from ann_index import HnswVectorIndex
+
+
+def _index(path, version, count=50):
+    vectors = np.random.default_rng(count).normal(size=(count, 16))
+    ids = [f"p{i}" for i in range(count)]
+    return HnswVectorIndex(ids, vectors, version=version, exact_below=0, path=path)
+
+
+def test_header_points_at_saved_graph_and_reloads(tmp_path):
+    path = str(tmp_path / "problems.hnsw")
+    _index(path, "v1")
+    first_graph = json.loads((tmp_path / "problems.hnsw.json").read_text())["data"]
+    
+    _index(path, "v2")
+    header = json.loads((tmp_path / "problems.hnsw.json").read_text())
+    assert header["data"] != first_graph and (tmp_path / header["data"]).exists()
+    assert header["version"] == "v2"
+    
+    reloaded = _index(path, "v2")
+    assert reloaded._load(path)
+    graphs = [p for p in tmp_path.iterdir() if p.name.startswith("problems.hnsw.") and p.suffix != ".json"]
+    # Bản mới + bản ngay trước
+    assert len(graphs) == 2
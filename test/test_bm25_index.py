@@ -0,0 +1,68 @@
+import asyncio
+
+from bm25_index import BM25Index, vietnamese_tokens
+from retrieval import LexicalSearch
+from schema import Config
+
+DOCUMENTS = [
+    ("nap_tien__that_bai", "Nạp tiền điện thoại thất bại nhưng bị trừ tiền"),
+    ("rut_tien__pending", "Rút tiền về ngân hàng đang xử lý lâu"),
+    ("lien_ket__otp", "Liên kết ngân hàng không nhận được mã OTP"),
+    ("chuyen_tien__sai", "Chuyển tiền nhầm số tài khoản ngân hàng"),
+]
+
+
+def test_tokens_fold_accents_and_drop_stopwords():
+    assert vietnamese_tokens("Không nhận được OTP") == ["nhan", "otp"]
+    assert "ngan_hang" in vietnamese_tokens("Liên kết ngân hàng")
+
+
+def test_search_ranks_keyword_match_first_with_or_without_accents():
+    index = BM25Index(DOCUMENTS)
+    
+    for query in ("liên kết ngân hàng không nhận otp", "lien ket ngan hang khong nhan otp"):
+        hits = index.search(query, k=3)
+        assert hits[0][0] == "lien_ket__otp"
+        assert all(score > 0 for _, score in hits)
+        assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+
+def test_search_respects_scope_and_ignores_stopword_only_query():
+    index = BM25Index(DOCUMENTS)
+    
+    hits = index.search("ngân hàng", k=5, problem_ids=["rut_tien__pending", "nap_tien__that_bai"])
+    assert [pid for pid, _ in hits] == ["rut_tien__pending"]
+    assert index.search("không được bị", k=5) == []
+
+
+def test_lexical_search_is_off_by_default(fake_driver):
+    driver = fake_driver(lambda cypher, params: [])
+    
+    assert LexicalSearch(driver).search("ngân hàng", ["lien_ket__otp"]) == []
+    assert not any("sample_questions" in q for q in driver.queries)
+
+
+def test_lexical_search_returns_bm25_candidates_when_enabled(fake_driver, monkeypatch):
+    monkeypatch.setattr(Config, "BM25_ENABLED", True)
+    monkeypatch.setattr(Config, "LEXICAL_BACKEND", "memory")
+    
+    def handler(cypher, params):
+        if "GraphMeta" in cypher:
+            return [{"version": "v1"}]
+        if "p.sample_questions AS sample_questions" in cypher:
+            return [
+                {
+                    "problem_id": pid, "title": text, "description": None, "intent": None,
+                    "keywords": ["otp"] if "OTP" in text else [], "sample_questions": None
+                }
+                for pid, text in DOCUMENTS
+            ]
+        return []
+    
+    lexical = LexicalSearch(fake_driver(handler))
+    all_ids = [pid for pid, _ in DOCUMENTS]
+    
+    candidates = lexical.search("lien ket ngan hang khong nhan otp", all_ids, top_k=2)
+    assert [c.problem_id for c in candidates][0] == "lien_ket__otp"
+    assert all(c.retrieval_source == "bm25" for c in candidates)
+    assert asyncio.run(lexical.asearch("rút tiền xử lý lâu", all_ids))[0].problem_id == "rut_tien__pending"
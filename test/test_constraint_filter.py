@@ -0,0 +1,29 @@
+import threading
+import time
+
+from retrieval import GraphConstraintFilter
+
+
+def test_concurrent_cold_catalog_loads_read_neo4j_once(fake_driver):
+    def handler(cypher, params):
+        if "GraphMeta" in cypher:
+            return [{"version": "v1"}]
+        if "RETURN p.id AS problem_id, collect(DISTINCT g.id) AS group_ids" in cypher:
+            time.sleep(0.05)
+            return [{"problem_id": "p1", "group_ids": ["nap_tien"]}, {"problem_id": "p2", "group_ids": ["rut_tien"]}]
+        return []
+    
+    driver = fake_driver(handler)
+    constraint_filter = GraphConstraintFilter(driver)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(constraint_filter.get_all_active_problems()))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert results == [["p1", "p2"]] * 8
+    assert sum("group_ids" in q for q in driver.queries) == 1
@@ -0,0 +1,44 @@
+import json
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+
+def _write(path, ids, version):
+    vectors = np.random.default_rng(len(ids)).normal(size=(len(ids), 8))
+    return EmbeddingStore.write(path, ids, vectors, model="m", dimension=8, version=version)
+
+
+def test_header_points_at_its_own_matrix(tmp_path):
+    path = str(tmp_path / "problems")
+    _write(path, ["a", "b"], "v1")
+    first_data = json.loads((tmp_path / "problems.json").read_text())["data"]
+    
+    store = _write(path, ["a", "b", "c"], "v2")
+    header = json.loads((tmp_path / "problems.json").read_text())
+    assert header["data"] != first_data
+    assert (tmp_path / header["data"]).exists()
+    assert store.version == "v2" and store.matrix.shape == (3, 8)
+    
+    reopened = EmbeddingStore.open(path, model="m", dimension=8)
+    assert reopened.ids == ["a", "b", "c"]
+    np.testing.assert_allclose(np.linalg.norm(reopened.matrix, axis=1), 1.0, rtol=1e-5)
+
+
+def test_old_matrices_are_cleaned_up_keeping_previous(tmp_path):
+    path = str(tmp_path / "problems")
+    for version in ("v1", "v2", "v3"):
+        _write(path, ["a", "b"], version)
+    matrices = sorted(p.name for p in tmp_path.glob("problems*.npy"))
+    # Bản mới + bản ngay trước (reader có thể vừa đọc header cũ)
+    assert len(matrices) == 2
+
+
+def test_legacy_store_without_data_key_still_opens(tmp_path):
+    path = tmp_path / "problems"
+    np.save(tmp_path / "problems.npy", np.eye(2, dtype=np.float32))
+    (tmp_path / "problems.json").write_text(json.dumps(
+        {"model": "m", "dimension": 2, "count": 2, "version": "v0", "ids": ["a", "b"]}
+    ))
+    assert EmbeddingStore.open(str(path)).ids == ["a", "b"]
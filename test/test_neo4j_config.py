@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+import neo4j_config
+from neo4j_config import Neo4jConnection
+
+
+class FakeAsyncDriver:
+    created = []
+    
+    def __init__(self, *args, **kwargs):
+        self.closed = False
+        FakeAsyncDriver.created.append(self)
+    
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    FakeAsyncDriver.created = []
+    monkeypatch.setattr(neo4j_config.AsyncGraphDatabase, "driver", FakeAsyncDriver)
+    monkeypatch.setattr(Neo4jConnection, "_instance", None)
+    monkeypatch.setattr(Neo4jConnection, "_driver", None)
+    conn = Neo4jConnection("bolt://127.0.0.1:1", "neo4j", "password")
+    yield conn
+    conn.close()
+
+
+def test_async_drivers_are_closed_when_their_loop_shuts_down(connection):
+    async def use():
+        return await connection.aget_async_driver()
+    
+    for _ in range(5):
+        asyncio.run(use())
+    assert len(FakeAsyncDriver.created) == 5
+    assert all(driver.closed for driver in FakeAsyncDriver.created)
+    assert len(connection._async_drivers) == 0
+
+
+def test_drivers_of_loops_closed_without_shutdown_are_evicted(connection):
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(connection.aget_async_driver())
+    loop.close()
+    connection.pool_metrics()
+    assert len(connection._async_drivers) == 0
+
+
+def test_async_driver_is_shared_within_a_loop(connection):
+    async def use():
+        first = await connection.aget_async_driver()
+        assert await connection.aget_async_driver() is first
+        await connection.aclose()
+        assert first.closed
+    
+    asyncio.run(use())
+
+
+def test_pool_introspection_is_detected_once(connection):
+    assert connection._pool_introspection
+    assert not Neo4jConnection._has_pool_introspection(object())
+
+
+def test_in_use_falls_back_to_in_flight_reads(connection, monkeypatch):
+    monkeypatch.setattr(connection, "_pool_introspection", False)
+    connection._record_acquisition(0.0)
+    assert connection.pool_metrics()["in_use"] == 1
+    connection._record_release([1])
+    assert connection.pool_metrics()["in_use"] == 0
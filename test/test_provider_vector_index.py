@@ -0,0 +1,112 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from schema import Config
+from embedding_provider import HashEmbeddingProvider
+from embedding_store import EmbeddingStore
+from retrieval import RetrievalPipeline
+from vector_index import QuantizedVectorIndex, VectorIndex
+
+PROBLEMS = {
+    "nap_tien__loi": "Nạp tiền vào ví bị lỗi",
+    "rut_tien__cham": "Rút tiền về ngân hàng bị chậm",
+    "chuyen_tien__sai": "Chuyển tiền nhầm số tài khoản",
+}
+
+
+def _handler(provider):
+    vectors = dict(zip(PROBLEMS, provider.embed_many(list(PROBLEMS.values()))))
+    
+    def handler(cypher, params):
+        if "GraphMeta" in cypher:
+            return [{"version": "v1", "embedding_model": provider.model_id, "embedding_dimension": provider.dimension}]
+        if "p.embedding IS NOT NULL" in cypher and "MATCH (p:Problem)" in cypher:
+            return [
+                {
+                    "problem_id": pid, "title": title, "description": "", "intent": "", "keywords": [],
+                    "embedding": vectors[pid].tolist(),
+                }
+                for pid, title in PROBLEMS.items()
+            ]
+        return []
+    return handler, vectors
+
+
+def _pipeline(fake_driver, provider, monkeypatch, store_path):
+    monkeypatch.setattr(Config, "USE_IN_MEMORY_VECTOR_INDEX", True)
+    monkeypatch.setattr(Config, "VECTOR_INDEX_BACKEND", "exact")
+    monkeypatch.setattr(Config, "VECTOR_INDEX_QUANTIZATION", "none")
+    monkeypatch.setattr(Config, "PROBLEM_EMBEDDING_STORE", store_path)
+    handler, vectors = _handler(provider)
+    driver = fake_driver(handler)
+    return RetrievalPipeline(driver, None, embedding_provider=provider), driver, vectors
+
+
+def test_hash_provider_uses_in_memory_index_from_neo4j(fake_driver, monkeypatch, tmp_path):
+    provider = HashEmbeddingProvider()
+    pipeline, driver, _ = _pipeline(fake_driver, provider, monkeypatch, str(tmp_path / "missing"))
+    
+    assert pipeline.vector_search.uses_index()
+    index = pipeline.vector_search._get_index()
+    assert index.dimension == provider.dimension != Config.EMBEDDING_DIMENSION
+    
+    candidates = pipeline.vector_search.search_with_fallback("nạp tiền vào ví lỗi", list(PROBLEMS), list(PROBLEMS))
+    assert candidates[0].problem_id == "nap_tien__loi"
+    assert not any("queryNodes" in q for q in driver.queries)
+
+
+def test_hash_provider_uses_embedding_store(fake_driver, monkeypatch, tmp_path):
+    provider = HashEmbeddingProvider()
+    store_path = str(tmp_path / "problems")
+    _, vectors = _handler(provider)
+    EmbeddingStore.write(store_path, list(vectors), np.vstack(list(vectors.values())), model=provider.model_id, dimension=provider.dimension, version="v1")
+    pipeline, driver, _ = _pipeline(fake_driver, provider, monkeypatch, store_path)
+    
+    assert pipeline.vector_search.uses_index()
+    # Vectors từ store trên đĩa → chỉ đọc metadata từ Neo4j
+    assert any("p.embedding AS embedding" not in q and "MATCH (p:Problem)" in q for q in driver.queries)
+    assert not any("p.embedding AS embedding" in q for q in driver.queries)
+
+
+def test_concurrent_cold_loads_read_neo4j_once(fake_driver, monkeypatch, tmp_path):
+    provider = HashEmbeddingProvider()
+    pipeline, driver, _ = _pipeline(fake_driver, provider, monkeypatch, str(tmp_path / "missing"))
+    search = pipeline.vector_search
+    
+    async def load():
+        return await asyncio.gather(*(search._aget_index() for _ in range(8)))
+    
+    indexes = asyncio.run(load())
+    assert all(index is indexes[0] for index in indexes) and indexes[0] is not None
+    assert sum("p.embedding AS embedding" in q for q in driver.queries) == 1
+
+
+def test_int8_index_keeps_only_codes_resident(fake_driver, monkeypatch, tmp_path):
+    provider = HashEmbeddingProvider()
+    store_path = str(tmp_path / "problems")
+    _, vectors = _handler(provider)
+    EmbeddingStore.write(store_path, list(vectors), np.vstack(list(vectors.values())), model=provider.model_id, dimension=provider.dimension, version="v1")
+    pipeline, _, _ = _pipeline(fake_driver, provider, monkeypatch, store_path)
+    monkeypatch.setattr(Config, "VECTOR_INDEX_QUANTIZATION", "int8")
+    
+    index = pipeline.vector_search._get_index()
+    assert isinstance(index, QuantizedVectorIndex)
+    memory = index.memory_bytes()
+    assert memory["float32"] == 0
+    assert index.codes.nbytes * 4 == index.matrix.nbytes
+    exact = VectorIndex(list(vectors), np.vstack(list(vectors.values())))
+    query = provider.embed_many(["nạp tiền vào ví lỗi"])[0]
+    hits, expected = index.search(query, 2), exact.search(query, 2)
+    assert [pid for pid, _ in hits] == [pid for pid, _ in expected]
+    assert [score for _, score in hits] == pytest.approx([score for _, score in expected], abs=1e-6)
+
+
+def test_int8_without_store_falls_back_to_float32(fake_driver, monkeypatch, tmp_path):
+    provider = HashEmbeddingProvider()
+    pipeline, _, _ = _pipeline(fake_driver, provider, monkeypatch, str(tmp_path / "missing"))
+    monkeypatch.setattr(Config, "VECTOR_INDEX_QUANTIZATION", "int8")
+    
+    index = pipeline.vector_search._get_index()
+    assert type(index) is VectorIndex
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from decision_engine import SessionManager
+from redis_manager import AsyncRedisManager, RedisConfig
+
+
+class FlakyAsyncRedis:
+    """redis.asyncio giả: lỗi `failures` lần đầu rồi chạy bình thường."""
+    
+    def __init__(self, failures=1):
+        self.failures = failures
+        self.data = {}
+    
+    def _maybe_fail(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("redis down")
+    
+    async def get(self, key):
+        self._maybe_fail()
+        return self.data.get(key)
+    
+    async def setex(self, key, ttl, value):
+        self._maybe_fail()
+        self.data[key] = value
+    
+    async def incr(self, key):
+        self._maybe_fail()
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+    
+    async def expire(self, key, ttl):
+        return True
+    
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_async_manager_recovers_after_backoff():
+    manager = AsyncRedisManager(RedisConfig(reconnect_backoff=0.05, reconnect_backoff_max=0.2))
+    manager._redis = FlakyAsyncRedis(failures=1)
+    
+    async def run():
+        assert await manager.cache_set("k", {"v": 1}) is False
+        assert not manager.is_connected
+        assert await manager.cache_get("k") is None
+        await asyncio.sleep(0.06)
+        assert manager.is_connected
+        assert await manager.cache_set("k", {"v": 1}) is True
+        return await manager.cache_get("k")
+    
+    assert asyncio.run(run()) == {"v": 1}
+
+
+def test_async_manager_backoff_grows_then_caps():
+    manager = AsyncRedisManager(RedisConfig(reconnect_backoff=1.0, reconnect_backoff_max=4.0))
+    delays = []
+    for _ in range(4):
+        delays.append(manager._backoff.failed())
+        manager._backoff.retry_at = time.monotonic()
+    assert delays == [1.0, 2.0, 4.0, 4.0]
+
+
+def test_session_manager_returns_to_redis_after_transient_error():
+    client = FlakyAsyncRedis(failures=1)
+    sessions = SessionManager(async_redis_client=client)
+    sessions._async_backoff.base = 0.05
+    
+    async def run():
+        # Lỗi → đếm tạm trong bộ nhớ process
+        assert await sessions.aincrement_clarify_count("s1") == 1
+        assert "clarify:s1" not in client.data
+        await asyncio.sleep(0.06)
+        assert await sessions.aincrement_clarify_count("s1") == 1
+        return client.data["clarify:s1"]
+    
+    assert asyncio.run(run()) == 1
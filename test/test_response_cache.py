@@ -0,0 +1,84 @@
+import asyncio
+
+from response_cache import ResponseCache
+from retrieval import GraphVersion
+from schema import (
+    Config, DecisionType, FormattedResponse, ProblemTypeEnum, ServiceEnum, StructuredQueryObject
+)
+
+
+class AnswerGraph:
+    """Graph giả: GraphMeta version + content_hash của từng Answer, sửa được giữa các lượt."""
+    
+    def __init__(self, hashes):
+        self.version = "v1"
+        self.hashes = dict(hashes)
+    
+    def handler(self, cypher, params):
+        if "GraphMeta" in cypher:
+            return [{"version": self.version}]
+        if cypher == ResponseCache.ANSWER_HASHES_CYPHER:
+            return [{"answer_id": aid, "content_hash": h} for aid, h in self.hashes.items()]
+        return []
+    
+    def reload(self, **changes):
+        self.hashes.update(changes)
+        self.version = f"v{int(self.version[1:]) + 1}"
+
+
+def _query(text, service=ServiceEnum.NAP_TIEN):
+    return StructuredQueryObject(service=service, problem_type=ProblemTypeEnum.THAT_BAI, condensed_query=text)
+
+
+def _response(message, decision=DecisionType.DIRECT_ANSWER):
+    return FormattedResponse(message=message, source_citation="kb", decision_type=decision)
+
+
+def _cache(fake_driver, graph):
+    driver = fake_driver(graph.handler)
+    return ResponseCache(driver, graph_version=GraphVersion(driver, check_seconds=0))
+
+
+def test_disabled_by_default(fake_driver):
+    cache = _cache(fake_driver, AnswerGraph({"a1": "h1"}))
+    
+    async def run():
+        assert await cache.aset(_query("nạp tiền thất bại"), _response("..."), ["a1"], 100) is False
+        assert await cache.aget(_query("nạp tiền thất bại")) is None
+    
+    asyncio.run(run())
+    assert cache.stats()["size"] == 0
+
+
+def test_changed_answer_invalidates_only_tagged_entries(fake_driver, monkeypatch):
+    monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", True)
+    graph = AnswerGraph({"a1": "h1", "a2": "h2"})
+    cache = _cache(fake_driver, graph)
+    nap, rut = _query("Nạp tiền thất bại!"), _query("rút tiền thất bại", ServiceEnum.RUT_TIEN)
+    
+    async def run():
+        assert await cache.aset(nap, _response("nap"), ["a1"], 120)
+        assert await cache.aset(rut, _response("rut"), ["a2"], 120)
+        # Key chuẩn hóa: khác hoa thường/dấu câu vẫn hit
+        assert (await cache.aget(_query("nạp tiền thất bại")))["message"] == "nap"
+        
+        graph.reload(a1="h1-edited")
+        assert await cache.aget(nap) is None
+        assert (await cache.aget(rut))["message"] == "rut"
+    
+    asyncio.run(run())
+    assert cache.stats()["invalidated"] == 1
+    assert cache.stats()["size"] == 1
+
+
+def test_uncacheable_decisions_and_unknown_answers_are_not_stored(fake_driver, monkeypatch):
+    monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", True)
+    cache = _cache(fake_driver, AnswerGraph({"a1": "h1"}))
+    query = _query("nạp tiền thất bại")
+    
+    async def run():
+        assert await cache.aset(query, _response("?", DecisionType.CLARIFY_REQUIRED), ["a1"], 100) is False
+        assert await cache.aset(query, _response("..."), ["a-missing"], 100) is False
+        assert await cache.aget(query) is None
+    
+    asyncio.run(run())
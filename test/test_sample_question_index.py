@@ -0,0 +1,97 @@
+import csv
+import os
+import random
+import time
+
+from retrieval import SampleQuestionLookup
+from sample_question_index import SampleQuestionIndex, bounded_edit_distance
+
+KB_DIR = os.path.join(os.path.dirname(__file__), "..", "db", "import")
+
+QUESTIONS = [
+    ("nap_tien__loi", "tôi nạp tiền vào ví nhưng bị lỗi"),
+    ("rut_tien__cham", "rút tiền về ngân hàng bao lâu thì nhận được"),
+]
+
+
+def _index(max_edits=2):
+    return SampleQuestionIndex(QUESTIONS, lambda text: " ".join(text.lower().split()), max_edits=max_edits)
+
+
+def test_exact_match():
+    assert _index().match("Tôi nạp tiền vào ví nhưng bị lỗi") == ("nap_tien__loi", 0)
+
+
+def test_distance_two_insert_insert_typo():
+    typo = "tôi nạpp tiền vào ví nhưngg bị lỗi"
+    assert bounded_edit_distance(typo, QUESTIONS[0][1], 2) == 2
+    assert _index().match(typo) == ("nap_tien__loi", 2)
+
+
+def test_distance_beyond_max_edits_is_rejected():
+    typo = "tôi nạpp tiền vàoo ví nhưngg bị lỗi"
+    assert _index().match(typo) is None
+    assert _index(max_edits=1).match("tôi nạpp tiền vào ví nhưngg bị lỗi") is None
+
+
+def _kb_questions():
+    questions = []
+    for name in ("nodes_problem.csv", "nodes_problem_supplement.csv"):
+        with open(os.path.join(KB_DIR, name), encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                questions.extend((row["id"], q) for q in (row["sample_questions"] or "").split("|") if q.strip())
+    return questions
+
+
+def _typo(key, rng, edits):
+    chars = list(key)
+    for _ in range(edits):
+        op, i = rng.choice("ids"), rng.randrange(len(chars))
+        if op == "i":
+            chars.insert(i, rng.choice("abcdeghiklmnopqrstuvxy"))
+        elif op == "d":
+            del chars[i]
+        else:
+            chars[i] = rng.choice("abcdeghiklmnopqrstuvxy")
+    return "".join(chars)
+
+
+def _brute_force(index, fuzzy, key):
+    best, tied = None, False
+    for other in fuzzy:
+        distance = bounded_edit_distance(key, other, index.max_edits)
+        if distance is None:
+            continue
+        candidate = index._exact[other]
+        if best is None or distance < best[1]:
+            best, tied = (candidate, distance), False
+        elif distance == best[1] and candidate != best[0]:
+            tied = True
+    return None if tied else best
+
+
+def test_shipped_kb_build_size_time_and_recall():
+    questions = _kb_questions()
+    assert len(questions) > 1500
+    
+    start = time.perf_counter()
+    index = SampleQuestionIndex(questions, SampleQuestionLookup.normalize, max_edits=2)
+    build_seconds = time.perf_counter() - start
+    # (max_edits + 1) entry mỗi key fuzzy, không phải O(len^2) biến thể xóa
+    assert index.index_entries <= 3 * index.size
+    assert build_seconds < 2.0
+    
+    fuzzy = {key for keys in index._segments.values() for key in keys}
+    rng = random.Random(13)
+    probes = [
+        SampleQuestionLookup.normalize(_typo(key, rng, rng.randint(1, 2))) for key in rng.sample(sorted(fuzzy), 200)
+    ]
+    probes = [probe for probe in probes if probe not in index._exact]
+    for probe in probes:
+        assert index.match(probe) == _brute_force(index, fuzzy, probe)
+    
+    misses = ["tôi muốn hỏi một điều hoàn toàn không có trong kho câu hỏi mẫu số %d" % i for i in range(200)]
+    start = time.perf_counter()
+    for miss in misses:
+        assert index.match(miss) is None
+    assert (time.perf_counter() - start) / len(misses) < 0.002
@@ -0,0 +1,86 @@
+import asyncio
+
+import numpy as np
+
+from embedding_provider import HashEmbeddingProvider
+from retrieval import RetrievalPipeline, SpeculativeRetrieval
+from schema import Config, ProblemTypeEnum, ServiceEnum, StructuredQueryObject
+
+MESSAGE = "nạp tiền điện thoại bị thất bại"
+
+
+def _pipeline(fake_driver):
+    return RetrievalPipeline(fake_driver(lambda cypher, params: []), None, embedding_provider=HashEmbeddingProvider())
+
+
+def _query(text, service=ServiceEnum.NAP_TIEN):
+    return StructuredQueryObject(
+        service=service, problem_type=ProblemTypeEnum.THAT_BAI, condensed_query=text, original_message=MESSAGE
+    )
+
+
+def test_speculation_is_off_by_default(fake_driver):
+    pipeline = _pipeline(fake_driver)
+    
+    async def run():
+        assert pipeline.speculate_embedding(MESSAGE) is None
+        assert pipeline.speculate_retrieval(_query(MESSAGE)) is None
+    
+    asyncio.run(run())
+
+
+def test_speculative_embedding_reused_for_near_identical_query(fake_driver, monkeypatch):
+    monkeypatch.setattr(Config, "SPECULATIVE_EMBEDDING", True)
+    pipeline = _pipeline(fake_driver)
+    
+    async def run():
+        speculative = pipeline.speculate_embedding(MESSAGE)
+        expected = await pipeline.vector_search.aembed(speculative.text)
+        # LLM viết lại khác 1 ký tự → vẫn dùng lại, lấy lại được nhiều lần
+        embedding = await speculative.take("nạp tiền điện thoại bị thất bạị")
+        assert np.array_equal(embedding, expected)
+        assert np.array_equal(await speculative.take(MESSAGE), expected)
+        assert speculative.outcome == "hit"
+    
+    asyncio.run(run())
+
+
+def test_speculative_embedding_discarded_for_different_query(fake_driver, monkeypatch):
+    monkeypatch.setattr(Config, "SPECULATIVE_EMBEDDING", True)
+    pipeline = _pipeline(fake_driver)
+    
+    async def run():
+        speculative = pipeline.speculate_embedding(MESSAGE)
+        assert await speculative.take("rút tiền về ngân hàng bị treo") is None
+        assert speculative.outcome == "discarded"
+        assert await speculative.take(MESSAGE) is None
+        await asyncio.sleep(0)
+        assert speculative.task.cancelled()
+    
+    asyncio.run(run())
+
+
+def test_speculative_retrieval_reused_only_for_same_key(fake_driver, monkeypatch):
+    monkeypatch.setattr(Config, "SPECULATIVE_RETRIEVAL", True)
+    pipeline = _pipeline(fake_driver)
+    result = (["candidate"], ["context"])
+    
+    async def retrieved():
+        return result, {}
+    
+    async def run():
+        query = _query(MESSAGE)
+        # Kết quả LLM cùng group + cùng query → dùng lại, không chạy retrieval lần hai
+        hit = SpeculativeRetrieval(pipeline._speculation_key(query, None), asyncio.create_task(retrieved()))
+        assert await pipeline.aretrieve_with_fallback(_query(MESSAGE), speculative_retrieval=hit) == result
+        assert hit.outcome == "hit"
+        
+        # LLM chọn service thuộc group khác → hủy
+        blocked = asyncio.Event()
+        miss = SpeculativeRetrieval(pipeline._speculation_key(query, None), asyncio.create_task(blocked.wait()))
+        assert await miss.take(pipeline._speculation_key(_query(MESSAGE, ServiceEnum.RUT_TIEN), None)) is None
+        assert miss.outcome == "discarded"
+        await asyncio.sleep(0)
+        assert miss.task.cancelled()
+    
+    asyncio.run(run())